@@ -0,0 +1,315 @@
+"""Serve static files under URLs that change with their content.
+
+This module contains :class:`Assets`, which names the files under
+``static/`` by a digest of their content, so that
+``css/main.css`` is linked as ``/assets/css/main.<digest>.css``. Such
+a URL always gets the same bytes, so browsers may keep them for a year
+without checking back; when the file changes, pages link a new URL.
+Templates link files with ``asset_url``, as they would with
+``url_for('static', ...)``.
+
+Files can also be compressed ahead of time. Running this module as a
+program writes a gzip (and, if the ``brotli`` package is installed, a
+Brotli) version next to each text file, and records in
+:data:`MANIFEST` which content they were made from::
+
+  python3 assets.py
+  python3 assets.py --folder=static
+
+A compressed version is only sent if the client accepts its encoding
+and it was made from the file as it is now.
+
+Finally, :func:`compress_response` gzips HTML pages as they are sent.
+
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+import zlib
+
+from flask import abort, redirect, request, send_file, url_for
+
+from utils import file_signature, write_atomic
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'assets.json'
+"""Name of the file recording the content of the compressed files."""
+
+DIGEST_SIZE = 12
+"""Number of hexadecimal digits of the digest in URLs."""
+
+MAX_AGE = 365 * 24 * 60 * 60
+"""Number of seconds browsers may keep a fingerprinted file."""
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.eot', '.ttf', '.otf')
+"""Extensions of the files worth compressing."""
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+"""Content encodings and the extensions of their files, best first."""
+
+COMPRESS_LEVEL = 6
+"""Level of gzip compression of pages as they are sent."""
+
+_FINGERPRINTED = re.compile(
+    r'(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$'
+    % DIGEST_SIZE)
+
+
+def file_digest(path):
+    """Return the digest of the content of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:DIGEST_SIZE]
+
+
+def _compress(data, encoding):
+    # Return data compressed with the content encoding, as small as can be
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, 9, mtime=0)
+
+
+def build(folder):
+    """Write compressed versions of the files under *folder*.
+
+    A version is only kept if it is smaller than the file. Versions in
+    encodings that cannot be made here are left out.
+
+    :return: The manifest, a dict of the digests of the files
+        compressed, by path relative to *folder*
+    """
+    encodings = [(e, ext) for e, ext in ENCODINGS
+                 if e != 'br' or brotli is not None]
+    manifest = {}
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding, ext in encodings:
+                compressed = _compress(data, encoding)
+                if len(compressed) < len(data):
+                    with open(path + ext, 'wb') as f:
+                        f.write(compressed)
+                elif os.path.exists(path + ext):
+                    os.unlink(path + ext)
+            filename = os.path.relpath(path, folder).replace(os.sep, '/')
+            manifest[filename] = file_digest(path)
+    write_atomic(os.path.join(folder, MANIFEST),
+                 json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+class Assets:
+    """Fingerprinted URLs for, and responses with, the files in *folder*.
+
+    Digests are computed as files are first linked, and again whenever
+    a file changes.
+
+    :param str folder: Path of the folder of static files
+    :param str endpoint: Name of the route serving
+        :meth:`send`, which takes the file name as ``filename``
+
+    """
+
+    def __init__(self, folder, endpoint='assets'):
+        self.folder = folder
+        self.endpoint = endpoint
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._manifest = None
+
+    def path(self, filename):
+        """Return the path of the file *filename* under the folder.
+
+        :raises KeyError: If there is no such file
+        """
+        parts = filename.split('/')
+        if any(part in ('', '.', '..') for part in parts):
+            raise KeyError(filename)
+        path = os.path.join(self.folder, *parts)
+        if not os.path.isfile(path):
+            raise KeyError(filename)
+        return path
+
+    def digest(self, filename):
+        """Return the digest of the content of the file *filename*.
+
+        :raises KeyError: If there is no such file
+        """
+        path = self.path(filename)
+        signature = file_signature(os.stat(path))
+        with self._lock:
+            found = self._digests.get(filename)
+        if found is not None and found[0] == signature:
+            return found[1]
+        digest = file_digest(path)
+        with self._lock:
+            self._digests[filename] = (signature, digest)
+        return digest
+
+    def fingerprinted(self, filename):
+        """Return *filename* with its digest before the extension."""
+        stem, ext = os.path.splitext(filename)
+        return '{}.{}{}'.format(stem, self.digest(filename), ext)
+
+    def url(self, filename):
+        """Return the URL of the file *filename*.
+
+        Files that do not exist get their plain static URL.
+        """
+        try:
+            name = self.fingerprinted(filename)
+        except KeyError:
+            return url_for('static', filename=filename)
+        return url_for(self.endpoint, filename=name)
+
+    def manifest(self):
+        """Return the manifest written by :func:`build`, or {}."""
+        if self._manifest is None:
+            try:
+                with open(os.path.join(self.folder, MANIFEST)) as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def encoded(self, filename, digest, accepted):
+        """Return the path and encoding of a compressed *filename*.
+
+        *accepted* maps content encodings to their quality, as in
+        ``request.accept_encodings``. Returns None if no compressed
+        version of the file with *digest* is accepted.
+        """
+        if self.manifest().get(filename) != digest:
+            return None
+        path = self.path(filename)
+        for encoding, ext in ENCODINGS:
+            if accepted[encoding] and os.path.isfile(path + ext):
+                return path + ext, encoding
+        return None
+
+    def send(self, filename):
+        """Return a response with the file *filename*.
+
+        If *filename* is fingerprinted with the current digest, the
+        response may be kept for :data:`MAX_AGE` seconds; an earlier
+        digest redirects to the current URL. Other files, such as fonts
+        linked from style sheets, are sent with the usual caching.
+        Either way, a compressed version is sent if the client allows.
+        """
+        fingerprinted = False
+        match = _FINGERPRINTED.match(filename)
+        if match is not None:
+            name = match.group('stem') + match.group('ext')
+            try:
+                digest = self.digest(name)
+            except KeyError:
+                pass
+            else:
+                if digest != match.group('digest'):
+                    return redirect(self.url(name))
+                filename, fingerprinted = name, True
+        try:
+            path = self.path(filename)
+            digest = self.digest(filename)
+        except KeyError:
+            abort(404)
+        mimetype = (mimetypes.guess_type(filename)[0] or
+                    'application/octet-stream')
+        found = self.encoded(filename, digest, request.accept_encodings)
+        if found is None:
+            response = send_file(path, mimetype=mimetype)
+        else:
+            response = send_file(found[0], mimetype=mimetype)
+            response.headers['Content-Encoding'] = found[1]
+        if filename.endswith(COMPRESSIBLE):
+            response.vary.add('Accept-Encoding')
+        if fingerprinted:
+            response.headers['Cache-Control'] = \
+                'public, max-age={}, immutable'.format(MAX_AGE)
+        return response
+
+
+def compress_response(response, min_size):
+    """Gzip the HTML page in *response* if the client allows.
+
+    Pages shorter than *min_size* bytes are sent as they are. Streamed
+    pages are compressed a piece at a time, each flushed as it is
+    sent. For clients that accept gzip, entity tags become weak, as the
+    bytes may not be those the tag was made for; this includes 304
+    responses, so that they carry the same tag as full ones.
+    """
+    if response.mimetype != 'text/html':
+        return response
+    response.vary.add('Accept-Encoding')
+    if ('Content-Encoding' in response.headers or
+            response.direct_passthrough or
+            not request.accept_encodings['gzip']):
+        return response
+    tag, weak = response.get_etag()
+    if tag is not None and not weak:
+        response.set_etag(tag, weak=True)
+    if response.status_code != 200 or request.method == 'HEAD':
+        return response
+    if response.is_streamed:
+        response.response = _gzipped(response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip.compress(data, COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _gzipped(pieces):
+    # Yield the pieces compressed as one gzip stream
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = piece.encode('utf-8')
+        yield compressor.compress(piece) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def main():
+    """Compress the static files ahead of time.
+
+    For usage information, try running this module as a program like so::
+
+      python3 assets.py --help
+    """
+    parser = argparse.ArgumentParser(
+        description='Compress static files ahead of time')
+    parser.add_argument('--folder', default='static',
+                        help='Folder of static files')
+    args = parser.parse_args()
+
+    try:
+        manifest = build(args.folder)
+    except OSError as e:
+        sys.exit('Cannot build {}: {}'.format(args.folder, e))
+    print('Compressed {} files{}.'.format(
+        len(manifest), '' if brotli else ' (install brotli for Brotli)'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""Benchmarks for the searchinator.
+
+Each module in this package is a program that prints its results to
+standard out. Run them from the top of the repository, for example::
+
+  python3 -m benchmarks.wal_writes --help
+
+"""
@@ -0,0 +1,78 @@
+"""Compare adding inators through the form and through the JSON API.
+
+For each data set size, this program starts from a data file with that
+many random inators and adds a batch more, once with a form post to
+``/add/`` per inator and once with a single post to ``/api/inators/``.
+Each form post loads and rewrites the whole data file; the batch is
+added in one transaction, which writes it once.
+
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import generate
+import searchinator
+from utils import from_datetime
+
+BATCH = 100
+
+
+def fields(n):
+    """Return the form fields of the *n* th new inator."""
+    return {'name': 'bulk-inator-{}'.format(n), 'location': 'bank',
+            'description': 'Added in bulk.', 'condition': '3'}
+
+
+def post_forms(client):
+    """Add the batch with one form post each."""
+    for n in range(BATCH):
+        client.post('/add/', data=fields(n))
+
+
+def post_batch(client):
+    """Add the batch with one API call."""
+    client.post('/api/inators/', json=[fields(n) for n in range(BATCH)])
+
+
+def measure(post, inators):
+    """Return the time *post* took, starting from *inators*."""
+    with open(searchinator.app.config['DATA_PATH'], 'w') as f:
+        json.dump({'inators': inators}, f, default=from_datetime)
+    client = searchinator.app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = 'heinz'
+    client.get('/api/inators/?size=1')
+    start = time.perf_counter()
+    post(client)
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 50000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14}'.format('inators', 'forms (ms)',
+                                        'batch (ms)'))
+    pwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            for size in args.sizes:
+                inators = generate.random_inators(size)
+                times = [measure(post_forms, inators),
+                         measure(post_batch, inators)]
+                print('{:>10} {:>14.1f} {:>14.1f}'.format(
+                    size, *(t * 1000 for t in times)))
+        finally:
+            os.chdir(pwd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare loading a JSON data file and a binary snapshot from scratch.
+
+For each data set size, this program writes the same random inators
+(and the default user) as a JSON data file and as a snapshot (see
+:mod:`snapshot`), and then times loading each one the way a freshly
+started worker does: reading, decoding and tracking the whole file.
+
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+import generate
+import snapshot
+import utils
+
+
+def best_time(load, repeat):
+    """Return the shortest time in seconds *load* took out of *repeat*."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        load()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def load_json(path):
+    """Load a JSON data file, bypassing the in-memory cache."""
+    utils.data_cache.invalidate()
+    utils.DataFile(path).load()
+    utils.data_cache.invalidate()
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of loads per measurement')
+    args = parser.parse_args()
+
+    print('{:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'inators', 'json (MB)', 'snap (MB)', 'json (s)', 'snap (s)'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        json_path = os.path.join(tmpdir, 'data.json')
+        snap_path = os.path.join(tmpdir, 'data.snapshot')
+        for size in args.sizes:
+            data = {'inators': generate.random_inators(size),
+                    'users': generate.credentials(['heinz:doof'])}
+            utils.write_atomic(json_path, utils.encode_data(data), False)
+            utils.write_atomic(snap_path, snapshot.encode_snapshot(data),
+                               False)
+            del data
+            json_time = best_time(lambda: load_json(json_path), args.repeat)
+            snap_time = best_time(
+                lambda: snapshot.SnapshotDataFile(snap_path).load(),
+                args.repeat)
+            print('{:>10} {:>10.1f} {:>10.1f} {:>10.2f} {:>10.2f}'.format(
+                size, os.path.getsize(json_path) / 1e6,
+                os.path.getsize(snap_path) / 1e6, json_time, snap_time))
+
+
+if __name__ == '__main__':
+    main()
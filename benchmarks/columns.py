@@ -0,0 +1,72 @@
+"""Compare aggregate queries over inator records and over columns.
+
+For each data set size, this program times three queries that touch
+every inator: counting by condition, selecting the inators at one
+location in a set of conditions, and sorting by the time added. Each
+query runs over the list of :class:`inator.Inator` records, and over a
+:class:`columns.ColumnStore` with and (if installed) without NumPy.
+
+"""
+import argparse
+import collections
+import time
+
+import columns
+import generate
+from condition import Condition
+
+CONDITIONS = {Condition.NEEDS_REPAIR, Condition.KINDA_WORKS}
+
+
+def record_queries(inators, location):
+    """Run the queries over a list of inator records."""
+    collections.Counter(i.condition for i in inators)
+    [i.ident for i in inators
+     if i.condition in CONDITIONS and i.location == location]
+    [i.ident for i in sorted(inators, key=lambda i: i.added)]
+
+
+def column_queries(store, location):
+    """Run the queries over a column store."""
+    store.count('condition')
+    store.idents(store.select(conditions=CONDITIONS, locations=[location]))
+    store.idents(store.sort('added'))
+
+
+def best_time(func, *args, repeat=5):
+    """Return the shortest time in seconds *func* took out of *repeat*."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    kinds = ['records', 'python']
+    if columns.numpy is not None:
+        kinds.append('numpy')
+    print(('{:>10}' + ' {:>14}' * len(kinds)).format(
+        'inators', *('{} (ms)'.format(k) for k in kinds)))
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        location = inators[0].location
+        times = [best_time(record_queries, inators, location)]
+        for vectorize in (False, True)[:len(kinds) - 1]:
+            store = columns.ColumnStore(vectorize=vectorize)
+            store.rebuild(inators)
+            times.append(best_time(column_queries, store, location))
+        print(('{:>10}' + ' {:>14.1f}' * len(times)).format(
+            size, *(t * 1000 for t in times)))
+
+
+if __name__ == '__main__':
+    main()
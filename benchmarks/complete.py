@@ -0,0 +1,53 @@
+"""Measure completing names against the number of distinct names.
+
+For each size, this program gives every inator a unique made-up name
+(see :mod:`benchmarks.fuzzy`), builds a :class:`indexes.CompletionIndex`
+and completes random prefixes of one to four letters, as typed into
+the add form. It prints the median and worst time per completion.
+
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+
+import generate
+import indexes
+from benchmarks.fuzzy import made_up_names
+
+LIMIT = 10
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Numbers of inators (and names) to measure')
+    parser.add_argument('--prefixes', type=int, default=1000,
+                        help='Number of prefixes to complete')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14} {:>14}'.format(
+        'inators', 'build (s)', 'median (ms)', 'worst (ms)'))
+    now = datetime.datetime.now()
+    for size in args.sizes:
+        names = made_up_names(size)
+        index = indexes.CompletionIndex('name')
+        start = time.perf_counter()
+        index.rebuild(generate.inator_record(name, now) for name in names)
+        build = time.perf_counter() - start
+        times = []
+        for name in random.sample(names, min(args.prefixes, len(names))):
+            prefix = name[:random.randint(1, 4)]
+            start = time.perf_counter()
+            index.complete(prefix, LIMIT)
+            times.append(time.perf_counter() - start)
+        print('{:>10} {:>14.1f} {:>14.3f} {:>14.3f}'.format(
+            size, build, statistics.median(times) * 1000,
+            max(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Measure the bytes saved by compressing static files and pages.
+
+This program compresses a copy of the static files ahead of time, as
+``python3 assets.py`` does, and compares their sizes. Then, for each
+data set size, it starts from a data file with that many random
+inators and gets the inventory list with and without
+``Accept-Encoding: gzip``, comparing the bytes sent and the time taken.
+
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import assets
+import generate
+import searchinator
+from utils import from_datetime
+
+GETS = 20
+
+
+def get(client, url, headers):
+    """Return the size in bytes of *url* and the average time to get it."""
+    client.get(url, headers=headers).close()
+    start = time.perf_counter()
+    for _ in range(GETS):
+        size = len(client.get(url, headers=headers).get_data())
+    return size, (time.perf_counter() - start) / GETS
+
+
+def main():
+    """Run the benchmark and print tables of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='Data set sizes to measure')
+    parser.add_argument('--page-size', type=int, default=500,
+                        help='Inators on each page of the list')
+    args = parser.parse_args()
+
+    pwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        folder = os.path.join(tmpdir, 'static')
+        shutil.copytree(searchinator.app.static_folder, folder)
+        manifest = assets.build(folder)
+        print('{:>30} {:>10} {:>10} {:>10}'.format('file', 'bytes', 'gzip',
+                                                   'brotli'))
+        for filename in sorted(manifest):
+            path = os.path.join(folder, filename)
+            sizes = [os.path.getsize(p) if os.path.exists(p) else '-'
+                     for p in (path, path + '.gz', path + '.br')]
+            print('{:>30} {:>10} {:>10} {:>10}'.format(filename, *sizes))
+        print()
+
+        os.chdir(tmpdir)
+        try:
+            print('{:>10} {:>12} {:>12} {:>10} {:>10}'.format(
+                'inators', 'page (kB)', 'gzip (kB)', 'plain (ms)',
+                'gzip (ms)'))
+            for size in args.sizes:
+                inators = generate.random_inators(size)
+                with open(searchinator.app.config['DATA_PATH'], 'w') as f:
+                    json.dump({'inators': inators}, f, default=from_datetime)
+                client = searchinator.app.test_client()
+                with client.session_transaction() as sess:
+                    sess['username'] = 'heinz'
+                url = '/?size={}'.format(args.page_size)
+                plain = get(client, url, {})
+                gzipped = get(client, url, {'Accept-Encoding': 'gzip'})
+                print('{:>10} {:>12.1f} {:>12.1f} {:>10.2f} {:>10.2f}'.format(
+                    size, plain[0] / 1000, gzipped[0] / 1000,
+                    plain[1] * 1000, gzipped[1] * 1000))
+        finally:
+            os.chdir(pwd)
+
+
+if __name__ == '__main__':
+    main()
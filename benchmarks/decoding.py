@@ -0,0 +1,77 @@
+"""Compare decoding a data file with and without the fast decoder.
+
+For each data set size, this program encodes random inators as a data
+file and times decoding it with the original approach (running an
+object hook on every JSON object) against :func:`utils.decode_data`.
+It also checks that both give identical results.
+
+Note that a million inators take a few gigabytes of memory.
+
+"""
+import argparse
+import json
+import time
+
+import generate
+import utils
+from condition import Condition
+
+
+def legacy_as_inator(dct):
+    """The original object hook, kept here for comparison."""
+    keyset = {'ident', 'name', 'location', 'description', 'condition', 'added'}
+    if set(dct.keys()) == keyset:
+        try:
+            new_dct = dct.copy()
+            new_dct['added'] = utils.load_time(new_dct['added'])
+            new_dct['condition'] = Condition(int(new_dct['condition']))
+            return new_dct
+        except ValueError:
+            return dct
+    else:
+        return dct
+
+
+def best_of(func, repeat):
+    """Return the result and best time in seconds of calling *func*."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs to take the best of')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14} {:>8}'.format('inators', 'hook (ms)',
+                                              'fast (ms)', 'speedup'))
+    for size in args.sizes:
+        data = {'inators': generate.random_inators(size),
+                'users': generate.credentials(['heinz:doof'])}
+        text = utils.encode_data(data)
+        del data
+
+        old, old_time = best_of(
+            lambda: json.loads(text, object_hook=legacy_as_inator),
+            args.repeat)
+        new, new_time = best_of(lambda: utils.decode_data(text), args.repeat)
+        if old != new:
+            raise SystemExit('Decoders disagree at {} inators'.format(size))
+        del old, new
+
+        print('{:>10} {:>14.1f} {:>14.1f} {:>7.2f}x'.format(
+            size, old_time * 1000, new_time * 1000, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare exporting inators streamed and built whole.
+
+For each data set size, this program exports that many random inators
+as JSON Lines, once built into one string and once with
+:func:`exporter.export_inators`, as ``/export/`` sends it. It reports
+the time taken and the peak memory allocated beyond the inators
+themselves.
+
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import exporter
+import generate
+from utils import from_datetime
+
+
+def export_whole(inators):
+    """Build the whole export before sending it."""
+    text = ''.join(json.dumps(i, default=from_datetime) + '\n'
+                   for i in inators)
+    yield text
+
+
+def export_streamed(inators):
+    """Send the export a few lines at a time."""
+    return exporter.export_inators(inators, 'jsonl')
+
+
+def measure(export, inators):
+    """Return the time and peak memory to send all of an export."""
+    start = time.perf_counter()
+    for _ in export(inators):
+        pass
+    seconds = time.perf_counter() - start
+    # Tracing slows everything down, so measure memory separately
+    tracemalloc.start()
+    for _ in export(inators):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>9} {:>12} {:>12}'.format('inators', 'mode', 'time (s)',
+                                              'peak (KiB)'))
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        for mode, export in (('whole', export_whole),
+                             ('stream', export_streamed)):
+            seconds, peak = measure(export, inators)
+            print('{:>10} {:>9} {:>12.2f} {:>12.0f}'.format(
+                size, mode, seconds, peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare filtered listings and facet counts with and without indexes.
+
+For each data set size, this program times the first page of the
+inators needing repair at one location, and the counts shown beside
+it. Without indexes, the page comes from filtering every inator and
+sorting the matches, and the counts from counting every inator. With
+them, the page is read off a :class:`indexes.ListingIndex` and the
+counts added up by a :class:`indexes.FacetIndex`.
+
+"""
+import argparse
+import collections
+import itertools
+import time
+
+import generate
+import indexes
+import storage
+from condition import Condition
+
+PAGE_SIZE = 50
+
+CONDITIONS = [Condition.NEEDS_REPAIR]
+
+
+def scan(inators, location):
+    """Filter, sort and count every inator."""
+    matches = [i for i in inators
+               if i.condition in CONDITIONS and i.location == location]
+    storage.sort_inators(matches)[:PAGE_SIZE]
+    collections.Counter(i.condition for i in inators
+                        if i.location == location)
+    collections.Counter(i.location for i in inators
+                        if i.condition in CONDITIONS)
+
+
+def indexed(listing, facets, location):
+    """Read the page and counts off the indexes."""
+    list(itertools.islice(listing.inators(conditions=CONDITIONS,
+                                          location=location), PAGE_SIZE))
+    facets.counts(CONDITIONS, location)
+
+
+def best_time(func, *args, repeat=5):
+    """Return the shortest time in seconds *func* took out of *repeat*."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14}'.format('inators', 'scan (ms)',
+                                        'indexed (ms)'))
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        listing, facets = indexes.ListingIndex(), indexes.FacetIndex()
+        listing.rebuild(inators)
+        facets.rebuild(inators)
+        location = inators[0].location
+        times = [best_time(scan, inators, location),
+                 best_time(indexed, listing, facets, location)]
+        print('{:>10} {:>14.2f} {:>14.3f}'.format(
+            size, *(t * 1000 for t in times)))
+
+
+if __name__ == '__main__':
+    main()
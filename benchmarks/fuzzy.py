@@ -0,0 +1,88 @@
+"""Compare finding similar names through a trigram index and by scanning.
+
+Generated inators reuse a hundred or so names, which any method
+handles quickly. This program instead gives every inator a unique
+made-up name, such as ``'zabu-kemi-inator'``, and then looks up
+misspelled versions of some of them, once by comparing the query with
+every name and once through a :class:`search.NameIndex`.
+
+"""
+import argparse
+import datetime
+import random
+import time
+
+import generate
+import search
+
+LIMIT = 10
+
+SYLLABLES = [c + v for c in 'bdfgklmnprstvz' for v in 'aeiou']
+
+
+def made_up_names(num):
+    """Return *num* distinct made-up inator names."""
+    names = set()
+    while len(names) < num:
+        words = [''.join(random.sample(SYLLABLES, random.randint(2, 3)))
+                 for _ in range(random.randint(1, 2))]
+        names.add('-'.join(words + ['inator']))
+    return list(names)
+
+
+def misspell(name):
+    """Return *name* with one letter dropped and two swapped."""
+    i = random.randrange(len(name) - 1)
+    name = name[:i] + name[i + 1:]
+    i = random.randrange(len(name) - 1)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def scan(names, query):
+    """Compare *query* with every name.
+
+    *names* maps names to their trigrams, worked out in advance.
+    """
+    grams = search.trigrams(query)
+    scored = [(search.similarity(grams, other), name)
+              for name, other in names.items()]
+    return sorted((m for m in scored if m[0] >= search.SIMILARITY),
+                  key=lambda m: (-m[0], m[1]))[:LIMIT]
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Numbers of inators (and names) to measure')
+    parser.add_argument('--queries', type=int, default=20,
+                        help='Number of misspelled names to look up')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14} {:>14}'.format(
+        'inators', 'build (s)', 'scan (ms)', 'index (ms)'))
+    now = datetime.datetime.now()
+    for size in args.sizes:
+        names = made_up_names(size)
+        queries = [misspell(name) for name in random.sample(names,
+                                                            args.queries)]
+        index = search.NameIndex()
+        start = time.perf_counter()
+        index.rebuild(generate.inator_record(name, now) for name in names)
+        build = time.perf_counter() - start
+        times = []
+        grams = {name: search.trigrams(name) for name in names}
+        for lookup in (lambda q: scan(grams, q),
+                       lambda q: index.similar_names(q, limit=LIMIT)):
+            start = time.perf_counter()
+            for query in queries:
+                lookup(query)
+            times.append((time.perf_counter() - start) / len(queries))
+        print('{:>10} {:>14.1f} {:>14.2f} {:>14.2f}'.format(
+            size, build, *(t * 1000 for t in times)))
+        search.trigrams.cache_clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Measure the throughput of bulk imports.
+
+For each data set size, this program writes that many random inators
+to a JSON Lines file and imports it into an empty storage of each kind
+with :func:`importer.import_inators`, once in batches of
+:data:`importer.BATCH` and, for small sizes, once saving after every
+inator, as adding them one by one through ``/add/`` would.
+
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+import generate
+import importer
+import storage
+
+ONE_BY_ONE = 1000
+"""Largest size also imported one inator per transaction."""
+
+
+def import_file(path, kind, batch):
+    """Import the file at *path* into a new storage of kind *kind*."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = storage.open_storage(kind, os.path.join(tmpdir, 'data'))
+        with open(path, newline='', encoding='utf-8') as f:
+            return importer.import_inators(store, f, 'jsonl', batch)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    parser.add_argument('--storages', nargs='+', default=['json', 'sqlite'],
+                        choices=sorted(storage.STORAGE_KINDS),
+                        help='Kinds of storage to import into')
+    args = parser.parse_args()
+
+    print('{:>10} {:>9} {:>7} {:>12} {:>12}'.format(
+        'inators', 'storage', 'batch', 'time (s)', 'per second'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'inators.jsonl')
+        for size in args.sizes:
+            rows = io.StringIO()
+            with contextlib.redirect_stdout(rows):
+                generate.print_rows(generate.random_inators(size).values(),
+                                    'jsonl')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(rows.getvalue())
+            del rows
+            batches = [importer.BATCH]
+            if size <= ONE_BY_ONE:
+                batches.insert(0, 1)
+            for kind in args.storages:
+                for batch in batches:
+                    report = import_file(path, kind, batch)
+                    print('{:>10} {:>9} {:>7} {:>12.1f} {:>12.0f}'.format(
+                        size, kind, batch, report.seconds, report.rate))
+
+
+if __name__ == '__main__':
+    main()
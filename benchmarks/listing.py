@@ -0,0 +1,74 @@
+"""Compare listing inators by sorting them and through a listing index.
+
+For each data set size, this program times getting the first page of
+the listing and a page deep into it, once by sorting every inator (as
+listing did before :class:`indexes.ListingIndex`) and once by walking
+the index from a cursor. It also times keeping the index up to date
+while inators are replaced.
+
+"""
+import argparse
+import itertools
+import time
+
+import generate
+import indexes
+import storage
+
+PAGE_SIZE = 50
+
+
+def sorted_page(inators, start):
+    """Sort every inator and slice out one page."""
+    return storage.sort_inators(inators)[start:start + PAGE_SIZE]
+
+
+def index_page(index, key):
+    """Walk the listing index from *key* for one page."""
+    return list(itertools.islice(index.inators(after=key), PAGE_SIZE))
+
+
+def replace_all(index, inators):
+    """Replace every inator in the index with a changed copy."""
+    for inator in inators:
+        index.replace(inator, inator)
+
+
+def best_time(func, *args, repeat=5):
+    """Return the shortest time in seconds *func* took out of *repeat*."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14} {:>14} {:>14} {:>14}'.format(
+        'inators', 'sort first', 'sort deep', 'index first', 'index deep',
+        'replace (us)'))
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        index = indexes.ListingIndex()
+        index.rebuild(inators)
+        deep = storage.sort_inators(inators)[size // 2]
+        key = index.cursor_key(deep.condition, deep.name, deep.ident)
+        times = [best_time(sorted_page, inators, 0),
+                 best_time(sorted_page, inators, size // 2),
+                 best_time(index_page, index, None),
+                 best_time(index_page, index, key)]
+        replace = best_time(replace_all, index, inators, repeat=1)
+        print(('{:>10}' + ' {:>11.3f} ms' * 4 + ' {:>14.2f}').format(
+            size, *(t * 1000 for t in times), replace / size * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare the memory used by dict and Inator records.
+
+This program generates random inators and measures, with
+:mod:`tracemalloc`, how much memory the same data set takes as dicts
+(the original layout) and as :class:`inator.Inator` records. Field
+values are shared between both layouts, so the difference is the
+per-record overhead.
+
+"""
+import argparse
+import gc
+import tracemalloc
+
+import generate
+from inator import Inator
+
+
+def measure(build, inators):
+    """Return the bytes allocated by calling *build* on *inators*."""
+    gc.collect()
+    tracemalloc.start()
+    result = build(inators)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def as_dicts(inators):
+    """Return the inators in the original dict layout."""
+    return [i.to_dict() for i in inators]
+
+
+def as_records(inators):
+    """Return copies of the inators as :class:`inator.Inator` records."""
+    return [Inator(*i._fields()) for i in inators]
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>14} {:>14} {:>10} {:>10}'.format(
+        'inators', 'dicts (MiB)', 'Inator (MiB)', 'dict (B)', 'Inator (B)'))
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        dict_size = measure(as_dicts, inators)
+        record_size = measure(as_records, inators)
+        print('{:>10} {:>14.1f} {:>14.1f} {:>10.0f} {:>10.0f}'.format(
+            size, dict_size / 2 ** 20, record_size / 2 ** 20,
+            dict_size / size, record_size / size))
+
+
+if __name__ == '__main__':
+    main()
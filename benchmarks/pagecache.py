@@ -0,0 +1,68 @@
+"""Compare rendering pages with serving them from the page cache.
+
+For each data set size, this program starts from a data file with that
+many random inators and gets the inventory list and an inator's page
+over and over, once with a page cache too small to keep any page, so
+that every page is rendered, and once with the default cache.
+
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import generate
+import searchinator
+from pagecache import PAGE_CACHE_SIZE
+from utils import from_datetime
+
+GETS = 100
+
+
+def get(client, url):
+    """Return the average time in seconds to get *url*."""
+    client.get(url).get_data()
+    start = time.perf_counter()
+    for _ in range(GETS):
+        client.get(url).get_data()
+    return (time.perf_counter() - start) / GETS
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    cache = searchinator.page_cache
+    print('{:>10} {:>8} {:>14} {:>14}'.format('inators', 'page',
+                                              'render (ms)', 'cached (ms)'))
+    pwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            for size in args.sizes:
+                inators = generate.random_inators(size)
+                with open(searchinator.app.config['DATA_PATH'], 'w') as f:
+                    json.dump({'inators': inators}, f, default=from_datetime)
+                client = searchinator.app.test_client()
+                with client.session_transaction() as sess:
+                    sess['username'] = 'heinz'
+                for page, url in [('list', '/'),
+                                  ('view', '/view/{}/'.format(next(
+                                      iter(inators))))]:
+                    times = []
+                    for cache.size in (0, PAGE_CACHE_SIZE):
+                        times.append(get(client, url))
+                    print('{:>10} {:>8} {:>14.2f} {:>14.3f}'.format(
+                        size, page, *(t * 1000 for t in times)))
+        finally:
+            cache.size = PAGE_CACHE_SIZE
+            os.chdir(pwd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare polling pages with and without conditional requests.
+
+For each data set size, this program starts from a data file with that
+many random inators and polls the inventory list and an inator's page,
+once sending the whole page every time and once with the ``ETag`` of
+the last response in ``If-None-Match``, which gets an empty 304 while
+nothing changed.
+
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import generate
+import searchinator
+from utils import from_datetime
+
+POLLS = 100
+
+
+def poll(client, url, headers):
+    """Return the average time in seconds to get *url*."""
+    start = time.perf_counter()
+    for _ in range(POLLS):
+        client.get(url, headers=headers).close()
+    return (time.perf_counter() - start) / POLLS
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>8} {:>14} {:>14}'.format('inators', 'page', 'full (ms)',
+                                              '304 (ms)'))
+    pwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            for size in args.sizes:
+                inators = generate.random_inators(size)
+                with open(searchinator.app.config['DATA_PATH'], 'w') as f:
+                    json.dump({'inators': inators}, f, default=from_datetime)
+                client = searchinator.app.test_client()
+                with client.session_transaction() as sess:
+                    sess['username'] = 'heinz'
+                for page, url in [('list', '/'),
+                                  ('view', '/view/{}/'.format(next(
+                                      iter(inators))))]:
+                    rv = client.get(url)
+                    rv.close()
+                    tag = {'If-None-Match': rv.headers['ETag']}
+                    times = [poll(client, url, {}), poll(client, url, tag)]
+                    print('{:>10} {:>8} {:>14.2f} {:>14.3f}'.format(
+                        size, page, *(t * 1000 for t in times)))
+        finally:
+            os.chdir(pwd)
+
+
+if __name__ == '__main__':
+    main()
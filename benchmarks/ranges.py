@@ -0,0 +1,72 @@
+"""Compare listings limited to a range of times with and without indexes.
+
+For each data set size, this program times the first page of the
+inators added in the last week and in the last year, in listing order.
+Without indexes, the page comes from filtering every inator by the time
+it was added and sorting the matches. With them, it is read off a
+:class:`indexes.ListingIndex`, which either collects the few inators in
+a short range from its time order, or walks the listing and skips the
+rare inators outside a long one.
+
+"""
+import argparse
+import datetime
+import time
+
+import generate
+import indexes
+import storage
+
+PAGE_SIZE = 50
+
+RANGES = [('week', datetime.timedelta(days=7)),
+          ('year', datetime.timedelta(days=365))]
+
+
+def scan(inators, start):
+    """Filter and sort every inator."""
+    matches = [i for i in inators if i.added >= start]
+    storage.sort_inators(matches)[:PAGE_SIZE]
+
+
+def indexed(listing, start):
+    """Read the page off the index."""
+    list(listing.inators(added_from=start, limit=PAGE_SIZE))
+
+
+def best_time(func, *args, repeat=5):
+    """Return the shortest time in seconds *func* took out of *repeat*."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    print('{:>10} {:>6} {:>10} {:>14} {:>14}'.format(
+        'inators', 'range', 'matches', 'scan (ms)', 'indexed (ms)'))
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        listing = indexes.ListingIndex()
+        listing.rebuild(inators)
+        latest = max(i.added for i in inators)
+        for label, span in RANGES:
+            start = latest - span
+            matches = sum(i.added >= start for i in inators)
+            times = [best_time(scan, inators, start),
+                     best_time(indexed, listing, start)]
+            print('{:>10} {:>6} {:>10} {:>14.2f} {:>14.3f}'.format(
+                size, label, matches, *(t * 1000 for t in times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Measure search latency against the number of inators.
+
+For each data set size, this program builds a :class:`search.SearchIndex`
+over random inators and times fetching the first page of results for
+a few kinds of queries: a word in nearly every name, a location, words
+from the descriptions (which are common, as they come from a small
+text), and words that never occur together. It also times adding and
+discarding an inator.
+
+"""
+import argparse
+import itertools
+import time
+
+import generate
+import search
+
+PAGE_SIZE = 50
+
+QUERIES = [
+    ('inator', True),
+    ('library', True),
+    ('lorem ipsum', True),
+    ('library lorem', False),
+    ('cupcake bowling alley', True),
+    ('cupcake bowling alley', False),
+]
+
+
+def first_page(index, query, match_all):
+    """Fetch the first page of results for *query*."""
+    return list(itertools.islice(index.search(query, match_all),
+                                 PAGE_SIZE))
+
+
+def change(index, inator):
+    """Discard *inator* and add it back."""
+    index.discard(inator)
+    index.add(inator)
+
+
+def best_time(func, *args, repeat=5):
+    """Return the shortest time in seconds *func* took out of *repeat*."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Data set sizes to measure')
+    args = parser.parse_args()
+
+    columns = ['build (s)', 'change (ms)'] + [
+        '{} {} (ms)'.format(q, 'all' if m else 'any') for q, m in QUERIES]
+    for size in args.sizes:
+        inators = list(generate.random_inators(size).values())
+        index = search.SearchIndex()
+        start = time.perf_counter()
+        index.rebuild(inators)
+        times = [time.perf_counter() - start,
+                 best_time(change, index, inators[0]) * 1000]
+        times += [best_time(first_page, index, query, match_all) * 1000
+                  for query, match_all in QUERIES]
+        del inators
+        print('{} inators'.format(size))
+        for column, value in zip(columns, times):
+            print('  {:>32} {:>10.3f}'.format(column, value))
+
+
+if __name__ == '__main__':
+    main()
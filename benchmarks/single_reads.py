@@ -0,0 +1,74 @@
+"""Compare the cost of reading one inator from each storage backend.
+
+For each data set size, this program fills every backend with the same
+random inators. It then times :meth:`storage.Storage.get_inator` on
+randomly chosen identifiers, while a second instance of the backend
+(standing in for another worker process) adds an inator before every
+read. This is what the ``/view/`` and ``/delete/`` routes go through
+when the data keeps changing.
+
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import generate
+import storage
+import utils
+
+
+def fill(store, inators):
+    """Add *inators* to *store* in one transaction."""
+    with store.transaction():
+        for inator in inators.values():
+            store.put_inator(inator)
+
+
+def time_reads(kind, path, idents):
+    """Return the mean time in seconds to read one changed inator."""
+    reader = storage.open_storage(kind, path)
+    writer = storage.open_storage(kind, path)
+    reader.get_inator(idents[0])
+    timeline = generate.random_timeline()
+    total = 0
+    for ident in idents:
+        writer.put_inator(generate.inator_record('bench-inator',
+                                                 next(timeline)))
+        # The JSON backend shares a cache between instances in the
+        # same process; another process would have to reload the file
+        utils.data_cache.invalidate()
+        start = time.perf_counter()
+        reader.get_inator(ident)
+        total += time.perf_counter() - start
+    return total / len(idents)
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='Data set sizes to measure')
+    parser.add_argument('--reads', type=int, default=20,
+                        help='Number of inators to read per measurement')
+    args = parser.parse_args()
+
+    kinds = ['json', 'sqlite', 'indexed']
+    print(('{:>10}' + ' {:>14}' * len(kinds)).format(
+        'inators', *('{} (ms)'.format(k) for k in kinds)))
+    for size in args.sizes:
+        inators = generate.random_inators(size)
+        idents = random.sample(list(inators), args.reads)
+        results = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for kind in kinds:
+                path = os.path.join(tmpdir, kind)
+                fill(storage.open_storage(kind, path), inators)
+                results.append(time_reads(kind, path, idents) * 1000)
+        print(('{:>10}' + ' {:>14.3f}' * len(kinds)).format(size, *results))
+
+
+if __name__ == '__main__':
+    main()
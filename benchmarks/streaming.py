@@ -0,0 +1,89 @@
+"""Compare rendering the inventory list whole and streamed.
+
+For each page size, this program renders the list template for a page
+of that many random inators, with the context the inventory list view
+builds, once into one string with
+:func:`flask.render_template` and once with
+:func:`utils.stream_template`. It reports the time until the first
+piece of the page is ready, the time for the whole page and the peak
+memory allocated while producing it.
+
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import flask
+
+import generate
+import searchinator
+import utils
+from utils import from_datetime
+
+
+def render_whole(context):
+    """Render the page into one string."""
+    yield flask.render_template('list-inators.html', **context)
+
+
+def render_streamed(context):
+    """Render the page piece by piece."""
+    return utils.stream_template('list-inators.html', **context).response
+
+
+def measure(render, context):
+    """Return time to first piece, total time and peak memory."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    pieces = iter(render(context))
+    next(pieces)
+    first = time.perf_counter() - start
+    for _ in pieces:
+        pass
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[50, 500, 5000],
+                        help='Page sizes to measure')
+    args = parser.parse_args()
+
+    app = searchinator.app
+    app.config['MAX_PAGE_SIZE'] = max(args.sizes)
+    print('{:>8} {:>8} {:>14} {:>14} {:>14}'.format(
+        'page', 'mode', 'first (ms)', 'total (ms)', 'peak (KiB)'))
+    pwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            inators = generate.random_inators(max(args.sizes))
+            with open(app.config['DATA_PATH'], 'w') as f:
+                json.dump({'inators': inators}, f, default=from_datetime)
+            for size in args.sizes:
+                url = '/?size={}'.format(size)
+                with app.test_request_context(url):
+                    with searchinator.storage.transaction() as store:
+                        # The same context as the view renders
+                        context = searchinator._list_context(store)
+                for mode, render in (('whole', render_whole),
+                                     ('stream', render_streamed)):
+                    with app.test_request_context(url):
+                        measure(render, context)
+                        first, total, peak = measure(render, context)
+                    print('{:>8} {:>8} {:>14.2f} {:>14.2f} {:>14.0f}'.format(
+                        size, mode, first * 1000, total * 1000, peak / 1024))
+        finally:
+            os.chdir(pwd)
+
+
+if __name__ == '__main__':
+    main()
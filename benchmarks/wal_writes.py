@@ -0,0 +1,92 @@
+"""Compare write latency of the JSON and write-ahead log storage modes.
+
+For each data set size, this program creates a data file of random
+inators and then adds inators one at a time through
+:func:`utils.add_data_param`, the same way the ``/add/`` route does.
+Rewriting the whole JSON file gets slower as the data set grows,
+while appending to the log stays flat.
+
+The log runs at its default compaction thresholds. Compacting rewrites
+the whole snapshot, so its cost is reported too, along with the write
+cost once compactions are spread over the records between them.
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import generate
+import utils
+import wal
+
+
+def make_data_file(path, num):
+    """Write a data file with *num* random inators to *path*."""
+    data = {'inators': generate.random_inators(num),
+            'users': generate.credentials(['heinz:doof'])}
+    with open(path, 'w') as f:
+        f.write(utils.encode_data(data))
+
+
+def time_writes(datafile, writes):
+    """Return the mean time in seconds to add one inator."""
+    @utils.add_data_param(datafile)
+    def add(data):
+        record = generate.inator_record('bench-inator',
+                                        next(generate.random_timeline()))
+        data['inators'][record['ident']] = record
+
+    # Load once so that both modes start with a warm cache
+    datafile.load()
+    start = time.perf_counter()
+    for _ in range(writes):
+        add()
+    return (time.perf_counter() - start) / writes
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='Data set sizes to measure')
+    parser.add_argument('--writes', type=int, default=50,
+                        help='Number of inators to add per measurement')
+    parser.add_argument('--fsync', action='store_true',
+                        help='Flush log records to disk')
+    args = parser.parse_args()
+
+    print('{:>10} {:>12} {:>12} {:>14} {:>12}'.format(
+        'inators', 'json (ms)', 'wal (ms)', 'compact (ms)', 'total (ms)'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'inator_data.json')
+        for size in args.sizes:
+            make_data_file(path, size)
+            plain = time_writes(utils.DataFile(path), args.writes)
+
+            make_data_file(path, size)
+            datafile = wal.LoggedDataFile(path, fsync=args.fsync)
+            logged = time_writes(datafile, args.writes)
+            if datafile.compactions:
+                # Compactions are already part of the mean write time
+                records = None
+            else:
+                # Records between compactions, by the thresholds
+                with open(path + wal.LOG_SUFFIX, 'rb') as f:
+                    lines = f.readlines()
+                record = sum(map(len, lines)) / len(lines)
+                records = min(datafile.max_records,
+                              max(1, int(datafile.max_bytes // record)))
+            start = time.perf_counter()
+            datafile.compact()
+            compact = time.perf_counter() - start
+            total = logged + (compact / records if records else 0)
+
+            print('{:>10} {:>12.3f} {:>12.3f} {:>14.3f} {:>12.3f}'.format(
+                size, plain * 1000, logged * 1000, compact * 1000,
+                total * 1000))
+
+
+if __name__ == '__main__':
+    main()
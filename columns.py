@@ -0,0 +1,218 @@
+"""Keep the fields used for counting and sorting in compact columns.
+
+This module contains :class:`ColumnStore`, a :class:`indexes.Index`
+holding one array per field instead of one record per inator:
+
+* ``condition`` as an :class:`array.array` of bytes,
+* ``added`` as 64-bit seconds since the epoch,
+* ``location`` as integer codes into a table of distinct locations.
+
+Counting, filtering and sorting every inator by these fields then
+means a pass over a few contiguous arrays. If NumPy is installed, the
+passes are vectorized; otherwise they run in plain Python with the
+same results.
+
+Rows are numbered from zero. Deleting an inator moves the last row
+into its place, so row numbers are only meaningful until the next
+change; use :meth:`ColumnStore.idents` to turn them into identifiers.
+
+"""
+import array
+import collections
+
+from condition import Condition
+from indexes import Index
+from utils import from_epoch, to_epoch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnStore(Index):
+    """Store condition, time added and location of inators as columns.
+
+    :param bool vectorize: Use NumPy for queries. Defaults to whether
+        NumPy is installed.
+
+    """
+
+    FIELDS = ('condition', 'added', 'location')
+    """Fields that can be counted and sorted by."""
+
+    def __init__(self, vectorize=None):
+        if vectorize is None:
+            vectorize = numpy is not None
+        elif vectorize and numpy is None:
+            raise ValueError('vectorizing needs NumPy')
+        self.vectorize = vectorize
+        self.clear()
+
+    def clear(self):
+        self._idents = []
+        self.locations = []
+        self._codes = {}
+        self._rows = {}
+        self.condition = array.array('b')
+        self.added = array.array('q')
+        self.location = array.array('i')
+
+    def __len__(self):
+        return len(self._idents)
+
+    def _code(self, location):
+        # Return the code of location, assigning one if needed
+        try:
+            return self._codes[location]
+        except KeyError:
+            self._codes[location] = code = len(self.locations)
+            self.locations.append(location)
+            return code
+
+    def add(self, inator):
+        self._rows[inator['ident']] = len(self._idents)
+        self._idents.append(inator['ident'])
+        self.condition.append(inator['condition'])
+        self.added.append(to_epoch(inator['added']))
+        self.location.append(self._code(inator['location']))
+
+    def discard(self, inator):
+        row = self._rows.pop(inator['ident'])
+        last = len(self._idents) - 1
+        if row != last:
+            ident = self._idents[row] = self._idents[last]
+            self._rows[ident] = row
+            for column in (self.condition, self.added, self.location):
+                column[row] = column[last]
+        for column in (self._idents, self.condition, self.added,
+                       self.location):
+            del column[last]
+
+    def rebuild(self, inators):
+        inators = list(inators)
+        self.clear()
+        self._idents = [i['ident'] for i in inators]
+        self._rows = {ident: row for row, ident in enumerate(self._idents)}
+        self.condition = array.array('b', (i['condition'] for i in inators))
+        self.added = array.array('q', (to_epoch(i['added'])
+                                       for i in inators))
+        self.location = array.array('i', (self._code(i['location'])
+                                          for i in inators))
+
+    def _column(self, field):
+        # Return the array for field, as a NumPy array if vectorizing
+        if field not in self.FIELDS:
+            raise ValueError('no column {!r}'.format(field))
+        column = getattr(self, field)
+        if self.vectorize:
+            return numpy.frombuffer(column, dtype=column.typecode)
+        return column
+
+    def idents(self, rows=None):
+        """Return the identifiers of *rows*, or of every row."""
+        if rows is None:
+            return list(self._idents)
+        return [self._idents[row] for row in rows]
+
+    def select(self, conditions=None, locations=None, added_from=None,
+               added_to=None):
+        """Return a list of the rows matching every filter given.
+
+        :param conditions: Only include these conditions
+        :param locations: Only include these locations
+        :param datetime.datetime added_from: Only include inators added
+            at or after this time
+        :param datetime.datetime added_to: Only include inators added
+            before this time
+        """
+        tests = []
+        if conditions is not None:
+            tests.append(('condition', {int(c) for c in conditions}))
+        if locations is not None:
+            codes = {self._codes[x] for x in locations if x in self._codes}
+            tests.append(('location', codes))
+        if self.vectorize:
+            mask = numpy.ones(len(self), dtype=bool)
+            for field, values in tests:
+                mask &= numpy.isin(self._column(field), list(values))
+            if added_from is not None:
+                mask &= self._column('added') >= to_epoch(added_from)
+            if added_to is not None:
+                mask &= self._column('added') < to_epoch(added_to)
+            return numpy.flatnonzero(mask).tolist()
+        rows = range(len(self))
+        for field, values in tests:
+            column = getattr(self, field)
+            rows = [row for row in rows if column[row] in values]
+        if added_from is not None:
+            start = to_epoch(added_from)
+            rows = [row for row in rows if self.added[row] >= start]
+        if added_to is not None:
+            end = to_epoch(added_to)
+            rows = [row for row in rows if self.added[row] < end]
+        return list(rows)
+
+    def count(self, field, rows=None):
+        """Return a dict counting the values of *field* in *rows*.
+
+        *field* is ``'condition'`` or ``'location'``, and the keys are
+        :class:`condition.Condition` values or location names. Without
+        *rows*, every row is counted.
+        """
+        if field not in ('condition', 'location'):
+            raise ValueError('cannot count {!r}'.format(field))
+        if self.vectorize:
+            column = self._column(field)
+            if rows is not None:
+                column = column[numpy.asarray(rows, dtype=numpy.intp)]
+            counts = numpy.bincount(column)
+            counts = {v: int(n) for v, n in enumerate(counts) if n}
+        else:
+            column = getattr(self, field)
+            if rows is not None:
+                column = [column[row] for row in rows]
+            counts = collections.Counter(column)
+        if field == 'condition':
+            return {Condition(v): n for v, n in counts.items()}
+        return {self.locations[v]: n for v, n in counts.items()}
+
+    def sort(self, field, rows=None, reverse=False):
+        """Return *rows* (or every row) sorted by *field*.
+
+        The sort is stable, also when *reverse* is true: rows with the
+        same value keep their order.
+        """
+        if self.vectorize:
+            column = self._column(field)
+            if rows is None:
+                rows = numpy.arange(len(self))
+            else:
+                rows = numpy.asarray(rows, dtype=numpy.intp)
+            keys = column[rows]
+            if field == 'location':
+                # Sort by name rather than by code
+                order = numpy.argsort(numpy.argsort(self.locations))
+                keys = order[keys]
+            if reverse:
+                keys = -keys.astype(numpy.int64)
+            return rows[numpy.argsort(keys, kind='stable')].tolist()
+        column = self._column(field)
+        if rows is None:
+            rows = range(len(self))
+        if field == 'location':
+            locations = self.locations
+            return sorted(rows, key=lambda row: locations[column[row]],
+                          reverse=reverse)
+        return sorted(rows, key=column.__getitem__, reverse=reverse)
+
+    def added_range(self):
+        """Return the earliest and latest time added, or None if empty."""
+        if not len(self):
+            return None
+        if self.vectorize:
+            column = self._column('added')
+            first, last = int(column.min()), int(column.max())
+        else:
+            first, last = min(self.added), max(self.added)
+        return from_epoch(first), from_epoch(last)
@@ -0,0 +1,110 @@
+"""Export inators as JSON Lines or CSV.
+
+This module turns inators into the lines of a JSON Lines or CSV file,
+the formats read by :mod:`importer`. The lines are generated as they
+are needed, a few at a time, so exporting takes the same memory however
+many inators there are. Times are written with
+:func:`utils.dump_time`, and conditions as numbers.
+
+This module can also be run as a program::
+
+  python3 exporter.py > inators.jsonl
+  python3 exporter.py --storage=sqlite --path=inators.db --format=csv
+
+The web application offers the same export at ``/export/``.
+
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+from inator import Inator
+from storage import open_storage
+from utils import dump_time, from_datetime
+
+BUFFER = 1000
+"""Number of lines generated together."""
+
+
+def _jsonl_lines(inators):
+    # Yield a line of JSON for every inator
+    for inator in inators:
+        yield json.dumps(inator, default=from_datetime) + '\n'
+
+
+class _Line:
+    # A file for csv.writer whose write returns what it was given
+    def write(self, text):
+        return text
+
+
+def _csv_lines(inators):
+    # Yield a header line, then a line for every inator
+    writer = csv.writer(_Line())
+    yield writer.writerow(Inator.FIELDS)
+    for inator in inators:
+        yield writer.writerow((inator.ident, inator.name, inator.location,
+                               inator.description, int(inator.condition),
+                               dump_time(inator.added)))
+
+
+FORMATS = {
+    'jsonl': (_jsonl_lines, 'application/x-ndjson'),
+    'csv': (_csv_lines, 'text/csv'),
+}
+"""Line generators and media types, by format."""
+
+
+def export_inators(inators, format):
+    """Iterate over the text of *inators* exported as *format*.
+
+    Each piece holds up to :data:`BUFFER` lines.
+
+    :param str format: One of the names in :data:`FORMATS`
+    :raises ValueError: If *format* is unknown
+    """
+    try:
+        lines = FORMATS[format][0](inators)
+    except KeyError:
+        raise ValueError('unknown format {!r}'.format(format))
+    return _buffered(lines)
+
+
+def _buffered(lines):
+    # Join the lines BUFFER at a time
+    while True:
+        text = ''.join(itertools.islice(lines, BUFFER))
+        if not text:
+            return
+        yield text
+
+
+def main():
+    """Export inators to standard out.
+
+    For usage information, try running this module as a program like so::
+
+      python3 exporter.py --help
+    """
+    parser = argparse.ArgumentParser(
+        description='Export -inators as JSON Lines or CSV')
+    parser.add_argument('--format', choices=sorted(FORMATS),
+                        default='jsonl', help='Format to write')
+    parser.add_argument('--storage', default='json',
+                        help='Kind of storage to export from')
+    parser.add_argument('--path', default='inator_data.json',
+                        help='Path of the storage')
+    args = parser.parse_args()
+
+    try:
+        store = open_storage(args.storage, args.path)
+        for text in export_inators(store.iter_inators(), args.format):
+            sys.stdout.write(text)
+    except (OSError, ValueError) as e:
+        sys.exit('Cannot export {}: {}'.format(args.path, e))
+
+
+if __name__ == '__main__':
+    main()
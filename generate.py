@@ -11,7 +11,10 @@ generated data to a file, consider using file redirection like so::
     python3.5 generate.py --inators=5 > data.json
 
 The ``> data.json`` part tells your shell to redirect output from
-the standard out pipe to a file instead.
+the standard out pipe to a file instead. With ``--format=snapshot``,
+the data is printed as a binary snapshot (see :mod:`snapshot`). With
+``--format=jsonl`` or ``--format=csv``, only the inators are printed,
+one per line, ready for :mod:`importer`.
 
 """
 import argparse
@@ -25,7 +28,10 @@ import uuid
 import operator
 import functools
 
+import exporter
+import snapshot
 from condition import Condition
+from inator import Inator
 from utils import from_datetime
 
 
@@ -86,21 +92,27 @@ PLACES = ['airport', 'apartment building', 'bank', 'barber shop',
           'mall', 'supermarket', 'train station']
 
 
-def random_timeline():
+TIMELINE_SPAN = datetime.timedelta(days=20 * 365)
+"""Longest time covered by the inators of :func:`random_inators`."""
+
+
+def random_timeline(shortest=datetime.timedelta(hours=25),
+                    longest=datetime.timedelta(hours=72)):
     """Return a generator that yields ``datetime`` s.
 
     The generator yields randomly spaced ``datetime`` s in reverse
     chronological order. That is, every yielded ``datetime``
     represents a time that is further in the past than the one yielded
     before it. The difference between two successive ``datetime`` s is
-    a random value between 24 to 72 hours.
+    a random value between *shortest* and *longest*, which default to
+    25 and 72 hours.
 
     """
     prev = None
     while True:
         if prev is None:
             prev = datetime.datetime.now()
-        delta = datetime.timedelta(hours=random.randint(25, 72))
+        delta = random.uniform(shortest, longest)
         current = prev - delta
         yield current
         prev = current
@@ -109,7 +121,7 @@ def random_timeline():
 def inator_record(name, added):
     """Return an inator record.
 
-    Return a dictionary that represents data for an inator. Each
+    Return an :class:`inator.Inator` that represents data for an inator. Each
     record contains a randomly generated identifier, a random
     location, a random condition, and a random description. The name
     of the inator and the date/time it was added are requried as parameters.
@@ -118,30 +130,40 @@ def inator_record(name, added):
     :param datetime.datetime added: The date/time the inator record
         was added to the searchinator.
 
-    :return: A dictionary representing an inator
-    :rtype: dict
+    :return: An inator
+    :rtype: inator.Inator
 
     """
-    return {
-        'ident': str(uuid.uuid4()),
-        'name': name,
-        'added': added,
-        'location': random.choice(PLACES),
-        'condition': Condition(random.randint(1, 5)),
-        'description': ' '.join(random.sample(LOREM_IPSUM,
-                                              random.randint(1, 5)))
-    }
+    return Inator(
+        ident=str(uuid.uuid4()),
+        name=name,
+        added=added,
+        location=random.choice(PLACES),
+        condition=Condition(random.randint(1, 5)),
+        description=' '.join(random.sample(LOREM_IPSUM,
+                                           random.randint(1, 5)))
+    )
 
 
 def random_inators(num):
     """Generate *num* random inators.
 
+    Names are unique as long as *num* does not exceed the number of
+    known names in :data:`INATORS`; larger data sets repeat names.
+    Very large data sets are spaced more closely in time, so that they
+    fit into :data:`TIMELINE_SPAN`.
+
     :param int num: The number of inators to generate
     :return: A dict mapping an inator's identifier to its record
     :rtype: dict
     """
-    chosen = random.sample(INATORS, num)
-    records = (inator_record(i, t) for i, t in zip(chosen, random_timeline()))
+    if num <= len(INATORS):
+        chosen = random.sample(INATORS, num)
+    else:
+        chosen = (random.choice(INATORS) for _ in range(num))
+    longest = min(datetime.timedelta(hours=72), TIMELINE_SPAN / max(num, 1))
+    timeline = random_timeline(longest * 25 / 72, longest)
+    records = (inator_record(i, t) for i, t in zip(chosen, timeline))
     return {x['ident']: x for x in records}
 
 
@@ -162,6 +184,12 @@ def credentials(lst):
     return {u: {"username": u, "password": p} for u, p in pairs}
 
 
+def print_rows(inators, format):
+    """Print *inators* one per line, as JSON Lines or as CSV."""
+    for text in exporter.export_inators(inators, format):
+        sys.stdout.write(text)
+
+
 def main():
     """Generate data suitable for use in the searchinator.
 
@@ -176,6 +204,11 @@ def main():
     parser.add_argument('--credentials',
                         type=str, nargs='+', default=['heinz:doof'],
                         help='Add additional credentials as username:password')
+    parser.add_argument('--format', choices=['json', 'snapshot', 'jsonl',
+                                             'csv'],
+                        default='json',
+                        help='Print JSON, a binary snapshot (see '
+                        'snapshot.py), or inators as JSON Lines or CSV')
     args = parser.parse_args()
 
     # Check number of inators
@@ -198,6 +231,13 @@ def main():
         "users": credentials(args.credentials)
     }
 
+    if args.format == 'snapshot':
+        sys.stdout.buffer.write(snapshot.encode_snapshot(data))
+        return {}
+    if args.format in ('jsonl', 'csv'):
+        print_rows(data['inators'].values(), args.format)
+        return {}
+
     # Print the data as a JSON object
     print(json.dumps(data, indent=4, default=from_datetime))
 
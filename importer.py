@@ -0,0 +1,206 @@
+"""Import inators in bulk from JSON Lines or CSV.
+
+This module streams rows of inators into a :class:`storage.Storage`,
+one line at a time, so that files of any size can be imported with
+bounded memory. Rows are added in batches of :data:`BATCH` inators,
+each in one transaction, so the data is saved once per batch rather
+than once per inator.
+
+Each row has the fields of the form of ``/add/``: a name, location,
+description and condition. A row may also give the ``ident`` and the
+time ``added``, as in data files; other rows get new ones. In JSON
+Lines files every line is an object; CSV files start with a header
+naming the columns. Invalid rows are rejected and reported, and the
+rest are imported anyway.
+
+This module can also be run as a program::
+
+  python3 generate.py --inators=50 --format=jsonl > inators.jsonl
+  python3 importer.py inators.jsonl
+  python3 importer.py --storage=sqlite --path=inators.db inators.csv
+
+The web application offers the same import at ``/import/``.
+
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+
+from storage import open_storage
+from utils import INATOR_FIELDS, new_inator, parse_time
+
+BATCH = 10000
+"""Number of inators added in each transaction."""
+
+MAX_ERRORS = 100
+"""Number of rejected rows whose errors are kept in a report."""
+
+
+def _jsonl_rows(f):
+    # Yield the line number and text of every line that is not blank
+    for line, text in enumerate(f, 1):
+        if text.strip():
+            yield line, text
+
+
+def _csv_rows(f):
+    # Yield the line number and dict of every row
+    reader = csv.DictReader(f)
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        raise ValueError('line {}: {}'.format(reader.line_num, e))
+
+
+FORMATS = {
+    'jsonl': (_jsonl_rows, json.loads),
+    'csv': (_csv_rows, dict),
+}
+"""Readers and decoders of rows, by format."""
+
+
+def guess_format(filename):
+    """Return the format of the file called *filename*, or None."""
+    for name in FORMATS:
+        if filename.lower().endswith('.' + name):
+            return name
+    return None
+
+
+def row_inator(row):
+    """Return the inator in the decoded *row*.
+
+    :raises ValueError: If the row is not a valid inator
+    """
+    if not isinstance(row, dict):
+        raise ValueError('not an object')
+    unknown = [str(key) for key in row if key not in INATOR_FIELDS]
+    if unknown:
+        raise ValueError('unknown fields {}'.format(', '.join(unknown)))
+    ident = row.get('ident') or None
+    if ident is not None and not isinstance(ident, str):
+        raise ValueError('ident must be a string')
+    added = row.get('added') or None
+    if added is not None:
+        try:
+            added = parse_time(added)
+        except TypeError:
+            raise ValueError('added must be a string')
+    return new_inator(row, ident, added)
+
+
+class ImportReport:
+    """Tell how an import went.
+
+    :ivar int imported: Number of inators imported
+    :ivar int rejected: Number of rows rejected
+    :ivar list errors: ``(line, message)`` tuples for the first
+        :data:`MAX_ERRORS` rejected rows
+    :ivar float seconds: Time the import took
+
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        """Inators imported per second."""
+        return self.imported / self.seconds if self.seconds else 0.0
+
+    def reject(self, line, message):
+        """Count the row on *line* as rejected because of *message*."""
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+
+def import_inators(store, f, format, batch=BATCH):
+    """Import the inators in the text file *f* into *store*.
+
+    Inators replace any with the same identifier. Batches imported
+    before an error reading *f* are kept.
+
+    :param str format: One of the names in :data:`FORMATS`
+    :param int batch: Add this many inators in each transaction
+    :return: An :class:`ImportReport`
+    :raises ValueError: If *format* is unknown, or the rest of *f*
+        cannot be read
+    """
+    try:
+        read, decode = FORMATS[format]
+    except KeyError:
+        raise ValueError('unknown format {!r}'.format(format))
+    report = ImportReport()
+    start = time.perf_counter()
+    rows = read(f)
+    while True:
+        chunk = list(itertools.islice(rows, batch))
+        if not chunk:
+            break
+        inators = []
+        for line, row in chunk:
+            try:
+                inators.append(row_inator(decode(row)))
+            except ValueError as e:
+                report.reject(line, str(e))
+        if inators:
+            with store.transaction():
+                for inator in inators:
+                    store.put_inator(inator)
+        report.imported += len(inators)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main():
+    """Import inators from a file.
+
+    For usage information, try running this module as a program like so::
+
+      python3 importer.py --help
+    """
+    parser = argparse.ArgumentParser(
+        description='Import -inators from JSON Lines or CSV')
+    parser.add_argument('source', help='The file to import, or - for stdin')
+    parser.add_argument('--format', choices=sorted(FORMATS),
+                        help='Format of the file; guessed from its name '
+                             'by default')
+    parser.add_argument('--storage', default='json',
+                        help='Kind of storage to import into')
+    parser.add_argument('--path',
+                        help='Path of the storage; by default, the usual '
+                             'one for its kind')
+    parser.add_argument('--batch', type=int, default=BATCH,
+                        help='Number of inators saved at a time')
+    args = parser.parse_args()
+
+    format = args.format or guess_format(args.source)
+    if format is None:
+        parser.error('cannot guess the format of {}'.format(args.source))
+    try:
+        store = open_storage(args.storage, args.path)
+        if args.source == '-':
+            report = import_inators(store, sys.stdin, format, args.batch)
+        else:
+            with open(args.source, newline='', encoding='utf-8') as f:
+                report = import_inators(store, f, format, args.batch)
+    except (OSError, ValueError) as e:
+        sys.exit('Cannot import {}: {}'.format(args.source, e))
+
+    for line, message in report.errors:
+        print('line {}: {}'.format(line, message), file=sys.stderr)
+    print('Imported {} inators in {:.1f} s ({:.0f} per second), '
+          'rejected {} rows.'.format(report.imported, report.seconds,
+                                     report.rate, report.rejected))
+
+
+if __name__ == '__main__':
+    main()
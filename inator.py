@@ -0,0 +1,95 @@
+"""Represent an inator record.
+
+This module contains a compact, immutable record type for inators.
+Every field is an attribute, and for code written against the older
+dict records, fields can also be read with ``inator['name']``.
+
+An :class:`Inator` converts to and from the dict layout stored in data
+files::
+
+  inator = Inator.from_dict(record)
+  assert inator.to_dict() == record
+
+"""
+
+
+class Inator:
+    """Represent an inator.
+
+    Instances use ``__slots__`` and cannot be modified; use
+    :meth:`replace` to get a modified copy.
+
+    """
+
+    __slots__ = ('ident', 'name', 'location', 'description', 'condition',
+                 'added')
+
+    FIELDS = __slots__
+    """Names of the fields, in the order :meth:`__init__` takes them."""
+
+    def __init__(self, ident, name, location, description, condition,
+                 added):
+        # Set the slots directly, as __setattr__ refuses to
+        _set_ident(self, ident)
+        _set_name(self, name)
+        _set_location(self, location)
+        _set_description(self, description)
+        _set_condition(self, condition)
+        _set_added(self, added)
+
+    @classmethod
+    def from_dict(cls, dct):
+        """Return an inator with the fields in the dict *dct*."""
+        return cls(dct['ident'], dct['name'], dct['location'],
+                   dct['description'], dct['condition'], dct['added'])
+
+    def to_dict(self):
+        """Return a dict of the fields."""
+        return {'ident': self.ident, 'name': self.name,
+                'location': self.location, 'description': self.description,
+                'condition': self.condition, 'added': self.added}
+
+    def replace(self, **changes):
+        """Return a copy with the given fields changed."""
+        fields = self.to_dict()
+        fields.update(changes)
+        return Inator(**fields)
+
+    def keys(self):
+        """Return the names of the fields, like :meth:`dict.keys`."""
+        return self.FIELDS
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Inator objects cannot be modified')
+
+    def __delattr__(self, name):
+        raise AttributeError('Inator objects cannot be modified')
+
+    def __eq__(self, other):
+        if isinstance(other, Inator):
+            return self._fields() == other._fields()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return Inator, self._fields()
+
+    def __repr__(self):
+        return 'Inator({})'.format(', '.join(
+            '{}={!r}'.format(f, getattr(self, f)) for f in self.FIELDS))
+
+    def _fields(self):
+        return (self.ident, self.name, self.location, self.description,
+                self.condition, self.added)
+
+
+(_set_ident, _set_name, _set_location, _set_description, _set_condition,
+ _set_added) = (getattr(Inator, f).__set__ for f in Inator.FIELDS)
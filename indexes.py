@@ -0,0 +1,621 @@
+"""Keep in-memory indexes over inators.
+
+This module contains the :class:`Index` interface for indexes that a
+:class:`storage.Storage` keeps in sync with its inators (see
+:meth:`storage.Storage.add_index`), along with :class:`ListingIndex`,
+which keeps inators in listing order, :class:`FacetIndex`, which
+counts them by condition and location, :class:`CompletionIndex`,
+which completes the beginnings of field values, and
+:class:`VersionIndex`, which counts changes to tell when pages are
+out of date.
+
+Ordered indexes are built on :class:`SortedList`, which adds and
+removes keys in logarithmic time instead of sorting again.
+
+"""
+import bisect
+import collections
+import datetime
+import itertools
+import math
+import uuid
+
+
+class Index:
+    """Interface for in-memory indexes over the inators of a storage.
+
+    An index is registered with :meth:`storage.Storage.add_index`. The
+    storage calls :meth:`add`, :meth:`replace` and :meth:`discard` for
+    every inator put or deleted through it, once the transaction doing
+    so is persisted. If the inators changed some other way (for
+    example, in another process), the index is rebuilt with
+    :meth:`rebuild` before it is next used.
+
+    """
+
+    def clear(self):
+        """Forget every inator."""
+        raise NotImplementedError
+
+    def add(self, inator):
+        """Add *inator*, which is not in the index."""
+        raise NotImplementedError
+
+    def discard(self, inator):
+        """Remove *inator*, which is in the index."""
+        raise NotImplementedError
+
+    def replace(self, old, new):
+        """Replace *old* with *new*, an inator with the same identifier.
+
+        Subclasses may override this to keep the position of *old*.
+        """
+        self.discard(old)
+        self.add(new)
+
+    def rebuild(self, inators):
+        """Replace the contents of the index with *inators*.
+
+        Subclasses may override this with something faster than
+        adding the inators one at a time.
+        """
+        self.clear()
+        for inator in inators:
+            self.add(inator)
+
+
+class SortedList:
+    """A sorted collection of unique keys.
+
+    Keys are kept in a list of sorted chunks of at most
+    :attr:`CHUNK` keys, so adding or removing a key costs a binary
+    search plus moving part of one chunk, however many keys there are.
+    The chunk sizes are also kept in a Fenwick tree, so that counting
+    the keys before one (see :meth:`rank`) takes two binary searches
+    and a sum over a logarithmic number of chunks.
+
+    """
+
+    CHUNK = 1000
+    """Number of keys per chunk when building, and half the maximum."""
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self._chunks = [keys[i:i + self.CHUNK]
+                        for i in range(0, len(keys), self.CHUNK)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(keys)
+        self._build_tree()
+
+    def _build_tree(self):
+        # Recreate the Fenwick tree of chunk sizes, after chunks were
+        # split or removed
+        tree = [len(chunk) for chunk in self._chunks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _resize(self, i, delta):
+        # Add delta to the size of chunk i in the tree
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i |= i + 1
+
+    def _offset(self, i):
+        # Return the number of keys in the chunks before chunk i
+        total = 0
+        while i > 0:
+            total += self._tree[i - 1]
+            i &= i - 1
+        return total
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def __reversed__(self):
+        return itertools.chain.from_iterable(
+            reversed(chunk) for chunk in reversed(self._chunks))
+
+    def __contains__(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        return chunk[j] == key
+
+    def add(self, key):
+        """Add *key*, which must not be in the list yet."""
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            self._build_tree()
+        else:
+            i = bisect.bisect_left(self._maxes, key)
+            if i == len(self._maxes):
+                i -= 1
+                self._chunks[i].append(key)
+                self._maxes[i] = key
+            else:
+                bisect.insort(self._chunks[i], key)
+            if len(self._chunks[i]) > 2 * self.CHUNK:
+                chunk = self._chunks[i]
+                self._chunks[i:i + 1] = [chunk[:self.CHUNK],
+                                         chunk[self.CHUNK:]]
+                self._maxes[i:i + 1] = [chunk[self.CHUNK - 1], chunk[-1]]
+                self._build_tree()
+            else:
+                self._resize(i, 1)
+        self._len += 1
+
+    def remove(self, key):
+        """Remove *key*.
+
+        :raises KeyError: If *key* is not in the list
+        """
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            raise KeyError(key)
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        if chunk[j] != key:
+            raise KeyError(key)
+        del chunk[j]
+        if not chunk:
+            del self._chunks[i]
+            del self._maxes[i]
+            self._build_tree()
+        else:
+            self._maxes[i] = chunk[-1]
+            self._resize(i, -1)
+        self._len -= 1
+
+    def rank(self, key):
+        """Return the number of keys smaller than *key*."""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return self._len
+        return self._offset(i) + bisect.bisect_left(self._chunks[i], key)
+
+    def between(self, start=None, stop=None):
+        """Return the number of keys from *start* up to *stop*.
+
+        Either bound may be None for no bound.
+        """
+        return ((self._len if stop is None else self.rank(stop)) -
+                (0 if start is None else self.rank(start)))
+
+    def after(self, key=None):
+        """Iterate over the keys greater than *key* (or all), ascending."""
+        if key is None:
+            return iter(self)
+        i = bisect.bisect_right(self._maxes, key)
+        if i == len(self._maxes):
+            return iter(())
+        chunk = self._chunks[i]
+        j = bisect.bisect_right(chunk, key)
+        return itertools.chain(itertools.islice(chunk, j, None),
+                               *self._chunks[i + 1:])
+
+    def before(self, key=None):
+        """Iterate over the keys smaller than *key* (or all), descending."""
+        if key is None:
+            return reversed(self)
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return reversed(self)
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        return itertools.chain(
+            reversed(chunk[:j]),
+            *(reversed(c) for c in reversed(self._chunks[:i])))
+
+
+class ListingIndex(Index):
+    """Keep inators in listing order.
+
+    The order is that of :func:`storage.sort_inators`: by condition,
+    best first, then by name, and then in storage order. Keys are
+    ``(-condition, name, sequence)`` tuples, where the sequence number
+    reproduces storage order: inators get increasing numbers as they
+    are added, and keep theirs when they are replaced.
+
+    Besides the list of every key, there is one per location, and keys
+    of one condition form a range in either, so listings filtered by
+    condition or location only visit the inators they list.
+
+    Inators are also kept in order of the time they were added, as
+    ``(added, sequence)`` keys. A listing limited to a time range either
+    collects the inators in the range and sorts them, or walks the
+    listing order skipping inators outside the range, whichever should
+    visit fewer inators.
+
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._sorted = SortedList()
+        self._locations = {}
+        self._times = SortedList()
+        self._keys = {}
+        self._inators = {}
+        self._next = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _key(self, inator, sequence):
+        return (-inator['condition'], inator['name'], sequence)
+
+    def _insert(self, inator, key):
+        self._sorted.add(key)
+        location = self._locations.get(inator['location'])
+        if location is None:
+            location = self._locations[inator['location']] = SortedList()
+        location.add(key)
+        self._times.add((inator['added'], key[2]))
+        self._keys[inator['ident']] = key
+        self._inators[key[2]] = inator
+
+    def _remove(self, inator):
+        # Go by the inator as it was indexed, as storages may have
+        # rounded the time it was added since
+        key = self._keys.pop(inator['ident'])
+        inator = self._inators.pop(key[2])
+        self._sorted.remove(key)
+        location = self._locations[inator['location']]
+        location.remove(key)
+        if not location:
+            del self._locations[inator['location']]
+        self._times.remove((inator['added'], key[2]))
+        return key
+
+    def add(self, inator):
+        self._insert(inator, self._key(inator, self._next))
+        self._next += 1
+
+    def discard(self, inator):
+        self._remove(inator)
+
+    def replace(self, old, new):
+        key = self._remove(old)
+        self._insert(new, self._key(new, key[2]))
+
+    def rebuild(self, inators):
+        self.clear()
+        locations = {}
+        for inator in inators:
+            key = self._key(inator, self._next)
+            self._next += 1
+            locations.setdefault(inator['location'], []).append(key)
+            self._keys[inator['ident']] = key
+            self._inators[key[2]] = inator
+        self._sorted = SortedList(self._keys.values())
+        self._locations = {location: SortedList(keys)
+                           for location, keys in locations.items()}
+        self._times = SortedList((inator['added'], seq)
+                                 for seq, inator in self._inators.items())
+
+    def cursor_key(self, condition, name, ident, before=False):
+        """Return the key of a page cursor's inator.
+
+        The arguments are those returned by :func:`storage.parse_cursor`.
+        If the cursor's inator is gone or was changed, the key points
+        at the start of the inators with the same condition and name,
+        or at their end if *before* is true, so none of them are
+        skipped.
+        """
+        key = self._keys.get(ident)
+        if key is not None and key[:2] == (-condition, name):
+            return key
+        return (-condition, name, self._next if before else -1)
+
+    def inators(self, after=None, before=None, conditions=None,
+                location=None, added_from=None, added_to=None, limit=None):
+        """Iterate over inators in listing order.
+
+        :param tuple after: Start after this key, going forwards
+        :param tuple before: Start before this key, going backwards
+        :param conditions: Only include inators with one of these
+            :class:`condition.Condition` values
+        :param str location: Only include inators at this location
+        :param datetime.datetime added_from: Only include inators added
+            at or after this time
+        :param datetime.datetime added_to: Only include inators added
+            before this time
+        :param int limit: Stop after this many inators
+        """
+        if added_from is None and added_to is None:
+            keys = self._listing_keys(after, before, conditions, location)
+        else:
+            # Bounds for the time keys, which are all greater than
+            # (added_from,) and all less than (added_to,)
+            start = None if added_from is None else (added_from,)
+            stop = None if added_to is None else (added_to,)
+            count = self._times.between(start, stop)
+            # Walking the listing until limit inators in the range turn
+            # up visits about limit * len / count of them; collecting
+            # the range visits count, but also sorts them
+            walked = len(self)
+            if limit is not None:
+                walked = min(walked, limit * len(self) / max(count, 1))
+            if count * math.log2(count + 2) <= walked:
+                keys = self._range_keys(start, stop, after, before,
+                                        conditions, location)
+            else:
+                def in_range(key):
+                    added = self._inators[key[2]]['added']
+                    return ((added_from is None or added >= added_from) and
+                            (added_to is None or added < added_to))
+                keys = filter(in_range, self._listing_keys(
+                    after, before, conditions, location))
+        return itertools.islice(
+            map(self._inators.__getitem__, map(_sequence, keys)), limit)
+
+    def _listing_keys(self, after, before, conditions, location):
+        # Iterate over the keys of the listing, visiting only matches
+        keys = self._sorted
+        if location is not None:
+            keys = self._locations.get(location, SortedList())
+        if conditions is None:
+            if before is not None:
+                return keys.before(before)
+            return keys.after(after)
+        return itertools.chain.from_iterable(
+            self._condition_keys(keys, condition, after, before)
+            for condition in sorted(set(conditions), reverse=before is None))
+
+    @staticmethod
+    def _condition_keys(keys, condition, after, before):
+        # Iterate over the keys of one condition, past after or before
+        if before is not None:
+            found = keys.before(min(before, (1 - condition,)))
+        else:
+            found = keys.after(max(after or (), (-condition,)))
+        return itertools.takewhile(lambda key: key[0] == -condition, found)
+
+    def _range_keys(self, start, stop, after, before, conditions, location):
+        # Return the sorted listing keys of inators added between start
+        # and stop that pass the filters
+        times = self._times.after(start)
+        if stop is not None:
+            times = itertools.takewhile(lambda key: key < stop, times)
+        if conditions is not None:
+            conditions = set(conditions)
+        keys = []
+        for _, seq in times:
+            inator = self._inators[seq]
+            if ((conditions is None or inator['condition'] in conditions) and
+                    (location is None or inator['location'] == location)):
+                key = self._keys[inator['ident']]
+                if ((after is None or key > after) and
+                        (before is None or key < before)):
+                    keys.append(key)
+        keys.sort(reverse=before is not None)
+        return keys
+
+
+def _sequence(key):
+    # Return the sequence number of a listing key
+    return key[2]
+
+
+class FacetIndex(Index):
+    """Count inators by condition and location.
+
+    The index keeps the inators of every pair of condition and
+    location, as ``(added, ident)`` keys in a :class:`SortedList`.
+    There are only a few such pairs, so counts for any filters are
+    added up from them without looking at the inators; counting those
+    added in a time range takes two binary searches per pair.
+
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._pairs = {}
+        self._entries = {}
+
+    def add(self, inator):
+        pair = inator['condition'], inator['location']
+        key = inator['added'], inator['ident']
+        keys = self._pairs.get(pair)
+        if keys is None:
+            keys = self._pairs[pair] = SortedList()
+        keys.add(key)
+        self._entries[inator['ident']] = pair, key
+
+    def discard(self, inator):
+        # Go by the inator as it was indexed, as storages may have
+        # rounded the time it was added since
+        pair, key = self._entries.pop(inator['ident'])
+        keys = self._pairs[pair]
+        keys.remove(key)
+        if not keys:
+            del self._pairs[pair]
+
+    def rebuild(self, inators):
+        self.clear()
+        pairs = {}
+        for inator in inators:
+            pair = inator['condition'], inator['location']
+            key = inator['added'], inator['ident']
+            pairs.setdefault(pair, []).append(key)
+            self._entries[inator['ident']] = pair, key
+        self._pairs = {pair: SortedList(keys) for pair, keys in pairs.items()}
+
+    def counts(self, conditions=None, location=None, added_from=None,
+               added_to=None):
+        """Return counts of the inators passing listing filters.
+
+        The filters are those of :meth:`storage.Storage.list_inators`.
+        Counts by condition only apply the location filter, and counts
+        by location only the condition filter, so each count is the
+        number of inators listed when choosing that value instead.
+        Every count applies the time filters.
+
+        :return: The number of inators passing every filter, a dict
+            counting them by condition and a dict counting them by
+            location. Values without inators are left out.
+        """
+        if conditions is not None:
+            conditions = set(conditions)
+        start = None if added_from is None else (added_from,)
+        stop = None if added_to is None else (added_to,)
+        total = 0
+        by_condition = collections.Counter()
+        by_location = collections.Counter()
+        for (condition, where), keys in self._pairs.items():
+            wanted = conditions is None or condition in conditions
+            here = location is None or where == location
+            if not (wanted or here):
+                continue
+            count = keys.between(start, stop)
+            if not count:
+                continue
+            if here:
+                by_condition[condition] += count
+            if wanted:
+                by_location[where] += count
+            if wanted and here:
+                total += count
+        return total, dict(by_condition), dict(by_location)
+
+
+class CompletionIndex(Index):
+    """Complete the beginnings of the values of one inator field.
+
+    Distinct values are kept in a :class:`SortedList` by their
+    case-folded form, so completing a prefix is a binary search
+    followed by reading off as many values as wanted.
+
+    :param str field: The field to complete, such as ``'name'``
+    :param vocabulary: Values to offer even if no inator has them
+
+    """
+
+    def __init__(self, field, vocabulary=()):
+        self.field = field
+        self.vocabulary = frozenset(vocabulary)
+        self.clear()
+
+    def clear(self):
+        self._counts = dict.fromkeys(self.vocabulary, 0)
+        self._sorted = SortedList(map(self._key, self.vocabulary))
+
+    def __len__(self):
+        return len(self._counts)
+
+    @staticmethod
+    def _key(value):
+        return value.casefold(), value
+
+    def add(self, inator):
+        value = inator[self.field]
+        count = self._counts.get(value)
+        if count is None:
+            self._sorted.add(self._key(value))
+            count = 0
+        self._counts[value] = count + 1
+
+    def discard(self, inator):
+        value = inator[self.field]
+        count = self._counts[value] - 1
+        if count or value in self.vocabulary:
+            self._counts[value] = count
+        else:
+            del self._counts[value]
+            self._sorted.remove(self._key(value))
+
+    def rebuild(self, inators):
+        counts = dict.fromkeys(self.vocabulary, 0)
+        for inator in inators:
+            value = inator[self.field]
+            counts[value] = counts.get(value, 0) + 1
+        self._counts = counts
+        self._sorted = SortedList(map(self._key, counts))
+
+    def count(self, value):
+        """Return the number of inators with *value*."""
+        return self._counts.get(value, 0)
+
+    def complete(self, prefix, limit):
+        """Return up to *limit* values starting with *prefix*.
+
+        Case is ignored, and the values come in alphabetical order.
+        """
+        prefix = prefix.casefold()
+        keys = itertools.takewhile(lambda key: key[0].startswith(prefix),
+                                   self._sorted.after((prefix,)))
+        return [value for _, value in itertools.islice(keys, limit)]
+
+
+def _now():
+    # Return the current UTC time, rounded up to whole seconds as HTTP
+    # dates have no fractions
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    if now.microsecond:
+        now = now.replace(microsecond=0) + datetime.timedelta(seconds=1)
+    return now
+
+
+class VersionIndex(Index):
+    """Count changes to the inators, overall and for each one.
+
+    Every change raises :attr:`version` by one, and an inator's version
+    is the version of the last change to it. Each also remembers when
+    it last changed, in UTC.
+
+    Versions start over from zero whenever the index is rebuilt, when
+    it also gets a new random :attr:`generation`. The generation and a
+    version together therefore never stand for two different states.
+
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.generation = uuid.uuid4().hex
+        self.version = 0
+        self.modified = _now()
+        self._inators = {}
+
+    def __len__(self):
+        return len(self._inators)
+
+    def _change(self):
+        self.version += 1
+        self.modified = _now()
+
+    def add(self, inator):
+        self._change()
+        self._inators[inator['ident']] = (self.version, self.modified)
+
+    def discard(self, inator):
+        self._change()
+        del self._inators[inator['ident']]
+
+    def replace(self, old, new):
+        self.add(new)
+
+    def rebuild(self, inators):
+        self.clear()
+        self._inators = dict.fromkeys((i['ident'] for i in inators),
+                                      (self.version, self.modified))
+
+    def inator(self, ident):
+        """Return the version of an inator and when it last changed.
+
+        :raises KeyError: If there is no such inator
+        """
+        return self._inators[ident]
@@ -0,0 +1,102 @@
+"""Share a JSON data file safely between processes.
+
+This module contains :class:`LockedDataFile`, a storage mode for
+:func:`utils.add_data_param` meant for running several worker
+processes against the same data file. It relies on :mod:`fcntl` and
+therefore only works on Unix.
+
+* Loading takes a shared lock, so it never overlaps with a write.
+* Saving takes an exclusive lock and writes the whole file through
+  :func:`utils.write_atomic`, so readers without the lock still see
+  either the old or the new file, never half of one.
+* If another process saved the file since it was loaded, the change
+  records (see :mod:`tracking`) of this process are replayed over the
+  newer data before writing it. Two workers adding inators at the
+  same time therefore both keep their inator.
+
+The locks are taken on a separate file next to the data file (the
+data file path plus ``.lock``), since the data file itself is replaced
+on every save.
+
+"""
+import contextlib
+import fcntl
+import os
+
+from tracking import apply_change, track
+from utils import (DataFile, data_cache, decode_data, encode_data,
+                   file_signature, write_atomic)
+
+LOCK_SUFFIX = '.lock'
+"""Suffix appended to the data file path to get the lock file path."""
+
+
+@contextlib.contextmanager
+def locked(path, exclusive=False):
+    """Hold an :func:`fcntl.flock` lock on the file at *path*.
+
+    The file is created if necessary. The lock is shared unless
+    *exclusive* is true.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+class LockedDataFile(DataFile):
+    """Load and save a JSON data file shared by several processes.
+
+    :param str path: Path to the data file
+    :param bool fsync: Flush the new file to disk before replacing the
+        old one
+
+    """
+
+    def __init__(self, path, fsync=True):
+        super().__init__(path)
+        self.fsync = fsync
+
+    @property
+    def lock_path(self):
+        """Absolute path of the lock file."""
+        return os.path.abspath(self.path) + LOCK_SUFFIX
+
+    def load(self):
+        """Return the tracked data, read under a shared lock.
+
+        :raises FileNotFoundError: If the data file does not exist
+        """
+        with locked(self.lock_path):
+            return data_cache.load(self.path)
+
+    def save(self, data, changes):
+        """Write *data* under an exclusive lock.
+
+        If the file changed since *data* was loaded, *changes* are
+        applied to the current contents of the file instead.
+        """
+        with locked(self.lock_path, exclusive=True):
+            entry = data_cache.lookup(self.path)
+            loaded = entry[0] if entry and entry[1] is data else None
+            try:
+                current = file_signature(os.stat(self.path))
+            except FileNotFoundError:
+                current = None
+            if current != loaded:
+                if current is None:
+                    data = track({})
+                elif not changes:
+                    # Someone else created the file; nothing to add
+                    return
+                else:
+                    with open(self.path, 'r') as f:
+                        data = track(decode_data(f.read()))
+                for change in changes:
+                    apply_change(data, *change, merge=True)
+            del data.tracker.changes[:]
+            write_atomic(self.path, encode_data(data), self.fsync)
+            data_cache.store(self.path, data)
@@ -0,0 +1,187 @@
+"""Keep rendered pages in memory between changes to the inators.
+
+This module contains :class:`PageCache`, a bounded cache of rendered
+HTML pages, and :func:`cached_page`, which wraps a view to serve its
+pages from the cache. Between changes, a page looks the same to every
+user except for the flashed messages, so pages are cached without
+messages and the current user's are spliced in where
+:data:`MESSAGES` marks their place in ``base.html``.
+
+A page is cached under the template, the version of the data it shows,
+the identifier of the inator it shows (if just one) and the path with
+its query string. The cache is also an :class:`indexes.Index`, so when
+an inator changes, the pages showing it and the pages listing inators
+are dropped straight away, while those of other inators are kept.
+
+"""
+import collections
+import functools
+import threading
+
+from flask import (Response, make_response, render_template, request,
+                   session)
+
+from indexes import Index
+
+MESSAGES = '<!-- messages -->'
+"""Comment following the flashed messages in every page."""
+
+PAGE_CACHE_SIZE = 256
+"""Default number of pages kept."""
+
+
+class PageCache(Index):
+    """A least-recently-used cache of rendered pages.
+
+    Keys are ``(template, version, ident, path)`` tuples, where *ident*
+    is the identifier of the only inator a page shows, or None for
+    pages listing inators.
+
+    The :attr:`hits`, :attr:`misses` and :attr:`evictions` counters
+    record how often a page was served from the cache, how often it
+    had to be rendered, and how many pages were dropped to make room.
+
+    :param int size: Keep at most this many pages
+
+    """
+
+    def __init__(self, size=PAGE_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._pages = collections.OrderedDict()
+            self._idents = {}
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        """Return the page cached under *key*, or None.
+
+        Pages are returned as the text before and after the place of
+        the flashed messages.
+        """
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, text):
+        """Cache the page *text* under *key*.
+
+        Pages without :data:`MESSAGES` are not cached.
+        """
+        head, marker, tail = text.partition(MESSAGES)
+        if not marker:
+            return
+        with self._lock:
+            if key not in self._pages:
+                self._idents.setdefault(key[2], set()).add(key)
+            self._pages[key] = (head, marker + tail)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.size:
+                self._drop(next(iter(self._pages)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        # Forget the page under key
+        del self._pages[key]
+        keys = self._idents[key[2]]
+        keys.discard(key)
+        if not keys:
+            del self._idents[key[2]]
+
+    def invalidate(self, ident):
+        """Drop the pages listing inators and those showing *ident*."""
+        with self._lock:
+            for each in (None, ident):
+                for key in list(self._idents.get(each, ())):
+                    self._drop(key)
+
+    def add(self, inator):
+        self.invalidate(inator['ident'])
+
+    def discard(self, inator):
+        self.invalidate(inator['ident'])
+
+    def replace(self, old, new):
+        self.invalidate(new['ident'])
+
+    def rebuild(self, inators):
+        self.clear()
+
+    def stats(self):
+        """Return a dict of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'pages': len(self._pages),
+                    'size': self.size,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+def cached_page(storage, name, template, version):
+    """Wrap a view rendering *template* to serve its pages from a cache.
+
+    The cache is the :class:`PageCache` registered in *storage* under
+    *name*, so that it is brought up to date before it is used.
+    *version* is called with the view's arguments and returns the
+    version of the data the page shows and the identifier of the inator
+    it shows (or None), or None if the page cannot be cached. Pages
+    rendered while there are flashed messages are not cached, as they
+    include them.
+    """
+    def wrapper(func):
+        @functools.wraps(func)
+        def wrapper2(*args, **kwargs):
+            found = None
+            if request.method in ('GET', 'HEAD'):
+                found = version(*args, **kwargs)
+            if found is None:
+                return func(*args, **kwargs)
+            key = (template, found[0], found[1], request.full_path)
+            with storage.index(name) as cache:
+                page = cache.get(key)
+            if page is not None:
+                head, tail = page
+                return Response(head + render_template('messages.html') +
+                                tail, mimetype='text/html')
+            # Rendering takes the messages out of the session
+            flashed = bool(session.get('_flashes'))
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200 or flashed:
+                return response
+            if response.is_streamed:
+                response.response = _kept(storage, name, key,
+                                          response.response)
+            else:
+                _put(storage, name, key, response.get_data(as_text=True))
+            return response
+        return wrapper2
+    return wrapper
+
+
+def _put(storage, name, key, text):
+    # Cache the page text under key in the cache called name
+    with storage.index(name) as cache:
+        cache.put(key, text)
+
+
+def _kept(storage, name, key, pieces):
+    # Yield the pieces of a streamed page, caching it once complete
+    text = []
+    for piece in pieces:
+        text.append(piece)
+        yield piece
+    _put(storage, name, key, ''.join(
+        p if isinstance(p, str) else p.decode('utf-8') for p in text))
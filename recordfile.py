@@ -0,0 +1,281 @@
+"""Read single records out of a file without decoding the rest.
+
+This module contains :class:`RecordFile`, the on-disk format behind
+:class:`storage.IndexedStorage`. Records are ``(kind, name, value)``
+triples, such as ``('inator', ident, record)``. They are kept in two
+files:
+
+* The data file, where every write appends one JSON line
+  ``[kind, name, value]``. A deletion appends a line whose value is
+  ``null``.
+* The index file (the data file path plus ``.idx``), where every write
+  appends one JSON line ``[kind, name, offset, length]`` locating the
+  current data line of that record, or ``[kind, name, -1, 0]`` for a
+  deletion.
+
+The index is kept in memory as a dict, and the data file is
+memory-mapped, so reading one record is a dict lookup plus decoding
+one line, however many records there are. The index can always be
+rebuilt from the data file, which happens automatically if it is
+missing or does not match the data.
+
+Once most of the data file consists of replaced or deleted records,
+both files are compacted.
+
+Like :mod:`wal`, this format assumes a single writing process.
+
+"""
+import json
+import mmap
+import os
+import threading
+
+from utils import as_inator, encode_data, file_signature, write_atomic
+
+INDEX_SUFFIX = '.idx'
+"""Suffix appended to the data file path to get the index path."""
+
+
+class RecordFile:
+    """Append-only records with an offset index.
+
+    :param str path: Path to the data file
+    :param int min_compact: Never compact data files smaller than this
+    :param bool fsync: Flush writes to disk before returning
+
+    """
+
+    def __init__(self, path, min_compact=1 << 20, fsync=True):
+        self.path = path
+        self.min_compact = min_compact
+        self.fsync = fsync
+        self.rebuilds = 0
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, key):
+        self._key = key
+        self._index = {}
+        self._index_signature = None
+        self._index_offset = 0
+        self._data_signature = None
+        self._map = None
+        self._live = 0
+
+    @property
+    def index_path(self):
+        """Absolute path of the index file."""
+        return os.path.abspath(self.path) + INDEX_SUFFIX
+
+    def refresh(self):
+        """Pick up writes made since the last call, by anyone."""
+        with self._lock:
+            key = os.path.abspath(self.path)
+            if key != self._key:
+                self._reset(key)
+            try:
+                data = file_signature(os.stat(key))
+            except FileNotFoundError:
+                self._reset(key)
+                return
+            if data[:2] != (self._data_signature or data)[:2]:
+                # The data file was replaced by a compaction
+                self._reset(key)
+            if data != self._data_signature:
+                self._data_signature = data
+                self._map = None
+            try:
+                index = file_signature(os.stat(self.index_path))
+            except FileNotFoundError:
+                index = None
+            if index is None or (self._index_signature and
+                                 index[:2] != self._index_signature[:2]):
+                self._index_offset = 0
+                self._index = {}
+                self._live = 0
+            if index is None:
+                self._rebuild()
+            elif index != self._index_signature:
+                self._read_index()
+
+    def signature(self):
+        """Return the file signature of the data file, or None.
+
+        The signature changes with every write; see
+        :func:`utils.file_signature`.
+        """
+        with self._lock:
+            self.refresh()
+            return self._data_signature
+
+    def _read_index(self):
+        with open(self.index_path, 'rb') as f:
+            self._index_signature = file_signature(os.fstat(f.fileno()))
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn write; the next append replaces it
+                    break
+                kind, name, offset, length = json.loads(line.decode('utf-8'))
+                self._set(kind, name, offset, length)
+                self._index_offset += len(line)
+
+    def _set(self, kind, name, offset, length):
+        # Replaced records keep their place in the index, like dict keys
+        if offset >= 0:
+            old = self._index.get((kind, name))
+            self._index[kind, name] = (offset, length)
+            self._live += length
+        else:
+            old = self._index.pop((kind, name), None)
+        if old is not None:
+            self._live -= old[1]
+
+    def _rebuild(self):
+        # Recreate the index by scanning the data file
+        self._map = None
+        self._index = {}
+        self._live = 0
+        lines = []
+        with open(self._key, 'rb') as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    kind, name, value = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    # Garbled by a torn write; nothing after it is
+                    # trusted either
+                    break
+                entry = (offset, len(line)) if value is not None else (-1, 0)
+                self._set(kind, name, *entry)
+                lines.append([kind, name, *entry])
+                offset += len(line)
+        write_atomic(self.index_path, ''.join(
+            json.dumps(x) + '\n' for x in lines), self.fsync)
+        self._index_signature = file_signature(os.stat(self.index_path))
+        self._index_offset = self._index_signature[2]
+        self.rebuilds += 1
+
+    def _read(self, offset, length):
+        end = offset + length
+        if self._map is None or len(self._map) < end:
+            with open(self._key, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        record = json.loads(self._map[offset:end].decode('utf-8'))
+        if record[0] == 'inator' and isinstance(record[2], dict):
+            record[2] = as_inator(record[2])
+        return record
+
+    def get(self, kind, name):
+        """Return the value of a record.
+
+        :raises KeyError: If there is no such record
+        """
+        with self._lock:
+            self.refresh()
+            return self._get(kind, name)
+
+    def _get(self, kind, name):
+        with self._lock:
+            for attempt in range(2):
+                offset, length = self._index[kind, name]
+                try:
+                    record = self._read(offset, length)
+                except ValueError:
+                    record = None
+                if record is not None and record[:2] == [kind, name]:
+                    return record[2]
+                # The index is out of date
+                self._rebuild()
+            raise KeyError((kind, name))
+
+    def names(self, kind):
+        """Return a list of the names of all records of *kind*."""
+        with self._lock:
+            self.refresh()
+            return [n for k, n in self._index if k == kind]
+
+    def items(self, kind):
+        """Return a list of ``(name, value)`` pairs for records of *kind*."""
+        with self._lock:
+            return [(n, self._get(kind, n)) for n in self.names(kind)]
+
+    def write(self, records):
+        """Append records, given as ``(kind, name, value)`` triples.
+
+        A value of None deletes the record.
+        """
+        with self._lock:
+            self.refresh()
+            with open(self._key, 'a+b') as f:
+                _drop_torn_tail(f)
+                offset = f.tell()
+                lines, entries = [], []
+                for kind, name, value in records:
+                    line = encode_data([kind, name, value]) + '\n'
+                    line = line.encode('utf-8')
+                    if value is None:
+                        entries.append([kind, name, -1, 0])
+                    else:
+                        entries.append([kind, name, offset, len(line)])
+                    lines.append(line)
+                    offset += len(line)
+                f.write(b''.join(lines))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            with open(self.index_path, 'ab') as f:
+                if f.tell() > self._index_offset:
+                    f.truncate(self._index_offset)
+                f.write(''.join(json.dumps(e) + '\n' for e in entries)
+                        .encode('utf-8'))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            for entry in entries:
+                self._set(*entry)
+            self._data_signature = file_signature(os.stat(self._key))
+            self._index_signature = file_signature(os.stat(self.index_path))
+            self._index_offset = self._index_signature[2]
+            size = self._data_signature[2]
+            if size >= self.min_compact and size > 2 * self._live:
+                self.compact()
+
+    def compact(self):
+        """Rewrite both files with only the current records."""
+        with self._lock:
+            self.refresh()
+            records = [(kind, name, self._get(kind, name))
+                       for kind, name in list(self._index)]
+            data, index, offset = [], [], 0
+            for kind, name, value in records:
+                line = encode_data([kind, name, value]) + '\n'
+                length = len(line.encode('utf-8'))
+                data.append(line)
+                index.append(json.dumps([kind, name, offset, length]) + '\n')
+                offset += length
+            # If we die between the two, the index no longer matches and
+            # gets rebuilt from the data file
+            write_atomic(self._key, ''.join(data), self.fsync)
+            write_atomic(self.index_path, ''.join(index), self.fsync)
+            self._reset(self._key)
+            self.refresh()
+
+
+def _drop_torn_tail(f, block=4096):
+    # Cut an incomplete last line, left behind by a crash, off the end
+    # of the file open in f, leaving it positioned at the end
+    end = f.seek(0, os.SEEK_END)
+    while end > 0:
+        start = max(0, end - block)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            end = start + newline + 1
+            break
+        end = start
+    if f.seek(0, os.SEEK_END) > end:
+        f.truncate(end)
+        f.seek(end)
@@ -0,0 +1,303 @@
+"""Search inators by the words in their name, location and description.
+
+This module contains :class:`SearchIndex`, an inverted index mapping
+each word to the inators containing it, and :class:`NameIndex`, which
+finds inators with names similar to a possibly misspelled one. Both
+are :class:`indexes.Index` es, so a storage keeps them up to date as
+inators are added and deleted.
+
+Every word of an inator gets a weight: the sum of the
+:data:`WEIGHTS` of the fields it appears in. An inator's score for a
+query is the sum, over the words of the query it contains, of that
+weight times the rarity of the word (its inverse document frequency).
+
+Postings are grouped by weight, so the inators with a given weight for
+a word can be found without looking at the others. Searching walks
+the combinations of weights in order of decreasing score and only
+visits the inators of a combination once the better ones have been
+exhausted. Fetching the first page of results therefore takes time
+in proportion to the page size, not to the number of matches.
+
+"""
+import collections
+import functools
+import heapq
+import math
+import re
+
+from indexes import Index
+
+WEIGHTS = {'name': 3, 'location': 2, 'description': 1}
+"""Weight of a word in each field searched."""
+
+SIMILARITY = 0.3
+"""Least similarity of the names found by :class:`NameIndex`."""
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Return the list of lowercase words in *text*."""
+    return _WORD_RE.findall(text.lower())
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _words(text):
+    # Names and locations repeat a lot, so remember their words
+    return frozenset(tokenize(text))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def trigrams(name):
+    """Return the set of character trigrams of *name*.
+
+    Case and anything but letters and digits are ignored, so
+    ``'Cool-Inator'`` and ``'coolinator'`` have the same trigrams. Like
+    in PostgreSQL's pg_trgm, the name is padded with two spaces in front
+    and one behind, so that beginnings weigh more than endings.
+    """
+    key = ''.join(c for c in name.lower() if c.isalnum())
+    if not key:
+        return frozenset()
+    key = '  ' + key + ' '
+    return frozenset(key[i:i + 3] for i in range(len(key) - 2))
+
+
+def similarity(a, b):
+    """Return the share of trigrams the sets *a* and *b* have in common."""
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+class _Match(collections.namedtuple('_Match', 'similarity name')):
+    # A similar name. Better matches compare greater: more similar
+    # ones, then those earlier in alphabetical order.
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return (self.similarity, other.name) < (other.similarity, self.name)
+
+
+def word_weights(inator):
+    """Return a dict mapping the words of *inator* to their weights."""
+    weights = {}
+    for field, weight in WEIGHTS.items():
+        for word in _words(inator[field]):
+            weights[word] = weights.get(word, 0) + weight
+    return weights
+
+
+class SearchIndex(Index):
+    """Find inators by the words they contain.
+
+    For each word, the index holds a dict mapping weights to the
+    identifiers of the inators with that weight for the word. The
+    identifiers are kept in dicts rather than sets so that they stay in
+    the order they were indexed, which is how results with the same
+    score are ordered.
+
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._postings = {}
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, inator):
+        ident = inator['ident']
+        for word, weight in word_weights(inator).items():
+            levels = self._postings.get(word)
+            if levels is None:
+                levels = self._postings[word] = {}
+            levels.setdefault(weight, {})[ident] = None
+        self._len += 1
+
+    def discard(self, inator):
+        ident = inator['ident']
+        for word, weight in word_weights(inator).items():
+            levels = self._postings[word]
+            del levels[weight][ident]
+            if not levels[weight]:
+                del levels[weight]
+                if not levels:
+                    del self._postings[word]
+        self._len -= 1
+
+    def count(self, word):
+        """Return the number of inators containing *word*."""
+        return sum(map(len, self._postings.get(word, {}).values()))
+
+    def search(self, query, match_all=True):
+        """Iterate over the identifiers of inators matching *query*.
+
+        The best matches come first. The iterator walks the index
+        lazily, so it must be used up before the index changes.
+
+        :param str query: Words to look for
+        :param bool match_all: Only match inators containing every
+            word, rather than any of them
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        postings = [self._postings.get(word) for word in words]
+        if match_all and not all(postings):
+            return
+        postings = [levels for levels in postings if levels]
+        if not postings:
+            return
+
+        # For each word, the scores it can add, best first, along with
+        # the inators adding them. Without match_all, a word may also
+        # be missing, adding nothing.
+        choices = []
+        for levels in postings:
+            idf = math.log(1 + self._len / sum(map(len, levels.values())))
+            scores = sorted(((weight * idf, bucket)
+                             for weight, bucket in levels.items()),
+                            key=lambda choice: choice[0], reverse=True)
+            if not match_all:
+                scores.append((0.0, None))
+            choices.append(scores)
+
+        def score(combination):
+            return sum(choices[i][c][0] for i, c in enumerate(combination))
+
+        # Visit combinations of choices best first, starting from the
+        # best choice for every word
+        start = (0,) * len(choices)
+        heap = [(-score(start), start)]
+        seen = {start}
+        while heap:
+            _, combination = heapq.heappop(heap)
+            yield from self._matches(postings, choices, combination)
+            for i, c in enumerate(combination):
+                if c + 1 < len(choices[i]):
+                    successor = combination[:i] + (c + 1,) + \
+                        combination[i + 1:]
+                    if successor not in seen:
+                        seen.add(successor)
+                        heapq.heappush(heap, (-score(successor), successor))
+
+    def _matches(self, postings, choices, combination):
+        # Yield the inators in exactly the given combination of choices
+        present, missing = [], []
+        for levels, scores, c in zip(postings, choices, combination):
+            bucket = scores[c][1]
+            if bucket is None:
+                missing.extend(levels.values())
+            else:
+                present.append(bucket)
+        if not present:
+            return
+        present.sort(key=len)
+        first, rest = present[0], present[1:]
+        for ident in first:
+            if (all(ident in bucket for bucket in rest) and
+                    not any(ident in bucket for bucket in missing)):
+                yield ident
+
+
+class NameIndex(Index):
+    """Find inators by similar names, tolerating typos.
+
+    Names are compared by :func:`similarity` of their
+    :func:`trigrams`. The index maps each trigram to the distinct names
+    containing it, and each name to the identifiers of its inators, so
+    a name shared by many inators is only compared once.
+
+    Rather than comparing the query with every name, only names
+    containing one of its rarer trigrams are compared. A name at least
+    *threshold* similar to the query shares at least that part of the
+    query's trigrams, so it must contain one of the others. When only
+    the best few names are wanted, the threshold rises to the
+    similarity of the worst of them found so far, and fewer trigrams
+    need looking at.
+
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._postings = {}
+        self._grams = {}
+        self._names = {}
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, inator):
+        name = inator['name']
+        idents = self._names.get(name)
+        if idents is None:
+            idents = self._names[name] = {}
+            grams = self._grams[name] = trigrams(name)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(name)
+        idents[inator['ident']] = None
+        self._len += 1
+
+    def discard(self, inator):
+        name = inator['name']
+        idents = self._names[name]
+        del idents[inator['ident']]
+        if not idents:
+            del self._names[name]
+            for gram in self._grams.pop(name):
+                names = self._postings[gram]
+                names.discard(name)
+                if not names:
+                    del self._postings[gram]
+        self._len -= 1
+
+    def similar_names(self, query, limit=None, threshold=SIMILARITY):
+        """Return the names most similar to *query*.
+
+        :param int limit: Return at most this many names
+        :param float threshold: Leave out names less similar than this
+        :return: A list of ``(similarity, name)`` tuples, most similar
+            first, then by name
+        """
+        grams = trigrams(query)
+        postings = sorted((self._postings[gram] for gram in grams
+                           if gram in self._postings), key=len)
+        # The best names so far, in a heap with the worst first
+        best = []
+        seen = set()
+        for i, names in enumerate(postings):
+            # Names not seen yet have at most the remaining trigrams.
+            # Round down a little, so that 0.3 * 10 does not need 4.
+            needed = max(1, math.ceil(threshold * len(grams) - 1e-9))
+            if len(postings) - i < needed:
+                break
+            for name in names - seen:
+                score = similarity(grams, self._grams[name])
+                if score < threshold:
+                    continue
+                match = _Match(score, name)
+                if limit is None or len(best) < limit:
+                    heapq.heappush(best, match)
+                elif best[0] < match:
+                    heapq.heapreplace(best, match)
+                if limit is not None and len(best) == limit:
+                    threshold = max(threshold, best[0].similarity)
+            seen |= names
+        return [(m.similarity, m.name) for m in sorted(best, reverse=True)]
+
+    def search(self, query, limit=None, threshold=SIMILARITY):
+        """Iterate over identifiers of inators with names like *query*.
+
+        Inators with more similar names come first; those with the same
+        name come in the order they were indexed. The iterator must be
+        used up before the index changes.
+
+        :param int limit: Only look at this many of the most similar
+            names, which is enough to find that many inators
+        """
+        for _, name in self.similar_names(query, limit, threshold):
+            yield from self._names[name]
@@ -18,83 +18,474 @@ application) in debug mode if it is running in production. Customers
 get scared when they see tracebacks.
 
 """
-import uuid
-
-from flask import abort, Flask, flash, redirect, request, session, url_for
-from datetime import datetime
-
-from utils import add_data_param, uses_template, login_required
+import io
+import itertools
+
+from flask import (abort, Flask, flash, jsonify, redirect, request, Response,
+                   session, stream_with_context, url_for)
+
+from assets import Assets, compress_response
+from utils import (add_storage_param, conditional, dump_time,
+                   load_day_or_time, login_required, new_inator,
+                   parse_condition, uses_template)
+from storage import DEFAULT_PATHS, open_storage, page_cursor
+from columns import ColumnStore
+from exporter import export_inators
+from exporter import FORMATS as EXPORT_FORMATS
+from importer import guess_format, import_inators
+from generate import PLACES
+from indexes import CompletionIndex, FacetIndex, VersionIndex
+from pagecache import cached_page, PageCache
+from search import NameIndex, SearchIndex
 
 # login_required, uses_template
 from condition import Condition
 
 app = Flask(__name__)
 app.secret_key = 'very.secret'
-app.config['DATA_PATH'] = 'inator_data.json'
+app.config['STORAGE'] = 'json'
+app.config['DATA_PATH'] = DEFAULT_PATHS[app.config['STORAGE']]
+app.config['PAGE_SIZE'] = 50
+app.config['MAX_PAGE_SIZE'] = 500
+app.config['COMPLETIONS'] = 10
+app.config['MAX_COMPLETIONS'] = 50
+app.config['MAX_BATCH'] = 1000
+app.config['GZIP_MIN_SIZE'] = 1024
+
+assets = Assets(app.static_folder, 'send_asset')
+app.add_template_global(assets.url, 'asset_url')
+
+storage = open_storage(app.config['STORAGE'], app.config['DATA_PATH'])
+storage.add_index('versions', VersionIndex())
+page_cache = PageCache()
+storage.add_index('pages', page_cache)
+storage.add_index('columns', ColumnStore())
+storage.add_index('facets', FacetIndex())
+storage.add_index('search', SearchIndex())
+storage.add_index('names', NameIndex())
+storage.add_index('name_completions', CompletionIndex('name'))
+storage.add_index('location_completions',
+                  CompletionIndex('location', PLACES))
+
+
+def _inventory_version():
+    # Return the entity tag and modification time of the inventory
+    with storage.index('versions') as versions:
+        return ('{}-{}'.format(versions.generation, versions.version),
+                versions.modified)
+
+
+def _inator_version(ident):
+    # Return the entity tag and modification time of one inator, or
+    # None if there is no such inator
+    with storage.index('versions') as versions:
+        try:
+            version, modified = versions.inator(ident)
+        except KeyError:
+            return None
+        return '{}-{}'.format(versions.generation, version), modified
+
+
+def _inventory_page():
+    # Return the version of the list pages
+    return _inventory_version()[0], None
+
+
+def _inator_page(ident):
+    # Return the version and identifier of the page of one inator, or
+    # None if there is no such inator
+    found = _inator_version(ident)
+    return None if found is None else (found[0], ident)
 
 
 @app.route('/')
 @login_required
-@add_data_param(app.config['DATA_PATH'])
-@uses_template('list-inators.html')
-def list_inators(data):
-    """List all inators."""
+@conditional(_inventory_version)
+@cached_page(storage, 'pages', 'list-inators.html', _inventory_page)
+@add_storage_param(storage)
+@uses_template('list-inators.html', stream=True)
+def list_inators(store):
+    """List inators, one page at a time.
+
+    The list can be filtered by one or more conditions, by location and
+    by when inators were added (``added_from`` up to, but not including,
+    ``added_to``), and comes with counts of the inators for each choice
+    of filter.
+    """
+    return _list_context(store)
+
+
+def _list_context(store):
+    # Return the context of the list template for the current request.
+    # Aborts with 400 if the query string is invalid.
+    size = _page_size()
+    after = request.args.get('after')
+    before = request.args.get('before')
+    added = {k: request.args[k] for k in ('added_from', 'added_to')
+             if request.args.get(k)}
     try:
-        # Sorting inators by name
-        lst = sorted(data['inators'].values(), key=lambda x: x['name'])
-        # Sorting inators by condition
-        lst = sorted(lst, key=lambda x: x['condition'], reverse=True)
-        return {'inators': lst}
+        filters = _listing_filters(request.args)
+        # Sorted by condition, then by name
+        inators, more = store.list_page(size, after=after, before=before,
+                                        **filters)
+    except ValueError:
+        abort(400)
+    conditions, location = filters['conditions'], filters['location']
+    with store.index('facets') as facets:
+        total, by_condition, by_location = facets.counts(**filters)
+
+    # Keep the time filters in the links, and the page size if it was
+    # chosen explicitly
+    sized = {'size': size} if 'size' in request.args else {}
+    args = dict(added, **sized)
+    chosen = set(conditions or ())
+    prev_url = next_url = None
+    if inators and (more if before else after):
+        prev_url = _list_url(chosen, location, before=page_cursor(inators[0]),
+                             **args)
+    if inators and (more if not before else True):
+        next_url = _list_url(chosen, location, after=page_cursor(inators[-1]),
+                             **args)
+
+    # Choosing a condition adds it to the filter, or takes it out again
+    condition_facets = [
+        (c, by_condition.get(c, 0), c in chosen,
+         _list_url(chosen ^ {c}, location, **args))
+        for c in sorted(Condition, reverse=True)]
+    if location is not None:
+        by_location.setdefault(location, 0)
+    location_facets = [
+        (where, count, where == location,
+         _list_url(chosen, None if where == location else where, **args))
+        for where, count in sorted(by_location.items(),
+                                   key=lambda x: (-x[1], x[0]))]
+    return {'inators': inators, 'prev_url': prev_url, 'next_url': next_url,
+            'total': total, 'conditions': condition_facets,
+            'locations': location_facets, 'added': added,
+            'chosen': [int(c) for c in conditions or ()],
+            'location': location,
+            'exports': [
+                (label, url_for('download_inators', format=format,
+                                condition=sorted(map(int, chosen),
+                                                 reverse=True),
+                                location=location, **added))
+                for format, label in [('jsonl', 'JSON Lines'),
+                                      ('csv', 'CSV')]],
+            'clear_url': (_list_url(set(), None, **sized)
+                          if chosen or location or added else None)}
+
+
+def _page_size():
+    # Return the page size asked for, within the configured limits
+    size = request.args.get('size', app.config['PAGE_SIZE'], type=int)
+    return max(1, min(size, app.config['MAX_PAGE_SIZE']))
+
+
+def _listing_filters(args):
+    # Return the listing filters in the query string args, as keyword
+    # arguments for list_page. Raises ValueError if one is invalid.
+    filters = {
+        'conditions': sorted({parse_condition(c)
+                              for c in args.getlist('condition')},
+                             reverse=True) or None,
+        'location': args.get('location') or None,
+    }
+    for key in ('added_from', 'added_to'):
+        if args.get(key):
+            filters[key] = load_day_or_time(args[key])
+    return filters
+
+
+def _list_url(conditions, location, **args):
+    # Return the URL of the listing with the given filters
+    return url_for('list_inators',
+                   condition=sorted(map(int, conditions), reverse=True),
+                   location=location, **args)
+
+
+@app.route('/stats/')
+@login_required
+@add_storage_param(storage)
+@uses_template('stats.html')
+def inator_stats(store):
+    """Summarize the inventory by condition and location.
+
+    Also tells how well the cache of rendered pages is doing.
+    """
+    with store.index('columns') as columns:
+        conditions = columns.count('condition')
+        locations = columns.count('location')
+        return {
+            'total': len(columns),
+            'conditions': [(c, conditions.get(c, 0))
+                           for c in sorted(Condition, reverse=True)],
+            'locations': sorted(locations.items(),
+                                key=lambda x: (-x[1], x[0])),
+            'added': columns.added_range(),
+            'pages': page_cache.stats(),
+        }
+
+
+@app.route('/search/')
+@login_required
+@add_storage_param(storage)
+@uses_template('search.html')
+def search_inators(store):
+    """Search inators by name, location and description.
+
+    Inators can also be found by similar names, despite typos.
+    """
+    query = request.args.get('q', '')
+    match = request.args.get('match', 'all')
+    if match not in ('all', 'any', 'similar'):
+        abort(400)
+    size = _page_size()
+    page = max(1, request.args.get('page', 1, type=int))
+
+    start = (page - 1) * size
+    if match == 'similar':
+        with store.index('names') as index:
+            # Each name has at least one inator
+            limit = start + size + 1
+            idents = list(itertools.islice(index.search(query, limit),
+                                           start, limit))
+    else:
+        with store.index('search') as index:
+            idents = list(itertools.islice(
+                index.search(query, match_all=match == 'all'),
+                start, start + size + 1))
+    inators = [store.get_inator(ident) for ident in idents[:size]]
+
+    args = {'q': query, 'match': match}
+    if 'size' in request.args:
+        args['size'] = size
+    prev_url = next_url = None
+    if page > 1:
+        prev_url = url_for('search_inators', page=page - 1, **args)
+    if len(idents) > size:
+        next_url = url_for('search_inators', page=page + 1, **args)
+    return {'query': query, 'match': match, 'inators': inators,
+            'prev_url': prev_url, 'next_url': next_url}
+
+
+@app.route('/complete/<field>/')
+@login_required
+@add_storage_param(storage)
+def autocomplete(store, field):
+    """Suggest existing names or locations starting with some text."""
+    if field not in ('name', 'location'):
+        abort(404)
+    prefix = request.args.get('q', '')
+    limit = request.args.get('limit', app.config['COMPLETIONS'], type=int)
+    limit = max(1, min(limit, app.config['MAX_COMPLETIONS']))
+    with store.index(field + '_completions') as index:
+        completions = index.complete(prefix, limit)
+    return jsonify(field=field, prefix=prefix, completions=completions)
 
-    except KeyError:
-        return {}
+
+def inator_json(inator):
+    """Return *inator* as a dict that can be encoded as JSON."""
+    return dict(inator.to_dict(), condition=int(inator.condition),
+                added=dump_time(inator.added))
 
 
 @app.route('/add/', methods=['GET', 'POST'])
 @login_required
-@add_data_param(app.config['DATA_PATH'])
+@add_storage_param(storage)
 @uses_template('add-inator.html')
-def add_inator(data):
+def add_inator(store):
     """Add a new inator."""
     if request.method == 'GET':
         return {}
     if request.method == 'POST':
         try:
-            # Getting random UUID data
-            ident = str(uuid.uuid4())
-            # Creating new dictionary to append to data
-            newInator = {
-                'name': request.form['name'],
-                'location': request.form['location'],
-                'description': request.form['description'],
-                'added': datetime.now(),
-                'ident': ident,
-                'condition': Condition(int(request.form['condition']))
-                }
-
+            newInator = new_inator(request.form)
         except ValueError:
             # Bad gatway
             abort(400)
 
+        # Add it to the data
+        store.put_inator(newInator)
+        flash('Successfully added {}.'
+              .format(newInator['name'], 'success'))
+        return redirect(url_for('list_inators'))
+
+
+@app.route('/api/inators/', methods=['GET'])
+@login_required
+@add_storage_param(storage)
+def api_list_inators(store):
+    """List inators as JSON, one page at a time.
+
+    Takes the same filters and cursors as :func:`list_inators`. The
+    cursors of the pages around this one are given as ``next`` and
+    ``previous``, or null if there is no such page.
+    """
+    size = _page_size()
+    after = request.args.get('after')
+    before = request.args.get('before')
+    try:
+        inators, more = store.list_page(size, after=after, before=before,
+                                        **_listing_filters(request.args))
+    except ValueError:
+        abort(400)
+    prev_cursor = next_cursor = None
+    if inators and (more if before else after):
+        prev_cursor = page_cursor(inators[0])
+    if inators and (more if not before else True):
+        next_cursor = page_cursor(inators[-1])
+    return jsonify(inators=[inator_json(i) for i in inators],
+                   next=next_cursor, previous=prev_cursor)
+
+
+@app.route('/api/inators/<ident>/', methods=['GET'])
+@login_required
+@add_storage_param(storage)
+def api_get_inator(store, ident):
+    """Return one inator as JSON."""
+    try:
+        return jsonify(inator_json(store.get_inator(ident)))
+    except KeyError:
+        abort(404)
+
+
+def _batch():
+    # Return the JSON list in the request body, of at most MAX_BATCH
+    # items
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, list):
+        abort(400)
+    if len(batch) > app.config['MAX_BATCH']:
+        abort(413)
+    return batch
+
+
+@app.route('/api/inators/', methods=['POST'])
+@login_required
+@add_storage_param(storage)
+def api_add_inators(store):
+    """Add a list of inators, given as JSON.
+
+    Each item has the fields of the form of :func:`add_inator`. Valid
+    items are added in one transaction, so the data is saved once; the
+    others are left out. The response has a result per item, in order,
+    with a ``status`` of 201 and the new inator, or 400 and an
+    ``error``.
+    """
+    results = []
+    for fields in _batch():
+        try:
+            inator = new_inator(fields)
+        except ValueError as e:
+            results.append({'status': 400, 'error': str(e)})
+        else:
+            store.put_inator(inator)
+            results.append({'status': 201, 'inator': inator_json(inator)})
+    return jsonify(results=results)
+
+
+@app.route('/api/inators/', methods=['DELETE'])
+@login_required
+@add_storage_param(storage)
+def api_delete_inators(store):
+    """Delete a list of inators, given as a JSON list of identifiers.
+
+    The inators are deleted in one transaction. The response has a
+    result per identifier, in order, with a ``status`` of 200, 404 if
+    there is no such inator or 400 if it is not an identifier.
+    """
+    results = []
+    for ident in _batch():
+        if not isinstance(ident, str):
+            results.append({'ident': ident, 'status': 400})
+            continue
         try:
-            # Make sure the identifier exists and add it to the data
-            data['inators'][ident] = newInator
-            flash('Successfully added {}.'
-                  .format(newInator['name'], 'success'))
-            return redirect(url_for('list_inators'))
+            store.delete_inator(ident)
         except KeyError:
-            return redirect(url_for('list_inators'))
+            results.append({'ident': ident, 'status': 404})
+        else:
+            results.append({'ident': ident, 'status': 200})
+    return jsonify(results=results)
+
+
+def _import_upload(f, format):
+    # Import the uploaded binary file f, aborting if it cannot be read
+    if format is None:
+        abort(400)
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    try:
+        # Batches are saved as they go, outside of any transaction
+        return import_inators(storage, text, format)
+    except ValueError:
+        abort(400)
+    finally:
+        text.detach()
+
+
+@app.route('/import/', methods=['GET', 'POST'])
+@login_required
+@uses_template('import-inators.html')
+def upload_inators():
+    """Import inators from an uploaded JSON Lines or CSV file."""
+    if request.method == 'GET':
+        return {}
+    upload = request.files.get('file')
+    if not upload:
+        abort(400)
+    format = request.form.get('format') or guess_format(upload.filename)
+    return {'report': _import_upload(upload.stream, format)}
+
+
+@app.route('/api/import/', methods=['POST'])
+@login_required
+def api_import_inators():
+    """Import inators from JSON Lines or CSV in the request body.
+
+    The format is given as ``format`` in the query string. The body is
+    read as it arrives. The response counts the inators imported and
+    the rows rejected, with the errors of the first of those.
+    """
+    report = _import_upload(request.stream, request.args.get('format'))
+    return jsonify(imported=report.imported, rejected=report.rejected,
+                   errors=[{'line': line, 'error': message}
+                           for line, message in report.errors],
+                   seconds=report.seconds)
+
+
+@app.route('/export/')
+@login_required
+def download_inators():
+    """Export the inventory as JSON Lines or CSV.
+
+    The ``format`` is ``jsonl`` (the default) or ``csv``, and the
+    filters are those of :func:`list_inators`. The export is sent as it
+    is written, from a snapshot taken when the request arrives.
+    """
+    format = request.args.get('format', 'jsonl')
+    if format not in EXPORT_FORMATS:
+        abort(400)
+    try:
+        inators = storage.iter_inators(**_listing_filters(request.args))
+    except ValueError:
+        abort(400)
+    response = Response(stream_with_context(export_inators(inators, format)),
+                        mimetype=EXPORT_FORMATS[format][1])
+    response.headers['Content-Disposition'] = \
+        'attachment; filename=inators.{}'.format(format)
+    return response
 
 
 @app.route('/view/<ident>/', methods=['GET'])
 @login_required
-@add_data_param(app.config['DATA_PATH'])
+@conditional(_inator_version)
+@cached_page(storage, 'pages', 'view-inator.html', _inator_page)
+@add_storage_param(storage)
 @uses_template('view-inator.html')
-def view_inator(data, ident):
+def view_inator(store, ident):
     """View details of an inator."""
     try:
         # Return the dictionary requested
-        dictInators = data['inators'][ident]
+        dictInators = store.get_inator(ident)
         return {'inator': dictInators}
 
     except KeyError:
@@ -105,13 +496,13 @@ def view_inator(data, ident):
 
 @app.route('/delete/<ident>/', methods=['GET', 'POST'])
 @login_required
-@add_data_param(app.config['DATA_PATH'])
+@add_storage_param(storage)
 @uses_template('delete-inator.html')
-def delete_inator(data, ident):
+def delete_inator(store, ident):
     """Delete an existing inator."""
     try:
         # Get the dictionary user wants to delete
-        dictInators = data['inators'][ident]
+        dictInators = store.get_inator(ident)
     except KeyError:
         flash('No such inator with identifier {}.'
               .format(ident), 'danger')
@@ -122,16 +513,16 @@ def delete_inator(data, ident):
 
     if request.method == 'POST':
         # Delete the inator from the data
-        data['inators'].pop(ident)
+        store.delete_inator(ident)
         flash('Successfully deleted {} ({}).'
               .format(dictInators['name'], ident, 'success'))
         return redirect(url_for('list_inators'))
 
 
 @app.route('/login/', methods=['GET', 'POST'])
-@add_data_param(app.config['DATA_PATH'])
+@add_storage_param(storage)
 @uses_template('login.html')
-def login(data):
+def login(store):
     """Login to the searchinator."""
     if request.method == 'GET':
         return {}
@@ -145,7 +536,7 @@ def login(data):
         # look for the username
         username = request.form['username']
         try:
-            user = data['users'][username]
+            user = store.get_user(username)
         except KeyError:
             flash('Cannot find user {}. Try again.'.format(username), 'danger')
             return redirect(url_for('login'))
@@ -182,3 +573,15 @@ def logout():
         session.pop('username')
         flash('Successfully logged out.', 'danger')
         return redirect(url_for('login'))
+
+
+@app.route('/assets/<path:filename>')
+def send_asset(filename):
+    """Send a static file under a URL fingerprinted by its content."""
+    return assets.send(filename)
+
+
+@app.after_request
+def compress_page(response):
+    """Gzip HTML pages for clients that accept it."""
+    return compress_response(response, app.config['GZIP_MIN_SIZE'])
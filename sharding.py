@@ -0,0 +1,268 @@
+"""Split a data file into shards that are saved independently.
+
+This module contains :class:`ShardedDataFile`, a storage mode for
+:func:`utils.add_data_param`. Instead of a single JSON file, the data
+is kept in a directory::
+
+  meta.json          shard count and everything except the inators
+  inators-000.json   inators whose identifier hashes to shard 0
+  inators-001.json   ...
+
+Saving only rewrites the shards (and ``meta.json``) that were actually
+modified, so adding or deleting an inator costs one shard instead of
+the whole data set. Loading reads the shards in parallel and, on later
+loads, only reads shards that changed on disk.
+
+This module can also be run as a program to convert a single-file
+data set (such as one written by :mod:`generate`) into shards, or to
+change the shard count of a sharded data set::
+
+  python3 generate.py --inators=50 > data.json
+  python3 sharding.py data.json data.shards --shards=8
+
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import zlib
+
+from tracking import apply_change, track
+from utils import (DataFile, convert_inators, decode_data, encode_data,
+                   file_signature, write_atomic)
+
+META_FILE = 'meta.json'
+"""Name of the file holding the shard count and non-inator data."""
+
+SHARD_FILE = 'inators-{:03d}.json'
+"""Name pattern of the shard files."""
+
+
+def shard_of(ident, shards):
+    """Return the shard number of the inator with identifier *ident*."""
+    return zlib.crc32(ident.encode('utf-8')) % shards
+
+
+def read_shard(path):
+    """Return the file signature and decoded contents of a shard file."""
+    with open(path, 'r') as f:
+        signature = file_signature(os.fstat(f.fileno()))
+        return signature, convert_inators(json.loads(f.read()))
+
+
+class ShardedDataFile(DataFile):
+    """Load and save data kept in a directory of shards.
+
+    :param str path: Path to the directory
+    :param int shards: Number of shards for a new data set. An existing
+        data set keeps the count it was written with; use
+        :func:`reshard` to change it.
+    :param int workers: Number of shards to load at a time
+    :param bool processes: Decode shards in worker processes rather
+        than threads. Threads overlap file reads but share the GIL
+        while decoding; processes decode in parallel but have to send
+        the results back.
+    :param bool fsync: Flush each file to disk before replacing it
+
+    """
+
+    def __init__(self, path, shards=16, workers=None, processes=False,
+                 fsync=True):
+        super().__init__(path)
+        self.shards = shards
+        self.workers = workers
+        self.processes = processes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, key):
+        self._key = key
+        self._data = None
+        self._count = None
+        self._meta = None
+        self._signatures = []
+        self._idents = []
+
+    def _path(self, name):
+        return os.path.join(self._key, name)
+
+    def _shard_path(self, shard):
+        return self._path(SHARD_FILE.format(shard))
+
+    def load(self):
+        """Return the tracked data, reading shards that changed.
+
+        :raises FileNotFoundError: If there is no sharded data set
+        """
+        with self._lock:
+            key = os.path.abspath(self.path)
+            if key != self._key:
+                self._reset(key)
+            try:
+                self._load_meta()
+                self._load_shards()
+            except FileNotFoundError:
+                self._reset(None)
+                raise
+            return self._data
+
+    def _load_meta(self):
+        path = self._path(META_FILE)
+        signature = file_signature(os.stat(path))
+        if self._data is not None and signature == self._meta:
+            return
+        meta = read_shard(path)[1]
+        if meta['shards'] != self._count:
+            # Resharded (or first load): start over
+            self._data = track({'inators': {}})
+            self._count = meta['shards']
+            self._signatures = [None] * self._count
+            self._idents = [{} for _ in range(self._count)]
+        for key in [k for k in self._data if k != 'inators']:
+            apply_change(self._data, 'delete', (key,))
+        for key, value in meta['data'].items():
+            apply_change(self._data, 'set', (key,), value)
+        self._meta = signature
+
+    def _load_shards(self):
+        paths = [self._shard_path(i) for i in range(self._count)]
+        stale = [i for i, path in enumerate(paths)
+                 if file_signature(os.stat(path)) != self._signatures[i]]
+        if not stale:
+            return
+        if self.processes:
+            pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor(self.workers)
+        with pool:
+            results = pool.map(read_shard, [paths[i] for i in stale])
+            for shard, (signature, inators) in zip(stale, results):
+                for ident in self._idents[shard]:
+                    apply_change(self._data, 'delete', ('inators', ident))
+                for ident, inator in inators.items():
+                    apply_change(self._data, 'set', ('inators', ident),
+                                 inator)
+                self._idents[shard] = dict.fromkeys(inators)
+                self._signatures[shard] = signature
+
+    def save(self, data, changes):
+        """Rewrite the shards touched by *changes*.
+
+        Without any changes (when saving for the first time) every
+        shard is written.
+        """
+        with self._lock:
+            key = os.path.abspath(self.path)
+            if key != self._key or self._count is None:
+                self._reset(key)
+                self._count = self.shards
+                self._signatures = [None] * self._count
+                self._idents = [{} for _ in range(self._count)]
+                changes = [('set', ('inators',), None)]
+                os.makedirs(key, exist_ok=True)
+            self._data = data
+            inators = data.get('inators', {})
+            dirty, meta = set(), not os.path.exists(self._path(META_FILE))
+            for op, path, value in changes:
+                if path[0] != 'inators':
+                    meta = True
+                elif len(path) == 1:
+                    # All of the inators were replaced
+                    dirty.update(range(self._count))
+                    self._idents = [{} for _ in range(self._count)]
+                    for ident in inators:
+                        shard = shard_of(ident, self._count)
+                        self._idents[shard][ident] = None
+                else:
+                    shard = shard_of(path[1], self._count)
+                    dirty.add(shard)
+                    if path[1] in inators:
+                        self._idents[shard][path[1]] = None
+                    else:
+                        self._idents[shard].pop(path[1], None)
+            for shard in sorted(dirty):
+                path = self._shard_path(shard)
+                write_atomic(path, encode_data(
+                    {i: inators[i] for i in self._idents[shard]}),
+                    self.fsync)
+                self._signatures[shard] = file_signature(os.stat(path))
+            if meta:
+                path = self._path(META_FILE)
+                write_atomic(path, encode_data({
+                    'shards': self._count,
+                    'data': {k: v for k, v in data.items() if k != 'inators'},
+                }), self.fsync)
+                self._meta = file_signature(os.stat(path))
+
+    def discard(self):
+        """Forget the in-memory copy of the data."""
+        with self._lock:
+            self._reset(None)
+
+
+def reshard(source, dest, shards):
+    """Write the data set at *source* to *dest* with *shards* shards.
+
+    *source* is either a JSON data file or a sharded directory. *dest*
+    may be the same directory as *source*. If *dest* already exists,
+    the new layout is written to a directory beside it, which then
+    takes its place; other files in *dest* are moved over. The old
+    layout is only removed once the new one is in place, so a crash
+    leaves one complete layout or the other.
+    """
+    if os.path.isdir(source):
+        data = ShardedDataFile(source).load()
+    else:
+        with open(source, 'r') as f:
+            data = track(decode_data(f.read()))
+    dest = os.path.abspath(dest)
+    if not os.path.exists(dest):
+        ShardedDataFile(dest, shards=shards).save(data, [])
+        return
+    new = tempfile.mkdtemp(prefix='.reshard-', dir=os.path.dirname(dest))
+    try:
+        os.chmod(new, stat.S_IMODE(os.stat(dest).st_mode))
+        ShardedDataFile(new, shards=shards).save(data, [])
+    except BaseException:
+        shutil.rmtree(new, ignore_errors=True)
+        raise
+    old = new + '.old'
+    os.replace(dest, old)
+    os.replace(new, dest)
+    for name in os.listdir(old):
+        if name != META_FILE and not name.startswith('inators-'):
+            os.replace(os.path.join(old, name), os.path.join(dest, name))
+    shutil.rmtree(old)
+
+
+def main():
+    """Convert a data set to shards.
+
+    For usage information, try running this module as a program like so::
+
+      python3 sharding.py --help
+    """
+    parser = argparse.ArgumentParser(description='Reshard -inator data')
+    parser.add_argument('source',
+                        help='A JSON data file or a sharded directory')
+    parser.add_argument('dest', help='The directory to write shards to')
+    parser.add_argument('--shards', type=int, default=16,
+                        help='The number of shards to write')
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        sys.exit('Need at least one shard.')
+    try:
+        reshard(args.source, args.dest, args.shards)
+    except (OSError, ValueError) as e:
+        sys.exit('Cannot reshard {}: {}'.format(args.source, e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Store data as a binary snapshot that loads without parsing JSON.
+
+This module contains :class:`SnapshotDataFile`, a storage mode for
+:func:`utils.add_data_param`, and the binary format behind it. A
+snapshot holds the same data as a JSON data file, laid out as::
+
+  header        magic, format version, flags and sizes (see HEADER)
+  added         int64 seconds since utils.EPOCH, one per inator
+  codes         uint32 name and location of each inator, as indexes
+                into the shared strings
+  lengths       uint32 string lengths: each shared string, then the
+                ident and description of each inator
+  conditions    int8 Condition values, one per inator
+  text          the strings, concatenated as UTF-8
+  extra         everything except the inators, as JSON
+
+All numbers are little-endian, and string lengths count code points.
+Names and locations repeat a lot, so each distinct one is stored (and
+loaded) only once. Loading reads each array in one go, decodes the
+text once and slices it up, with no per-field parsing. The file is read through
+:mod:`mmap`, so the arrays are copied straight out of the page cache.
+
+This module can also be run as a program to convert between JSON data
+files and snapshots, in either direction::
+
+  python3 generate.py --inators=50 > data.json
+  python3 snapshot.py data.json data.snapshot
+  python3 snapshot.py data.snapshot copy.json
+
+:mod:`generate` can also write snapshots directly with
+``--format=snapshot``.
+
+"""
+import argparse
+import array
+import contextlib
+import datetime
+import gc
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from condition import Condition
+from inator import Inator
+from tracking import apply_change, track
+from utils import (EPOCH, DataFile, decode_data, encode_data,
+                   file_signature, from_datetime, to_epoch, write_atomic)
+
+MAGIC = b'INATORS\0'
+"""First bytes of every snapshot."""
+
+VERSION = 1
+"""Version of the format written by :func:`encode_snapshot`."""
+
+HEADER = struct.Struct('<8sIIQQQ')
+"""Layout of the header.
+
+That is: magic, version, flags, number of inators, number of shared
+strings and size of the text in bytes.
+"""
+
+_CONDITIONS = [None] + sorted(Condition)
+
+
+def is_snapshot(head):
+    """Return whether the bytes *head* start like a snapshot."""
+    return head[:len(MAGIC)] == MAGIC
+
+
+def _little_endian(values):
+    # Byte-swap arrays on big-endian machines, in place
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def encode_snapshot(data):
+    """Encode the dict *data* as snapshot bytes.
+
+    :raises ValueError: If ``data['inators']`` holds anything but
+        inators
+    """
+    inators = list(data.get('inators', {}).values())
+    extra = {k: v for k, v in data.items() if k != 'inators'}
+    table, codes, strings = {}, array.array('I'), []
+    try:
+        for inator in inators:
+            for value in (inator['name'], inator['location']):
+                codes.append(table.setdefault(value, len(table)))
+            strings += (inator['ident'], inator['description'])
+        added = array.array('q', (to_epoch(i['added']) for i in inators))
+        conditions = array.array('b', (i['condition'] for i in inators))
+    except (KeyError, TypeError) as e:
+        raise ValueError('not an inator: {}'.format(e))
+    strings[:0] = table
+    lengths = array.array('I', map(len, strings))
+    text = ''.join(strings).encode('utf-8')
+    return b''.join([
+        HEADER.pack(MAGIC, VERSION, 0, len(inators), len(table), len(text)),
+        _little_endian(added).tobytes(),
+        _little_endian(codes).tobytes(),
+        _little_endian(lengths).tobytes(),
+        conditions.tobytes(),
+        text,
+        encode_data(extra).encode('utf-8'),
+    ])
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Creating millions of records would otherwise trigger many
+    # pointless garbage collections
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def decode_snapshot(buf):
+    """Decode snapshot bytes (or any buffer, such as an mmap).
+
+    :return: The data, with inators as :class:`inator.Inator` records
+    :raises ValueError: If *buf* is not a snapshot in a known version
+    """
+    view = memoryview(buf)
+    try:
+        if len(view) < HEADER.size or not is_snapshot(view):
+            raise ValueError('not an inator snapshot')
+        magic, version, flags, count, shared, size = \
+            HEADER.unpack_from(view)
+        if version != VERSION:
+            raise ValueError('unknown snapshot version {}'.format(version))
+        offset = HEADER.size
+
+        def read(typecode, n):
+            nonlocal offset
+            values = array.array(typecode)
+            end = offset + n * values.itemsize
+            if end > len(view):
+                raise ValueError('truncated snapshot')
+            values.frombytes(view[offset:end])
+            offset = end
+            return _little_endian(values)
+
+        added = read('q', count)
+        codes = read('I', 2 * count)
+        lengths = read('I', shared + 2 * count)
+        conditions = read('b', count)
+        if count and (min(conditions) < 1 or
+                      max(conditions) >= len(_CONDITIONS) or
+                      max(codes) >= shared):
+            raise ValueError('corrupt snapshot')
+        text = str(view[offset:offset + size], 'utf-8')
+        extra = str(view[offset + size:], 'utf-8')
+    finally:
+        view.release()
+
+    ends = list(itertools.accumulate(lengths))
+    if (ends[-1] if ends else 0) != len(text):
+        raise ValueError('truncated snapshot')
+    with _gc_paused():
+        # Build everything with map() so that only Inator runs Python
+        # code per record
+        strings = list(map(text.__getitem__, map(slice, [0] + ends, ends)))
+        table = strings[:shared]
+        idents = strings[shared::2]
+        times = map(EPOCH.__add__, map(datetime.timedelta,
+                                       itertools.repeat(0), added))
+        inators = map(Inator, idents, map(table.__getitem__, codes[0::2]),
+                      map(table.__getitem__, codes[1::2]),
+                      strings[shared + 1::2],
+                      map(_CONDITIONS.__getitem__, conditions), times)
+        data = decode_data(extra)
+        data['inators'] = dict(zip(idents, inators))
+    return data
+
+
+def read_snapshot(path):
+    """Return the file signature and decoded contents of a snapshot.
+
+    :raises ValueError: If the file is not a snapshot
+    """
+    with open(path, 'rb') as f:
+        signature = file_signature(os.fstat(f.fileno()))
+        if signature[2] == 0:
+            raise ValueError('not an inator snapshot')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return signature, decode_snapshot(m)
+
+
+class SnapshotDataFile(DataFile):
+    """Load and save data as a binary snapshot.
+
+    :param str path: Path to the snapshot
+    :param bool fsync: Flush the new snapshot to disk before replacing
+        the old one
+
+    """
+
+    def __init__(self, path, fsync=True):
+        super().__init__(path)
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, key):
+        self._key = key
+        self._signature = None
+        self._data = None
+
+    def load(self):
+        """Return the tracked data, decoding the snapshot if it changed.
+
+        :raises FileNotFoundError: If the snapshot does not exist
+        """
+        key = os.path.abspath(self.path)
+        with self._lock:
+            signature = file_signature(os.stat(key))
+            if key == self._key and signature == self._signature:
+                return self._data
+            signature, data = read_snapshot(key)
+            self._key, self._signature = key, signature
+            self._data = track(data)
+            return self._data
+
+    def save(self, data, changes):
+        """Write *data* as a new snapshot.
+
+        If *data* is not the copy in memory, or the snapshot was
+        replaced since it was read, *changes* are applied to the current
+        data instead, so that writes made meanwhile are kept.
+        """
+        key = os.path.abspath(self.path)
+        with self._lock:
+            try:
+                current = file_signature(os.stat(key))
+            except FileNotFoundError:
+                current = None
+            if current is None:
+                base = data
+            elif key == self._key and current == self._signature:
+                base = self._data
+            else:
+                base = track(read_snapshot(key)[1])
+            if base is not data:
+                for change in changes:
+                    apply_change(base, *change, merge=True)
+            write_atomic(key, encode_snapshot(base), self.fsync)
+            self._key, self._data = key, base
+            self._signature = file_signature(os.stat(key))
+
+    def discard(self):
+        """Forget the in-memory copy of the data."""
+        with self._lock:
+            self._reset(None)
+
+
+def convert(source, dest):
+    """Convert the JSON data file or snapshot *source* to the other format.
+
+    The result is written to *dest*.
+    """
+    with open(source, 'rb') as f:
+        content = f.read()
+    if is_snapshot(content):
+        data = decode_snapshot(content)
+        write_atomic(dest, json.dumps(data, indent=4,
+                                      default=from_datetime))
+    else:
+        data = decode_data(content.decode('utf-8'))
+        write_atomic(dest, encode_snapshot(data))
+
+
+def main():
+    """Convert between JSON data files and snapshots.
+
+    For usage information, try running this module as a program like so::
+
+      python3 snapshot.py --help
+    """
+    parser = argparse.ArgumentParser(
+        description='Convert -inator data between JSON and snapshots')
+    parser.add_argument('source', help='A JSON data file or a snapshot')
+    parser.add_argument('dest', help='Where to write the other format')
+    args = parser.parse_args()
+
+    try:
+        convert(args.source, args.dest)
+    except (OSError, ValueError) as e:
+        sys.exit('Cannot convert {}: {}'.format(args.source, e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+/*
+ * Suggest completions for text inputs as the user types.
+ *
+ * Inputs with a data-complete attribute get their suggestions from the
+ * URL in it (such as /complete/name/), which answers with JSON like
+ * {"completions": ["cool-inator", "coolinator"]}. The suggestions are
+ * shown through the datalist named by the input's list attribute.
+ */
+(function () {
+  'use strict';
+
+  function attach(input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var latest = 0;
+
+    input.addEventListener('input', function () {
+      var request = ++latest;
+      var url = input.dataset.complete + '?q=' +
+          encodeURIComponent(input.value);
+      fetch(url, {credentials: 'same-origin'})
+        .then(function (response) {
+          return response.ok ? response.json() : {completions: []};
+        })
+        .then(function (data) {
+          // Answers can arrive out of order; keep the newest only
+          if (request !== latest) {
+            return;
+          }
+          list.innerHTML = '';
+          data.completions.forEach(function (value) {
+            var option = document.createElement('option');
+            option.value = value;
+            list.appendChild(option);
+          });
+        })
+        .catch(function () {});
+    });
+  }
+
+  document.querySelectorAll('input[data-complete]').forEach(attach);
+}());
@@ -0,0 +1,830 @@
+"""Storage backends for inators and users.
+
+This module contains the :class:`Storage` interface used by the routes
+in :mod:`searchinator`, along with three implementations:
+
+* :class:`JSONStorage` keeps everything in a JSON data file, using any
+  of the storage modes built on :class:`utils.DataFile` (plain,
+  :mod:`wal`, :mod:`locking`, :mod:`sharding` or :mod:`snapshot`).
+* :class:`SQLiteStorage` keeps everything in an indexed SQLite
+  database, so that single inators can be read, added and deleted
+  without touching the rest.
+* :class:`IndexedStorage` keeps everything in a
+  :class:`recordfile.RecordFile`, so that reading a single inator
+  only decodes that inator.
+
+Use :func:`open_storage` to create a backend by name::
+
+  store = open_storage('sqlite', 'inator_data.sqlite3')
+  with store.transaction():
+      store.put_inator(record)
+
+An existing JSON data set, users included, can be copied into another
+backend by running this module as a program::
+
+  python3 storage.py --storage=sqlite inator_data.json
+  python3 storage.py --mode=sharded --storage=indexed inator_data
+
+Every backend can also keep in-memory indexes (see
+:class:`indexes.Index`) in sync with its inators::
+
+  store.add_index('columns', columns.ColumnStore())
+  with store.index('columns') as index:
+      counts = index.count('condition')
+
+"""
+import argparse
+import base64
+import contextlib
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+from indexes import ListingIndex
+from inator import Inator
+from locking import LockedDataFile
+from recordfile import RecordFile
+from sharding import ShardedDataFile
+from snapshot import SnapshotDataFile
+from utils import (DataFile, dump_time, open_data, parse_condition,
+                   parse_time)
+from wal import LoggedDataFile
+
+_STALE = object()
+
+
+def sort_inators(inators):
+    """Return *inators* in listing order.
+
+    Inators are ordered by condition, best first, and then by name.
+    Inators with the same condition and name keep their order.
+    """
+    lst = sorted(inators, key=lambda x: x['name'])
+    return sorted(lst, key=lambda x: x['condition'], reverse=True)
+
+
+def page_cursor(inator):
+    """Return a cursor pointing at *inator*, for :meth:`Storage.list_page`.
+
+    The cursor is a URL-safe string holding the condition, name and
+    identifier of the inator, so it keeps working if the inator is
+    deleted.
+    """
+    text = json.dumps([int(inator['condition']), inator['name'],
+                       inator['ident']])
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode(
+        'ascii').rstrip('=')
+
+
+def parse_cursor(cursor):
+    """Return the condition, name and identifier in a page cursor.
+
+    :raises ValueError: If *cursor* is not a valid cursor
+    """
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        condition, name, ident = json.loads(text.decode('utf-8'))
+    except (TypeError, ValueError):
+        raise ValueError('invalid cursor {!r}'.format(cursor))
+    if not isinstance(name, str) or not isinstance(ident, str):
+        raise ValueError('invalid cursor {!r}'.format(cursor))
+    return parse_condition(condition), name, ident
+
+
+class Storage:
+    """Interface for storing inators and users.
+
+    Inators are :class:`inator.Inator` records. Users are dicts with a
+    ``username`` and usually a ``password``.
+
+    Every method may be called inside or outside a
+    :meth:`transaction`; outside, each call is its own transaction.
+
+    Subclasses keep registered indexes up to date by calling
+    :meth:`_changed` for every inator they put or delete, and
+    :meth:`_committed` when a transaction was persisted.
+
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._indexes = {}
+        self._index_lock = threading.RLock()
+        # Token of the inators each index was last brought up to date with
+        self._index_tokens = {}
+
+    def add_index(self, name, index):
+        """Register the :class:`indexes.Index` *index* under *name*.
+
+        The index is filled the first time it is used.
+        """
+        with self._index_lock:
+            self._indexes[name] = index
+            self._index_tokens[name] = _STALE
+
+    @contextlib.contextmanager
+    def index(self, name):
+        """Return a context manager yielding the index called *name*.
+
+        The index is brought up to date first, and other threads
+        cannot modify it until the block ends. Changes made by the
+        current transaction are included. Only this index is rebuilt
+        if it missed changes; the others are rebuilt when they are
+        next used.
+
+        :raises KeyError: If there is no such index
+        """
+        with self.transaction(), self._index_lock:
+            index = self._indexes[name]
+            token = self._inator_token()
+            pending = self._local.index_changes
+            if pending or token != self._index_tokens[name]:
+                index.rebuild(self._all_inators())
+                # Uncommitted changes may still be rolled back
+                self._index_tokens[name] = _STALE if pending else token
+            yield index
+
+    def _inator_token(self):
+        # Return a value that changes whenever the inators do. It is
+        # only called inside a transaction.
+        raise NotImplementedError
+
+    def _all_inators(self):
+        # Return a list of every inator, including uncommitted ones
+        raise NotImplementedError
+
+    def _begin(self):
+        # Start collecting index changes for the outermost transaction
+        self._local.index_changes = []
+
+    def _changed(self, old, new):
+        # Note that the inator *old* was replaced by *new*; either may
+        # be None
+        if self._indexes:
+            self._local.index_changes.append((old, new))
+
+    def _committed(self, before, after):
+        # Apply the changes of a persisted transaction that took the
+        # inators from token *before* to token *after*
+        changes, self._local.index_changes = self._local.index_changes, []
+        with self._index_lock:
+            for name, index in self._indexes.items():
+                if self._index_tokens[name] != before:
+                    # Someone else changed the inators too, or the
+                    # index was already out of date
+                    self._index_tokens[name] = _STALE
+                    continue
+                for old, new in changes:
+                    if old is None:
+                        index.add(new)
+                    elif new is None:
+                        index.discard(old)
+                    else:
+                        index.replace(old, new)
+                self._index_tokens[name] = after
+
+    def transaction(self):
+        """Return a context manager grouping calls into one transaction.
+
+        Changes are persisted once, when the outermost transaction
+        ends without an exception. Transactions may be nested.
+        """
+        raise NotImplementedError
+
+    def get_inator(self, ident):
+        """Return the inator with identifier *ident*.
+
+        :raises KeyError: If there is no such inator
+        """
+        raise NotImplementedError
+
+    def put_inator(self, inator):
+        """Add *inator*, replacing any inator with the same identifier."""
+        raise NotImplementedError
+
+    def delete_inator(self, ident):
+        """Delete and return the inator with identifier *ident*.
+
+        :raises KeyError: If there is no such inator
+        """
+        raise NotImplementedError
+
+    def put_user(self, user):
+        """Add *user*, replacing any user with the same username."""
+        raise NotImplementedError
+
+    def get_user(self, username):
+        """Return the user named *username*.
+
+        :raises KeyError: If there is no such user
+        """
+        raise NotImplementedError
+
+    def list_inators(self, conditions=None, location=None, added_from=None,
+                     added_to=None):
+        """Return a list of inators in listing order.
+
+        See :func:`sort_inators` for the order.
+
+        :param conditions: Only include inators with one of these
+            :class:`condition.Condition` values
+        :param str location: Only include inators at this location
+        :param datetime.datetime added_from: Only include inators added
+            at or after this time
+        :param datetime.datetime added_to: Only include inators added
+            before this time
+        """
+        raise NotImplementedError
+
+    def iter_inators(self, conditions=None, location=None, added_from=None,
+                     added_to=None):
+        """Return an iterator over a snapshot of the inators.
+
+        The inators come in listing order, filtered like with
+        :meth:`list_inators`. The snapshot is taken right away: the
+        iterator may be used after the transaction ends, and does not
+        see changes made since.
+        """
+        raise NotImplementedError
+
+    def list_page(self, limit, after=None, before=None, conditions=None,
+                  location=None, added_from=None, added_to=None):
+        """Return one page of inators in listing order.
+
+        Pages are found with cursors (see :func:`page_cursor`) rather
+        than page numbers. With *after*, the page holds the first
+        *limit* inators listed after the cursor's inator. With
+        *before*, it holds the last *limit* inators listed before it.
+        Without either, it holds the first *limit* inators.
+
+        The filters are those of :meth:`list_inators`.
+
+        :return: A list of inators, and whether there are more inators
+            past the page in the direction of travel (that is, after
+            the page, or before it if *before* was given)
+        :raises ValueError: If a cursor is invalid, or both *after* and
+            *before* are given
+        """
+        raise NotImplementedError
+
+
+class ListedStorage(Storage):
+    """Base class for backends listing inators from a :class:`ListingIndex`.
+
+    The index is registered as ``'listing'``, so listings and pages
+    walk it instead of sorting.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.add_index('listing', ListingIndex())
+
+    def list_inators(self, conditions=None, location=None, added_from=None,
+                     added_to=None):
+        with self.index('listing') as listing:
+            return list(listing.inators(
+                conditions=conditions, location=location,
+                added_from=added_from, added_to=added_to))
+
+    def iter_inators(self, conditions=None, location=None, added_from=None,
+                     added_to=None):
+        # Inators cannot be modified, so a list of them is a snapshot
+        return iter(self.list_inators(conditions, location, added_from,
+                                      added_to))
+
+    def list_page(self, limit, after=None, before=None, conditions=None,
+                  location=None, added_from=None, added_to=None):
+        if after is not None and before is not None:
+            raise ValueError('cannot page both after and before')
+        cursor = after if before is None else before
+        if cursor is not None:
+            cursor = parse_cursor(cursor)
+        with self.index('listing') as listing:
+            if cursor is not None:
+                cursor = listing.cursor_key(*cursor, before=before is not None)
+            filters = dict(conditions=conditions, location=location,
+                           added_from=added_from, added_to=added_to,
+                           limit=limit + 1)
+            if before is None:
+                page = list(listing.inators(after=cursor, **filters))
+            else:
+                page = list(listing.inators(before=cursor, **filters))
+        more = len(page) > limit
+        page = page[:limit]
+        if before is not None:
+            page.reverse()
+        return page, more
+
+
+class JSONStorage(ListedStorage):
+    """Store inators and users in a JSON data file.
+
+    The data file holds a dict with an ``inators`` dict mapping
+    identifiers to inators, and a ``users`` dict mapping usernames to
+    users.
+
+    :param utils.DataFile datafile: The data file, which also decides
+        the storage mode
+
+    """
+
+    def __init__(self, datafile):
+        super().__init__()
+        self.datafile = datafile
+
+    @contextlib.contextmanager
+    def transaction(self):
+        if getattr(self._local, 'data', None) is not None:
+            yield self
+            return
+        with open_data(self.datafile) as data:
+            self._local.data = data
+            self._begin()
+            before = self._inator_token()
+            try:
+                yield self
+                after = self._inator_token()
+            finally:
+                self._local.data = None
+        self._committed(before, after)
+
+    def _inator_token(self):
+        # Reloading creates new data with a new tracker; modes that
+        # reload incrementally apply changes to it instead
+        tracker = self._local.data.tracker
+        return tracker, tracker.version, tracker.applied
+
+    def _all_inators(self):
+        return list(self._local.data.get('inators', {}).values())
+
+    def get_inator(self, ident):
+        with self.transaction():
+            return self._local.data['inators'][ident]
+
+    def put_inator(self, inator):
+        with self.transaction():
+            inators = self._local.data.setdefault('inators', {})
+            self._changed(inators.get(inator['ident']), inator)
+            inators[inator['ident']] = inator
+
+    def delete_inator(self, ident):
+        with self.transaction():
+            inator = self._local.data['inators'].pop(ident)
+            self._changed(inator, None)
+            return inator
+
+    def put_user(self, user):
+        with self.transaction():
+            users = self._local.data.setdefault('users', {})
+            users[user['username']] = user
+
+    def get_user(self, username):
+        with self.transaction():
+            return self._local.data['users'][username]
+
+
+class SQLiteStorage(Storage):
+    """Store inators and users in an SQLite database.
+
+    Inators are indexed by identifier, by condition and name (the
+    listing order), by the time they were added and by location
+    followed by the listing order.
+
+    :param str path: Path to the database file. Relative paths are
+        resolved each time a thread first uses the database.
+
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS inators (
+        ident TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        location TEXT NOT NULL,
+        description TEXT NOT NULL,
+        condition INTEGER NOT NULL,
+        added TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS inators_condition_name
+        ON inators (condition DESC, name);
+    CREATE INDEX IF NOT EXISTS inators_added ON inators (added);
+    DROP INDEX IF EXISTS inators_location;
+    CREATE INDEX IF NOT EXISTS inators_location_condition_name
+        ON inators (location, condition DESC, name);
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO meta VALUES ('version', 0);
+    CREATE TRIGGER IF NOT EXISTS inators_insert AFTER INSERT ON inators
+    BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'version';
+    END;
+    CREATE TRIGGER IF NOT EXISTS inators_update AFTER UPDATE ON inators
+    BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'version';
+    END;
+    CREATE TRIGGER IF NOT EXISTS inators_delete AFTER DELETE ON inators
+    BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'version';
+    END;
+    """
+
+    COLUMNS = 'ident, name, location, description, condition, added'
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    @property
+    def connection(self):
+        """The calling thread's connection to the database."""
+        key = os.path.abspath(self.path)
+        if getattr(self._local, 'key', None) != key:
+            conn = sqlite3.connect(key)
+            conn.executescript(self.SCHEMA)
+            self._local.key = key
+            self._local.conn = conn
+            self._local.depth = 0
+        return self._local.conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        conn = self.connection
+        self._local.depth += 1
+        try:
+            if self._local.depth > 1:
+                yield self
+            else:
+                self._begin()
+                with conn:
+                    yield self
+                    after = self._inator_token()
+                # Every put and delete changed the version by one, and
+                # nobody else can write until we commit
+                changes = len(self._local.index_changes)
+                self._committed((after[0], after[1] - changes), after)
+        finally:
+            self._local.depth -= 1
+
+    def _inator_token(self):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return self._local.key, row[0]
+
+    def _all_inators(self):
+        rows = self.connection.execute(
+            'SELECT {} FROM inators ORDER BY rowid'.format(self.COLUMNS))
+        return [self._inator(row) for row in rows]
+
+    @staticmethod
+    def _inator(row):
+        # Convert a row of COLUMNS to an inator
+        return Inator(row[0], row[1], row[2], row[3], parse_condition(row[4]),
+                      parse_time(row[5]))
+
+    def get_inator(self, ident):
+        row = self.connection.execute(
+            'SELECT {} FROM inators WHERE ident = ?'.format(self.COLUMNS),
+            (ident,)).fetchone()
+        if row is None:
+            raise KeyError(ident)
+        return self._inator(row)
+
+    def put_inator(self, inator):
+        with self.transaction():
+            if self._indexes:
+                try:
+                    self._changed(self.get_inator(inator['ident']), inator)
+                except KeyError:
+                    self._changed(None, inator)
+            # Upsert rather than replace, so that the row keeps its rowid
+            self.connection.execute(
+                'INSERT INTO inators ({}) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (ident) DO UPDATE SET name = excluded.name, '
+                'location = excluded.location, '
+                'description = excluded.description, '
+                'condition = excluded.condition, added = excluded.added'
+                .format(self.COLUMNS),
+                (inator['ident'], inator['name'], inator['location'],
+                 inator['description'], int(inator['condition']),
+                 dump_time(inator['added'])))
+
+    def delete_inator(self, ident):
+        with self.transaction():
+            inator = self.get_inator(ident)
+            self.connection.execute('DELETE FROM inators WHERE ident = ?',
+                                    (ident,))
+            self._changed(inator, None)
+            return inator
+
+    def put_user(self, user):
+        with self.transaction():
+            self.connection.execute(
+                'INSERT OR REPLACE INTO users VALUES (?, ?)',
+                (user['username'], user.get('password')))
+
+    def get_user(self, username):
+        row = self.connection.execute(
+            'SELECT username, password FROM users WHERE username = ?',
+            (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        user = {'username': row[0]}
+        if row[1] is not None:
+            user['password'] = row[1]
+        return user
+
+    @staticmethod
+    def _filters(conditions, location, added_from, added_to):
+        # Return SQL clauses and parameters for the listing filters
+        clauses, params = [], []
+        if added_from is not None:
+            clauses.append('added >= ?')
+            params.append(dump_time(added_from))
+        if added_to is not None:
+            clauses.append('added < ?')
+            params.append(dump_time(added_to))
+        if conditions is not None:
+            conditions = [int(c) for c in conditions]
+            clauses.append('condition IN ({})'.format(
+                ', '.join('?' * len(conditions))))
+            params.extend(conditions)
+        if location is not None:
+            clauses.append('location = ?')
+            params.append(location)
+        return clauses, params
+
+    def _query(self, clauses, params, order, limit=None):
+        # Return SQL and parameters selecting the inators matching all
+        # clauses, in the given order
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        sql = 'SELECT {} FROM inators {} ORDER BY {}'.format(
+            self.COLUMNS, where, order)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = params + [limit]
+        return sql, params
+
+    def _select(self, clauses, params, order, limit=None):
+        # Return the inators matching all clauses, in the given order
+        rows = self.connection.execute(
+            *self._query(clauses, params, order, limit))
+        return [self._inator(row) for row in rows]
+
+    def list_inators(self, conditions=None, location=None, added_from=None,
+                     added_to=None):
+        return self._select(
+            *self._filters(conditions, location, added_from, added_to),
+            'condition DESC, name, rowid')
+
+    def iter_inators(self, conditions=None, location=None, added_from=None,
+                     added_to=None):
+        # Read on a connection of its own, holding a read transaction
+        # open until the rows run out. In WAL mode, others can commit
+        # meanwhile without the rows changing.
+        conn = sqlite3.connect(os.path.abspath(self.path))
+        conn.executescript(self.SCHEMA)
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+        except sqlite3.OperationalError:
+            # Another connection is writing; stay in the current mode
+            pass
+        conn.execute('BEGIN')
+        rows = conn.execute(*self._query(
+            *self._filters(conditions, location, added_from, added_to),
+            'condition DESC, name, rowid'))
+        # Fetching the first row starts the snapshot
+        first = rows.fetchmany(1)
+
+        def inators():
+            try:
+                for row in itertools.chain(first, rows):
+                    yield self._inator(row)
+            finally:
+                conn.close()
+        return inators()
+
+    def list_page(self, limit, after=None, before=None, conditions=None,
+                  location=None, added_from=None, added_to=None):
+        if after is not None and before is not None:
+            raise ValueError('cannot page both after and before')
+        clauses, params = self._filters(conditions, location, added_from,
+                                        added_to)
+        if before is None:
+            order, less, greater = 'condition DESC, name, rowid', '<', '>'
+        else:
+            order, less, greater = 'condition, name DESC, rowid DESC', '>', '<'
+        if not (after or before):
+            page = self._select(clauses, params, order, limit + 1)
+            return page[:limit], len(page) > limit
+        condition, name, ident = parse_cursor(after or before)
+        row = self.connection.execute(
+            'SELECT rowid FROM inators WHERE ident = ?', (ident,)).fetchone()
+        if row is not None:
+            rowid = row[0]
+        else:
+            # Include every inator with the same condition and name
+            rowid = -1 if before is None else (1 << 63) - 1
+        # Finish the cursor's condition, then move on to the next ones.
+        # Both parts are ranges of the (condition, name) index, whose
+        # last column is the rowid.
+        page = self._select(
+            clauses + ['condition = ?',
+                       '(name, rowid) {} (?, ?)'.format(greater)],
+            params + [int(condition), name, rowid], order, limit + 1)
+        if len(page) <= limit:
+            page += self._select(
+                clauses + ['condition {} ?'.format(less)],
+                params + [int(condition)], order, limit + 1 - len(page))
+        more = len(page) > limit
+        page = page[:limit]
+        if before is not None:
+            page.reverse()
+        return page, more
+
+
+class IndexedStorage(ListedStorage):
+    """Store inators and users as records with an offset index.
+
+    Reading or writing one inator or user costs the same however many
+    there are; see :mod:`recordfile`. Changes made in a transaction
+    are buffered and written in one go when it ends.
+
+    :param str path: Path to the record file
+
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.records = RecordFile(path)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        if getattr(self._local, 'pending', None) is not None:
+            yield self
+            return
+        self._local.pending = {}
+        self._begin()
+        before = self._inator_token()
+        try:
+            yield self
+            pending = self._local.pending
+        finally:
+            self._local.pending = None
+        if pending:
+            self.records.write((kind, name, value)
+                               for (kind, name), value in pending.items())
+        self._committed(before, self._inator_token())
+
+    def _inator_token(self):
+        return self.records.signature()
+
+    def _all_inators(self):
+        inators = dict(self.records.items('inator'))
+        pending = getattr(self._local, 'pending', None) or {}
+        for (kind, name), value in pending.items():
+            if kind == 'inator':
+                inators[name] = value
+        return [i for i in inators.values() if i is not None]
+
+    def _get(self, kind, name):
+        pending = getattr(self._local, 'pending', None) or {}
+        if (kind, name) in pending:
+            if pending[kind, name] is None:
+                raise KeyError(name)
+            return pending[kind, name]
+        return self.records.get(kind, name)
+
+    def get_inator(self, ident):
+        return self._get('inator', ident)
+
+    def put_inator(self, inator):
+        with self.transaction():
+            if self._indexes:
+                try:
+                    self._changed(self.get_inator(inator['ident']), inator)
+                except KeyError:
+                    self._changed(None, inator)
+            self._local.pending['inator', inator['ident']] = inator
+
+    def delete_inator(self, ident):
+        with self.transaction():
+            inator = self.get_inator(ident)
+            self._local.pending['inator', ident] = None
+            self._changed(inator, None)
+            return inator
+
+    def put_user(self, user):
+        with self.transaction():
+            self._local.pending['user', user['username']] = user
+
+    def get_user(self, username):
+        return self._get('user', username)
+
+
+STORAGE_KINDS = {
+    'json': lambda path: JSONStorage(DataFile(path)),
+    'wal': lambda path: JSONStorage(LoggedDataFile(path)),
+    'locked': lambda path: JSONStorage(LockedDataFile(path)),
+    'sharded': lambda path: JSONStorage(ShardedDataFile(path)),
+    'snapshot': lambda path: JSONStorage(SnapshotDataFile(path)),
+    'sqlite': SQLiteStorage,
+    'indexed': IndexedStorage,
+}
+"""Storage backends by name, as selected by the ``STORAGE`` setting."""
+
+
+DEFAULT_PATHS = {
+    'json': 'inator_data.json',
+    'wal': 'inator_data.json',
+    'locked': 'inator_data.json',
+    'sharded': 'inator_data',
+    'snapshot': 'inator_data.snapshot',
+    'sqlite': 'inator_data.sqlite3',
+    'indexed': 'inator_data.records',
+}
+"""Default path of each kind of storage."""
+
+
+def open_storage(kind, path=None):
+    """Return a :class:`Storage` of the given *kind* for *path*.
+
+    :param str kind: One of the names in :data:`STORAGE_KINDS`
+    :param str path: Path of the storage; by default, the one in
+        :data:`DEFAULT_PATHS`
+    :raises ValueError: If *kind* is unknown, or if *path* names a JSON
+        data file but *kind* is not a JSON storage mode
+    """
+    try:
+        factory = STORAGE_KINDS[kind]
+    except KeyError:
+        raise ValueError('unknown storage {!r}'.format(kind))
+    if path is None:
+        path = DEFAULT_PATHS[kind]
+    elif kind in ('sqlite', 'indexed') and path.endswith('.json'):
+        raise ValueError('{} storage cannot use the JSON data file {}; '
+                         'convert it with storage.py'.format(kind, path))
+    return factory(path)
+
+
+def convert(datafile, store):
+    """Copy the users and inators in *datafile* into *store*.
+
+    Users and inators already in *store* are replaced by those with the
+    same username or identifier.
+
+    :param utils.DataFile datafile: The JSON data set, in any storage mode
+    :param Storage store: The storage to copy into
+    :return: The number of users and of inators copied
+    :raises FileNotFoundError: If the data set does not exist
+    """
+    data = datafile.load()
+    users = list(data.get('users', {}).values())
+    inators = list(data.get('inators', {}).values())
+    with store.transaction():
+        for user in users:
+            store.put_user(user)
+        for inator in inators:
+            store.put_inator(inator)
+    return len(users), len(inators)
+
+
+def main():
+    """Copy a JSON data set into another kind of storage.
+
+    For usage information, try running this module as a program like so::
+
+      python3 storage.py --help
+    """
+    modes = sorted(k for k in STORAGE_KINDS if k not in ('sqlite', 'indexed'))
+    parser = argparse.ArgumentParser(
+        description='Copy -inator data into another kind of storage')
+    parser.add_argument('source', help='The JSON data set to copy')
+    parser.add_argument('--mode', choices=modes, default='json',
+                        help='Storage mode of the data set')
+    parser.add_argument('--storage', choices=sorted(STORAGE_KINDS),
+                        default='sqlite', help='Kind of storage to copy into')
+    parser.add_argument('--path',
+                        help='Path of the storage; by default, the usual '
+                             'one for its kind')
+    args = parser.parse_args()
+
+    source = STORAGE_KINDS[args.mode](args.source).datafile
+    try:
+        store = open_storage(args.storage, args.path)
+        users, inators = convert(source, store)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        sys.exit('Cannot convert {}: {}'.format(args.source, e))
+    print('Copied {} users and {} inators.'.format(users, inators))
+
+
+if __name__ == '__main__':
+    main()
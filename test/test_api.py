@@ -0,0 +1,155 @@
+"""Tests for the JSON API routes."""
+import json
+
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+import searchinator
+from utils import from_datetime
+
+
+def log_in(app):
+    """Log in as heinz."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+
+def test_login_required(app):
+    """Redirect to login if we're not logged in."""
+    for rv in [app.get("/api/inators/"), app.post("/api/inators/", json=[]),
+               app.delete("/api/inators/", json=[])]:
+        assert rv.status_code == HTTPStatus.FOUND
+        assert urlparse(rv.location).path == "/login/"
+
+
+def test_list_and_get(app, data_path, inator_data):
+    """Inators are listed in pages and fetched one at a time."""
+    log_in(app)
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    rv = app.get("/api/inators/")
+    assert rv.status_code == HTTPStatus.OK
+    listed = rv.get_json()["inators"]
+    assert sorted(i["ident"] for i in listed) == sorted(inator_data)
+    assert rv.get_json()["next"] is None
+    assert rv.get_json()["previous"] is None
+
+    rv = app.get("/api/inators/?size=2")
+    page = rv.get_json()
+    assert page["inators"] == listed[:2]
+    rv = app.get("/api/inators/", query_string={"size": 2,
+                                                "after": page["next"]})
+    assert rv.get_json()["inators"] == listed[2:4]
+    assert rv.get_json()["previous"] is not None
+
+    condition = listed[0]["condition"]
+    rv = app.get("/api/inators/?condition={}".format(condition))
+    assert rv.get_json()["inators"] == \
+        [i for i in listed if i["condition"] == condition]
+    assert app.get("/api/inators/?condition=9").status_code == \
+        HTTPStatus.BAD_REQUEST
+
+    inator = inator_data[listed[0]["ident"]]
+    rv = app.get("/api/inators/{}/".format(inator["ident"]))
+    assert rv.get_json() == json.loads(json.dumps(inator,
+                                                  default=from_datetime))
+    assert app.get("/api/inators/nope/").status_code == HTTPStatus.NOT_FOUND
+
+
+def test_bulk_add(app, monkeypatch):
+    """A batch of inators is added at once, with a result for each."""
+    log_in(app)
+    datafile = searchinator.storage.datafile
+    saves, save = [], datafile.save
+
+    def counted_save(*args):
+        saves.append(args)
+        return save(*args)
+    monkeypatch.setattr(datafile, "save", counted_save)
+
+    rv = app.post("/api/inators/", json=[
+        {"name": "boop-inator", "location": "the moon",
+         "description": "Boops.", "condition": 2},
+        {"name": "zorp-inator", "location": "mars",
+         "description": "Zorps.", "condition": "5"},
+        {"name": "bad-inator", "location": "mars",
+         "description": "Bad.", "condition": 7},
+        {"name": "lost-inator", "description": "No location.",
+         "condition": 3},
+        "beep-inator",
+    ])
+    assert rv.status_code == HTTPStatus.OK
+    results = rv.get_json()["results"]
+    assert [r["status"] for r in results] == [201, 201, 400, 400, 400]
+    assert all("error" in r for r in results[2:])
+    assert len(saves) == 1
+
+    boop = results[0]["inator"]
+    assert boop["name"] == "boop-inator"
+    assert boop["condition"] == 2
+    rv = app.get("/api/inators/{}/".format(boop["ident"]))
+    assert rv.get_json() == boop
+    rv = app.get("/api/inators/")
+    assert [i["name"] for i in rv.get_json()["inators"]] == \
+        ["zorp-inator", "boop-inator"]
+
+    # The form still works the same way
+    rv = app.post("/add/", data={"name": "bad-inator", "location": "mars",
+                                 "description": "Bad.", "condition": "7"})
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_bulk_create_strict_conditions(app):
+    """Conditions that are not whole numbers are rejected, not rounded."""
+    log_in(app)
+    rv = app.post("/api/inators/", json=[
+        {"name": "boop-inator", "location": "the moon",
+         "description": "Boops.", "condition": value}
+        for value in [3.7, 4.0, True, "3.7", None]])
+    assert rv.status_code == HTTPStatus.OK
+    results = rv.get_json()["results"]
+    assert [r["status"] for r in results] == [400] * 5
+
+
+def test_bulk_create_lone_surrogates(app):
+    """Text that cannot be encoded as UTF-8 is rejected."""
+    log_in(app)
+    rv = app.post("/api/inators/", json=[
+        {"name": "boop-\ud800-inator", "location": "the moon",
+         "description": "Boops.", "condition": 2}])
+    assert rv.get_json()["results"][0]["status"] == 400
+    assert rv.get_json()["results"][0]["error"].startswith("invalid text")
+
+
+def test_bulk_delete(app, data_path, inator_data):
+    """A batch of inators is deleted at once, with a result for each."""
+    log_in(app)
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    idents = list(inator_data)
+    rv = app.delete("/api/inators/", json=idents[:2] + ["nope", 5])
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.get_json()["results"] == [
+        {"ident": idents[0], "status": 200},
+        {"ident": idents[1], "status": 200},
+        {"ident": "nope", "status": 404},
+        {"ident": 5, "status": 400},
+    ]
+    rv = app.get("/api/inators/")
+    assert sorted(i["ident"] for i in rv.get_json()["inators"]) == \
+        sorted(idents[2:])
+
+
+def test_bad_batches(app):
+    """Batches must be JSON lists of limited size."""
+    log_in(app)
+    rv = app.post("/api/inators/", data="boop",
+                  content_type="application/json")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+    rv = app.post("/api/inators/", json={"name": "boop-inator"})
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+    too_many = [{}] * (searchinator.app.config["MAX_BATCH"] + 1)
+    rv = app.delete("/api/inators/", json=too_many)
+    assert rv.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
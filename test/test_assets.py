@@ -0,0 +1,161 @@
+"""Tests for fingerprinted static files and compressed pages."""
+import gzip
+import json
+import os
+import re
+
+from http import HTTPStatus
+
+import pytest
+
+import assets
+import searchinator
+from utils import from_datetime
+
+CSS = b"body { color: black; }\n" * 100
+
+
+@pytest.fixture
+def folder(tmpdir):
+    """Make a folder with a style sheet and a font."""
+    tmpdir.mkdir("css").join("main.css").write_binary(CSS)
+    tmpdir.mkdir("fonts").join("font.woff2").write_binary(b"woff2")
+    return str(tmpdir)
+
+
+def test_fingerprinted(folder):
+    """Digests go before the extension, and follow the content."""
+    static = assets.Assets(folder)
+    name = static.fingerprinted("css/main.css")
+    assert re.fullmatch(r"css/main\.[0-9a-f]{12}\.css", name)
+    assert static.fingerprinted("css/main.css") == name
+
+    with open(os.path.join(folder, "css", "main.css"), "ab") as f:
+        f.write(b"p { margin: 0; }\n")
+    assert static.fingerprinted("css/main.css") != name
+
+    for filename in ("css/none.css", "../main.css", "css//main.css"):
+        with pytest.raises(KeyError):
+            static.digest(filename)
+
+
+def test_build(folder):
+    """Text files are compressed, and the manifest records them."""
+    manifest = assets.build(folder)
+    static = assets.Assets(folder)
+    assert manifest == {"css/main.css": static.digest("css/main.css")}
+    assert static.manifest() == manifest
+
+    path = os.path.join(folder, "css", "main.css")
+    with gzip.open(path + ".gz") as f:
+        assert f.read() == CSS
+    assert not os.path.exists(os.path.join(folder, "fonts",
+                                           "font.woff2.gz"))
+
+
+def test_send(folder):
+    """Current digests are kept for good, in an accepted encoding."""
+    assets.build(folder)
+    static = assets.Assets(folder, "send_asset")
+    digest = static.digest("css/main.css")
+    with searchinator.app.test_request_context(
+            headers={"Accept-Encoding": "gzip, deflate"}):
+        rv = static.send("css/main.{}.css".format(digest))
+        rv.direct_passthrough = False
+        assert rv.headers["Content-Encoding"] == "gzip"
+        assert rv.mimetype == "text/css"
+        assert "immutable" in rv.headers["Cache-Control"]
+        assert "Accept-Encoding" in rv.vary
+        assert gzip.decompress(rv.get_data()) == CSS
+        rv.close()
+
+    # Compressed files made from older content are not sent
+    with open(os.path.join(folder, "css", "main.css"), "ab") as f:
+        f.write(b"p { margin: 0; }\n")
+    digest = static.digest("css/main.css")
+    with searchinator.app.test_request_context(
+            headers={"Accept-Encoding": "gzip"}):
+        rv = static.send("css/main.{}.css".format(digest))
+        assert "Content-Encoding" not in rv.headers
+        rv.close()
+
+
+def test_route(app):
+    """Pages link fingerprinted files, which the app sends."""
+    rv = app.get("/login/")
+    links = re.findall(rb'"(/assets/[^"]+)"', rv.data)
+    assert b"/assets/css/font-awesome.min.css" not in links
+    assert len(links) == 6
+
+    url = links[0].decode("ascii")
+    rv = app.get(url)
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.headers["Cache-Control"] == \
+        "public, max-age={}, immutable".format(assets.MAX_AGE)
+    rv.close()
+
+    # Earlier versions redirect to the current one
+    stale = re.sub(r"\.[0-9a-f]{12}\.", ".000000000000.", url)
+    rv = app.get(stale)
+    assert rv.status_code == HTTPStatus.FOUND
+    assert rv.location.endswith(url)
+
+    # Fonts linked from style sheets are found without a digest
+    rv = app.get("/assets/fonts/fontawesome-webfont.woff2")
+    assert rv.status_code == HTTPStatus.OK
+    rv.close()
+    assert app.get("/assets/fonts/none.woff").status_code == \
+        HTTPStatus.NOT_FOUND
+
+
+def test_compressed_pages(app, inator_data, data_path):
+    """Pages are gzipped for clients that accept it."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    ident = next(iter(inator_data))
+    plain = app.get("/view/{}/".format(ident))
+    assert "Content-Encoding" not in plain.headers
+    rv = app.get("/view/{}/".format(ident),
+                 headers={"Accept-Encoding": "gzip"})
+    assert rv.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in rv.vary
+    assert gzip.decompress(rv.data) == plain.data
+
+    # The weak tag still answers conditional requests
+    etag = rv.headers["ETag"]
+    assert etag.startswith("W/")
+    rv = app.get("/view/{}/".format(ident),
+                 headers={"Accept-Encoding": "gzip",
+                          "If-None-Match": etag})
+    assert rv.status_code == HTTPStatus.NOT_MODIFIED
+    assert rv.headers["ETag"] == etag
+
+    # Streamed pages too
+    plain = app.get("/").data
+    rv = app.get("/", headers={"Accept-Encoding": "gzip"})
+    assert rv.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(rv.data) == plain
+
+
+def test_small_pages(app, monkeypatch):
+    """Pages shorter than the threshold are sent as they are."""
+    monkeypatch.setitem(searchinator.app.config, "GZIP_MIN_SIZE", 10 ** 6)
+    rv = app.get("/login/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in rv.headers
+    assert b"<html" in rv.data
+
+
+def test_send_plain(folder):
+    """Files without a digest are compressed, but not kept for good."""
+    assets.build(folder)
+    static = assets.Assets(folder, "send_asset")
+    with searchinator.app.test_request_context(
+            headers={"Accept-Encoding": "gzip"}):
+        rv = static.send("css/main.css")
+        assert rv.headers["Content-Encoding"] == "gzip"
+        assert "immutable" not in rv.headers.get("Cache-Control", "")
+        rv.close()
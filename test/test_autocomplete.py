@@ -0,0 +1,57 @@
+"""Tests for autocomplete route."""
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+from generate import PLACES
+
+
+def test_login_required(app):
+    """Redirect to login if we're not logged in."""
+    rv = app.get("/complete/name/?q=c")
+    assert rv.status_code == HTTPStatus.FOUND
+    assert urlparse(rv.location).path == "/login/"
+
+
+def test_locations(app):
+    """Known places are suggested, and so are places entered."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/complete/location/?q=b")
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.get_json() == {
+        "field": "location", "prefix": "b",
+        "completions": sorted(p for p in PLACES if p.startswith("b"))}
+
+    app.post("/add/", data={"name": "boop-inator", "location": "Bakery",
+                            "description": "Boops.", "condition": "2"})
+    rv = app.get("/complete/location/?q=BA")
+    assert rv.get_json()["completions"] == ["Bakery", "bank", "barber shop"]
+
+
+def test_names(app):
+    """Names of inators are suggested, up to a limit."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/complete/name/?q=")
+    assert rv.get_json()["completions"] == []
+
+    for name in ["cool-inator", "coolinator", "cupcake-inator"]:
+        app.post("/add/", data={"name": name, "location": "the moon",
+                                "description": "Boops.", "condition": "2"})
+    rv = app.get("/complete/name/?q=co")
+    assert rv.get_json()["completions"] == ["cool-inator", "coolinator"]
+    rv = app.get("/complete/name/?q=c&limit=1")
+    assert rv.get_json()["completions"] == ["cool-inator"]
+    rv = app.get("/complete/name/?q=c&limit=0")
+    assert rv.get_json()["completions"] == ["cool-inator"]
+
+
+def test_unknown_field(app):
+    """Only names and locations can be completed."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/complete/description/?q=a")
+    assert rv.status_code == HTTPStatus.NOT_FOUND
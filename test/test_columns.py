@@ -0,0 +1,117 @@
+"""Tests for the columnar inator store."""
+import collections
+
+import pytest
+
+from condition import Condition
+
+import columns
+import generate
+
+
+@pytest.fixture(params=[False, True], ids=["python", "numpy"])
+def store(request):
+    """Create an empty column store, with and without NumPy."""
+    if request.param:
+        pytest.importorskip("numpy")
+    return columns.ColumnStore(vectorize=request.param)
+
+
+@pytest.fixture
+def inators():
+    """Generate a hundred random inators."""
+    return list(generate.random_inators(100).values())
+
+
+def idents(store, rows):
+    """Return the set of identifiers of *rows*."""
+    return set(store.idents(rows))
+
+
+def test_counts(store, inators):
+    """Counts match counting the inators directly."""
+    store.rebuild(inators)
+    assert len(store) == 100
+    assert store.count("condition") == \
+        collections.Counter(i["condition"] for i in inators)
+    assert store.count("location") == \
+        collections.Counter(i["location"] for i in inators)
+    assert all(type(c) is Condition for c in store.count("condition"))
+
+
+def test_select(store, inators):
+    """Filters combine like the listing filters."""
+    store.rebuild(inators)
+    conditions = {Condition.NEEDS_REPAIR, Condition.KINDA_WORKS}
+    location = inators[0]["location"]
+    middle = sorted(i["added"] for i in inators)[50]
+
+    assert idents(store, store.select(conditions=conditions)) == \
+        {i["ident"] for i in inators if i["condition"] in conditions}
+    assert idents(store, store.select(conditions=conditions,
+                                      locations=[location])) == \
+        {i["ident"] for i in inators
+         if i["condition"] in conditions and i["location"] == location}
+    assert idents(store, store.select(added_from=middle)) == \
+        {i["ident"] for i in inators if i["added"] >= middle}
+    assert idents(store, store.select(added_to=middle)) == \
+        {i["ident"] for i in inators if i["added"] < middle}
+    assert store.select(locations=["the moon"]) == []
+    assert store.select(conditions=[]) == []
+
+
+def test_sort_is_stable(store, inators):
+    """Sorting matches a stable sort of the inators."""
+    store.rebuild(inators)
+    for field in columns.ColumnStore.FIELDS:
+        for reverse in (False, True):
+            expected = sorted(inators, key=lambda i: i[field],
+                              reverse=reverse)
+            got = store.idents(store.sort(field, reverse=reverse))
+            assert got == [i["ident"] for i in expected]
+
+
+def test_add_and_discard(store, inators):
+    """Incremental changes give the same answers as a rebuild."""
+    for inator in inators:
+        store.add(inator)
+    for inator in inators[::3]:
+        store.discard(inator)
+    kept = [i for i in inators if i not in inators[::3]]
+
+    rebuilt = columns.ColumnStore(vectorize=store.vectorize)
+    rebuilt.rebuild(kept)
+    assert len(store) == len(kept)
+    assert set(store.idents()) == {i["ident"] for i in kept}
+    assert store.count("location") == rebuilt.count("location")
+    rows = store.select(conditions=[Condition.ACTUALLY_WORKS])
+    assert store.count("condition", rows) == \
+        rebuilt.count("condition", rebuilt.select(
+            conditions=[Condition.ACTUALLY_WORKS]))
+    assert store.added_range() == rebuilt.added_range()
+
+
+def test_rebuild_forgets_locations(store, inators):
+    """Rebuilding drops the codes of locations no longer used."""
+    store.rebuild(inators)
+    moved = [i.replace(location="the moon") for i in inators[:5]]
+    store.rebuild(moved)
+    assert store.locations == ["the moon"]
+    assert store.count("location") == {"the moon": 5}
+    assert store.select(locations=[inators[6]["location"]]) == []
+
+
+def test_empty(store):
+    """An empty store answers every query."""
+    assert store.count("condition") == {}
+    assert store.select(conditions=[Condition.ACTUALLY_WORKS]) == []
+    assert store.sort("location") == []
+    assert store.added_range() is None
+
+
+def test_bad_field(store):
+    """Unknown fields are rejected."""
+    with pytest.raises(ValueError):
+        store.sort("description")
+    with pytest.raises(ValueError):
+        store.count("added")
@@ -0,0 +1,51 @@
+"""Tests for download_inators route."""
+import json
+
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+from utils import dump_time, from_datetime
+
+
+def test_login_required(app):
+    """Redirect to login if we're not logged in."""
+    rv = app.get("/export/")
+    assert rv.status_code == HTTPStatus.FOUND
+    assert urlparse(rv.location).path == "/login/"
+
+
+def test_export(app, data_path, inator_data):
+    """The inventory is exported in listing order, with filters."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    listed = app.get("/api/inators/").get_json()["inators"]
+    rv = app.get("/export/")
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.is_streamed
+    assert rv.mimetype == "application/x-ndjson"
+    assert "inators.jsonl" in rv.headers["Content-Disposition"]
+    rows = [json.loads(line) for line in rv.data.decode().splitlines()]
+    assert rows == listed
+    inator = inator_data[rows[0]["ident"]]
+    assert rows[0]["added"] == dump_time(inator["added"])
+
+    condition = rows[0]["condition"]
+    rv = app.get("/export/?format=csv&condition={}".format(condition))
+    assert rv.mimetype == "text/csv"
+    lines = rv.data.decode().splitlines()
+    assert lines[0] == "ident,name,location,description,condition,added"
+    assert len(lines) == 1 + sum(r["condition"] == condition for r in rows)
+
+    # The list links to the export of what it shows
+    rv = app.get("/?condition={}".format(condition))
+    assert "/export/?format=csv&amp;condition={}".format(condition).encode() \
+        in rv.data
+
+    assert app.get("/export/?format=xml").status_code == \
+        HTTPStatus.BAD_REQUEST
+    assert app.get("/export/?added_from=soon").status_code == \
+        HTTPStatus.BAD_REQUEST
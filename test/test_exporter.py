@@ -0,0 +1,60 @@
+"""Tests for exporting inators."""
+import csv
+import io
+import json
+
+import pytest
+
+import exporter
+import importer
+import storage
+from utils import dump_time
+
+
+def test_export_jsonl(inator_data, monkeypatch):
+    """Every inator is a line of JSON, sent a few lines at a time."""
+    monkeypatch.setattr(exporter, "BUFFER", 2)
+    pieces = list(exporter.export_inators(inator_data.values(), "jsonl"))
+    assert [piece.count("\n") for piece in pieces] == [2, 2, 1]
+    rows = [json.loads(line) for line in "".join(pieces).splitlines()]
+    assert rows == [dict(inator.to_dict(), condition=int(inator.condition),
+                         added=dump_time(inator.added))
+                    for inator in inator_data.values()]
+
+
+def test_export_csv(inator_data):
+    """CSV exports have a header and a row for every inator."""
+    text = "".join(exporter.export_inators(inator_data.values(), "csv"))
+    rows = list(csv.DictReader(io.StringIO(text, newline="")))
+    assert [row["ident"] for row in rows] == list(inator_data)
+    for row, inator in zip(rows, inator_data.values()):
+        assert row["description"] == inator["description"]
+        assert row["condition"] == str(int(inator["condition"]))
+        assert row["added"] == dump_time(inator["added"])
+
+    assert list(exporter.export_inators([], "csv")) == \
+        ["ident,name,location,description,condition,added\r\n"]
+    assert list(exporter.export_inators([], "jsonl")) == []
+
+
+@pytest.mark.parametrize("format", sorted(exporter.FORMATS))
+def test_round_trip(inator_data, format):
+    """Exported inators import as the same inators."""
+    source = storage.open_storage("json", "source.json")
+    with source.transaction():
+        for inator in inator_data.values():
+            source.put_inator(inator.replace(
+                added=inator["added"].replace(microsecond=0)))
+    text = "".join(exporter.export_inators(source.iter_inators(), format))
+
+    dest = storage.open_storage("sqlite", "dest.db")
+    report = importer.import_inators(dest, io.StringIO(text, newline=""),
+                                     format)
+    assert (report.imported, report.rejected) == (5, 0)
+    assert dest.list_inators() == source.list_inators()
+
+
+def test_unknown_format():
+    """Only known formats can be exported."""
+    with pytest.raises(ValueError):
+        exporter.export_inators([], "xml")
@@ -0,0 +1,78 @@
+"""Tests for the import routes."""
+import io
+import json
+
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+
+ROWS = "".join(json.dumps(row) + "\n" for row in [
+    {"name": "boop-inator", "location": "the moon",
+     "description": "Boops.", "condition": 2},
+    {"name": "zorp-inator", "location": "mars",
+     "description": "Zorps.", "condition": 9},
+    {"name": "beep-inator", "location": "mars",
+     "description": "Beeps.", "condition": 4},
+])
+
+
+def test_login_required(app):
+    """Redirect to login if we're not logged in."""
+    for rv in [app.get("/import/"),
+               app.post("/api/import/?format=jsonl", data=ROWS)]:
+        assert rv.status_code == HTTPStatus.FOUND
+        assert urlparse(rv.location).path == "/login/"
+
+
+def test_upload(app):
+    """An uploaded file is imported, and rejected rows reported."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/import/")
+    assert rv.status_code == HTTPStatus.OK
+    assert b"Import Inators" in rv.data
+
+    rv = app.post("/import/", data={
+        "file": (io.BytesIO(ROWS.encode("utf-8")), "inators.jsonl")})
+    assert rv.status_code == HTTPStatus.OK
+    assert b"Imported 2 inators" in rv.data
+    assert b"rejected 1 rows" in rv.data
+    assert b"<td>2</td>" in rv.data
+
+    rv = app.get("/")
+    assert b">boop-inator<" in rv.data
+    assert b">beep-inator<" in rv.data
+    assert b">zorp-inator<" not in rv.data
+
+    csv = b"name,location,description,condition\nzorp,mars,Zorps.,5\n"
+    rv = app.post("/import/", data={"file": (io.BytesIO(csv), "inators"),
+                                    "format": "csv"})
+    assert b"Imported 1 inators" in rv.data
+
+    # The format must be known
+    rv = app.post("/import/", data={"file": (io.BytesIO(csv), "inators")})
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+    rv = app.post("/import/", data={})
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_api_import(app):
+    """A request body is imported, with a JSON report."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.post("/api/import/?format=jsonl", data=ROWS)
+    assert rv.status_code == HTTPStatus.OK
+    report = rv.get_json()
+    assert (report["imported"], report["rejected"]) == (2, 1)
+    assert report["errors"][0]["line"] == 2
+
+    rv = app.get("/api/inators/")
+    assert sorted(i["name"] for i in rv.get_json()["inators"]) == \
+        ["beep-inator", "boop-inator"]
+
+    rv = app.post("/api/import/", data=ROWS)
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+    rv = app.post("/api/import/?format=csv", data=b"a,b\n\xff,\xfe\n")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,110 @@
+"""Tests for importing inators in bulk."""
+import datetime
+import io
+import json
+
+import pytest
+
+from condition import Condition
+
+import generate
+import importer
+import storage
+from utils import from_datetime
+
+
+def jsonl(rows):
+    """Return a text file with *rows* as JSON Lines."""
+    return io.StringIO("".join(json.dumps(row, default=from_datetime) + "\n"
+                               for row in rows))
+
+
+def test_import_jsonl(inator_data):
+    """Inators keep their identifiers and times, and others get new ones."""
+    store = storage.open_storage("json", "inator_data.json")
+    rows = list(inator_data.values()) + [
+        {"name": "boop-inator", "location": "the moon",
+         "description": "Boops.", "condition": 2}]
+    report = importer.import_inators(store, jsonl(rows), "jsonl", batch=2)
+    assert (report.imported, report.rejected, report.errors) == (6, 0, [])
+    assert report.rate > 0
+
+    listed = store.list_inators()
+    assert len(listed) == 6
+    for inator in inator_data.values():
+        assert store.get_inator(inator["ident"]) == \
+            inator.replace(added=inator["added"].replace(microsecond=0))
+    boop = next(i for i in listed if i["name"] == "boop-inator")
+    assert boop["condition"] is Condition.NEEDS_REPAIR
+    assert boop["ident"] not in inator_data
+
+
+def test_import_csv(inator_data, capsys):
+    """CSV files as printed by generate import as the same inators."""
+    generate.print_rows(inator_data.values(), "csv")
+    text = capsys.readouterr().out
+    store = storage.open_storage("sqlite", "inators.db")
+    report = importer.import_inators(store, io.StringIO(text), "csv")
+    assert (report.imported, report.rejected) == (5, 0)
+    for inator in inator_data.values():
+        imported = store.get_inator(inator["ident"])
+        assert imported["added"] == inator["added"].replace(microsecond=0)
+        assert imported["description"] == inator["description"]
+
+
+def test_rejected_rows():
+    """Invalid rows are reported by line, and the rest imported."""
+    store = storage.open_storage("json", "inator_data.json")
+    good = {"name": "boop-inator", "location": "the moon",
+            "description": "Boops.", "condition": "2"}
+    lines = [
+        json.dumps(good),
+        "",
+        "{not json",
+        json.dumps(dict(good, condition=9)),
+        json.dumps(dict(good, condition=None)),
+        json.dumps(dict(good, condition=3.7)),
+        json.dumps(dict(good, condition=True)),
+        json.dumps(dict(good, colour="blue")),
+        json.dumps(dict(good, added="yesterday")),
+        json.dumps(dict(good, added=5)),
+        json.dumps(dict(good, ident=5)),
+        json.dumps({"name": "boop-inator"}),
+        json.dumps([good]),
+        json.dumps(dict(good, name="zorp-inator",
+                        added="2017-09-18T02:04:57")),
+    ]
+    report = importer.import_inators(store, io.StringIO("\n".join(lines)),
+                                     "jsonl", batch=3)
+    assert report.imported == 2
+    assert report.rejected == 11
+    assert [line for line, _ in report.errors] == list(range(3, 14))
+    assert "colour" in report.errors[5][1]
+    zorp = next(i for i in store.list_inators() if i["name"] == "zorp-inator")
+    assert zorp["added"] == datetime.datetime(2017, 9, 18, 2, 4, 57)
+
+    csv = "name,location,description,condition\nboop,mars,Boops.,2\n" \
+          "zorp,mars\nbeep,mars,Beeps.,7,extra\n"
+    report = importer.import_inators(store, io.StringIO(csv), "csv")
+    assert report.imported == 1
+    assert [line for line, _ in report.errors] == [3, 4]
+
+
+def test_errors_are_limited(monkeypatch):
+    """Only the first few errors are kept, but all are counted."""
+    monkeypatch.setattr(importer, "MAX_ERRORS", 3)
+    store = storage.open_storage("json", "inator_data.json")
+    report = importer.import_inators(store, io.StringIO("[]\n" * 10),
+                                     "jsonl")
+    assert report.rejected == 10
+    assert len(report.errors) == 3
+
+
+def test_unknown_format():
+    """Only known formats can be imported."""
+    store = storage.open_storage("json", "inator_data.json")
+    with pytest.raises(ValueError):
+        importer.import_inators(store, io.StringIO(""), "xml")
+    assert importer.guess_format("inators.CSV") == "csv"
+    assert importer.guess_format("inators.jsonl") == "jsonl"
+    assert importer.guess_format("inators.json") is None
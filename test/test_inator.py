@@ -0,0 +1,72 @@
+"""Tests for the inator record type."""
+import datetime
+import json
+import pickle
+
+import pytest
+
+from condition import Condition
+from inator import Inator
+
+import utils
+
+
+@pytest.fixture
+def record():
+    """Return the dict layout of an inator."""
+    return {
+        "ident": "c9aa6c58-c8bb-4a19-a5ae-3ad107757d40",
+        "name": "juice-inator",
+        "location": "airport",
+        "description": "Ut neque ante, scelerisque sit amet orci.",
+        "condition": Condition.USUALLY_WORKS,
+        "added": datetime.datetime(2017, 9, 18, 2, 4, 57)
+    }
+
+
+def test_dict_round_trip(record):
+    """Inators convert to and from dicts."""
+    inator = Inator.from_dict(record)
+    assert inator.to_dict() == record
+    assert inator == record
+    assert record == inator
+    assert dict(inator) == record
+
+
+def test_field_access(record):
+    """Fields can be read as attributes or items."""
+    inator = Inator.from_dict(record)
+    for key, value in record.items():
+        assert getattr(inator, key) == value
+        assert inator[key] == value
+    assert set(inator.keys()) == set(record)
+    with pytest.raises(KeyError):
+        inator["replace"]
+
+
+def test_immutable(record):
+    """Inators cannot be modified, but can be copied with changes."""
+    inator = Inator.from_dict(record)
+    with pytest.raises(AttributeError):
+        inator.name = "boop-inator"
+    with pytest.raises(AttributeError):
+        inator.colour = "green"
+    with pytest.raises(TypeError):
+        inator["name"] = "boop-inator"
+
+    changed = inator.replace(name="boop-inator")
+    assert changed.name == "boop-inator"
+    assert inator.name == "juice-inator"
+
+
+def test_no_instance_dict(record):
+    """Inators only store their slots."""
+    assert not hasattr(Inator.from_dict(record), "__dict__")
+
+
+def test_json_and_pickle(record):
+    """Inators serialize to the data file layout and pickle."""
+    inator = Inator.from_dict(record)
+    s = json.dumps(inator, default=utils.from_datetime)
+    assert json.loads(s, object_hook=utils.as_inator) == inator
+    assert pickle.loads(pickle.dumps(inator)) == inator
@@ -0,0 +1,63 @@
+"""Tests for inator_stats route."""
+import json
+
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+from utils import from_datetime
+
+
+def test_login_required(app):
+    """Redirect to login if we're not logged in."""
+    rv = app.get("/stats/")
+    assert rv.status_code == HTTPStatus.FOUND
+    assert urlparse(rv.location).path == "/login/"
+
+
+def test_empty_data(app):
+    """Everything's OK if we are logged in and there is no data."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/stats/")
+    assert rv.status_code == HTTPStatus.OK
+    assert b"0 inators." in rv.data
+
+
+def test_counts_follow_changes(app, data_path, inator_data):
+    """Counts include inators added and deleted through the app."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    rv = app.get("/stats/")
+    assert rv.status_code == HTTPStatus.OK
+    assert b"5 inators" in rv.data
+    for inator in inator_data.values():
+        assert inator["location"].encode("ascii") in rv.data
+
+    app.post("/add/", data={"name": "boop-inator", "location": "the moon",
+                            "description": "Boops.", "condition": "2"})
+    rv = app.get("/stats/")
+    assert b"6 inators" in rv.data
+    assert b"the moon" in rv.data
+
+    ident = next(iter(inator_data))
+    app.post("/delete/{}/".format(ident))
+    rv = app.get("/stats/")
+    assert b"5 inators" in rv.data
+
+
+def test_page_cache(app, data_path, inator_data):
+    """The page cache counters are shown."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    rv = app.get("/stats/")
+    assert b"Page Cache" in rv.data
+    assert b"% hit rate" in rv.data
@@ -0,0 +1,301 @@
+"""Tests for in-memory inator indexes."""
+import collections
+import datetime
+import random
+
+import pytest
+
+from condition import Condition
+
+import generate
+import indexes
+import storage
+
+
+class SmallSortedList(indexes.SortedList):
+    """A sorted list with tiny chunks, so that they split often."""
+
+    CHUNK = 4
+
+
+@pytest.fixture
+def inators():
+    """Generate a hundred random inators."""
+    return list(generate.random_inators(100).values())
+
+
+def test_sorted_list():
+    """Adding and removing keys keeps them sorted across chunks."""
+    keys = random.sample(range(1000), 200)
+    sorted_list = SmallSortedList(keys[:50])
+    for key in keys[50:]:
+        sorted_list.add(key)
+    assert list(sorted_list) == sorted(keys)
+    assert list(reversed(sorted_list)) == sorted(keys, reverse=True)
+
+    for key in keys[::3]:
+        sorted_list.remove(key)
+    expected = sorted(set(keys) - set(keys[::3]))
+    assert list(sorted_list) == expected
+    assert len(sorted_list) == len(expected)
+    assert keys[0] not in sorted_list
+    assert keys[1] in sorted_list
+    with pytest.raises(KeyError):
+        sorted_list.remove(keys[0])
+    with pytest.raises(KeyError):
+        sorted_list.remove(1000)
+
+
+def test_sorted_list_after_and_before():
+    """Keys can be iterated over from any key, in both directions."""
+    keys = list(range(0, 100, 2))
+    sorted_list = SmallSortedList(keys)
+    for key in range(-1, 101):
+        assert list(sorted_list.after(key)) == [k for k in keys if k > key]
+        assert list(sorted_list.before(key)) == \
+            [k for k in reversed(keys) if k < key]
+    assert list(sorted_list.after()) == keys
+    assert list(sorted_list.before()) == keys[::-1]
+    assert list(SmallSortedList().after(1)) == []
+    assert list(SmallSortedList().before(1)) == []
+
+
+def test_sorted_list_rank():
+    """Keys below or between bounds can be counted."""
+    keys = list(range(0, 100, 2))
+    sorted_list = SmallSortedList(keys)
+    for key in range(-1, 101):
+        assert sorted_list.rank(key) == len([k for k in keys if k < key])
+    assert sorted_list.between(10, 20) == 5
+    assert sorted_list.between(None, 20) == 10
+    assert sorted_list.between(90) == 5
+    assert sorted_list.between() == 50
+
+
+def test_sorted_list_rank_follows_changes():
+    """Ranks stay right as chunks grow, split and empty."""
+    sorted_list = SmallSortedList()
+    keys = set()
+    for key in random.sample(range(1000), 300):
+        sorted_list.add(key)
+        keys.add(key)
+    for key in random.sample(sorted(keys), 250):
+        sorted_list.remove(key)
+        keys.discard(key)
+    for key in range(-1, 1001, 7):
+        assert sorted_list.rank(key) == len([k for k in keys if k < key])
+
+
+def test_listing_order(inators):
+    """A listing index has the same order as sorting the inators."""
+    index = indexes.ListingIndex()
+    index.rebuild(inators[:50])
+    for inator in inators[50:]:
+        index.add(inator)
+    assert list(index.inators()) == storage.sort_inators(inators)
+
+    for inator in inators[::4]:
+        index.discard(inator)
+    remaining = [i for i in inators if i not in inators[::4]]
+    assert len(index) == len(remaining)
+    assert list(index.inators()) == storage.sort_inators(remaining)
+
+
+def test_listing_ties():
+    """Inators with the same condition and name stay in the order added.
+
+    Replacing one keeps its place.
+    """
+    inators = [i.replace(name="Same", condition=Condition.ACTUALLY_WORKS)
+               for i in generate.random_inators(10).values()]
+    index = indexes.ListingIndex()
+    index.rebuild(inators)
+    changed = inators[3].replace(description="Changed.")
+    index.replace(inators[3], changed)
+    inators[3] = changed
+    assert list(index.inators()) == inators
+
+
+def test_listing_from_key(inators):
+    """Listing can start after or before an inator's key."""
+    index = indexes.ListingIndex()
+    index.rebuild(inators)
+    ordered = storage.sort_inators(inators)
+    middle = ordered[40]
+    key = index.cursor_key(middle.condition, middle.name, middle.ident)
+    assert list(index.inators(after=key)) == ordered[41:]
+    assert list(index.inators(before=key)) == ordered[39::-1]
+
+    # Cursors of inators that are gone skip none of their ties
+    key = index.cursor_key(middle.condition, middle.name, "gone")
+    assert list(index.inators(after=key))[:1] == [
+        i for i in ordered if (i.condition, i.name) ==
+        (middle.condition, middle.name)][:1]
+
+
+def test_listing_filters(inators):
+    """Inators can be listed for some conditions or locations only."""
+    index = indexes.ListingIndex()
+    index.rebuild(inators[:50])
+    for inator in inators[50:]:
+        index.add(inator)
+    ordered = storage.sort_inators(inators)
+    wanted = {Condition.ACTUALLY_WORKS, Condition.NEEDS_REPAIR}
+    location = next(i.location for i in inators if i.condition in wanted)
+    assert list(index.inators(conditions=wanted)) == \
+        [i for i in ordered if i.condition in wanted]
+    assert list(index.inators(location=location)) == \
+        [i for i in ordered if i.location == location]
+    matches = [i for i in ordered
+               if i.condition in wanted and i.location == location]
+    assert list(index.inators(conditions=wanted, location=location)) == \
+        matches
+    assert list(index.inators(conditions=[])) == []
+    assert list(index.inators(location="the moon")) == []
+
+    # Start from any inator, in either direction
+    for inator in ordered[::7]:
+        key = index.cursor_key(inator.condition, inator.name, inator.ident)
+        n = ordered.index(inator)
+        assert list(index.inators(after=key, conditions=wanted)) == \
+            [i for i in ordered[n + 1:] if i.condition in wanted]
+        assert list(index.inators(before=key, conditions=wanted,
+                                  location=location)) == \
+            [i for i in reversed(ordered[:n]) if i in matches]
+
+    # Moving an inator moves it between locations
+    moved = matches[0].replace(location="the moon")
+    index.replace(matches[0], moved)
+    assert list(index.inators(location="the moon")) == [moved]
+    assert list(index.inators(conditions=wanted, location=location)) == \
+        matches[1:]
+    index.discard(moved)
+    assert list(index.inators(location="the moon")) == []
+
+
+def test_listing_added_range(inators):
+    """Listings can be limited to a time range, in listing order."""
+    index = indexes.ListingIndex()
+    index.rebuild(inators)
+    ordered = storage.sort_inators(inators)
+    times = sorted(i.added for i in inators)
+    wanted = {Condition.KINDA_WORKS, Condition.USUALLY_WORKS}
+    middle = ordered[len(ordered) // 2]
+    key = index.cursor_key(middle.condition, middle.name, middle.ident)
+    # Narrow ranges are collected, wide ones walked (with a limit)
+    for start, stop in [(times[10], times[15]), (times[1], times[-2]),
+                        (None, times[5]), (times[-5], None)]:
+        def in_range(i):
+            return ((start is None or i.added >= start) and
+                    (stop is None or i.added < stop))
+        expected = list(filter(in_range, ordered))
+        for limit in (None, 1, 3):
+            assert list(index.inators(added_from=start, added_to=stop,
+                                      limit=limit)) == expected[:limit]
+        assert list(index.inators(added_from=start, added_to=stop,
+                                  conditions=wanted)) == \
+            [i for i in expected if i.condition in wanted]
+        assert list(index.inators(after=key, added_from=start,
+                                  added_to=stop)) == \
+            [i for i in expected if ordered.index(i) > len(ordered) // 2]
+        assert list(index.inators(before=key, added_from=start,
+                                  added_to=stop, limit=2)) == \
+            [i for i in reversed(expected)
+             if ordered.index(i) < len(ordered) // 2][:2]
+
+    # Changed times are followed
+    moved = ordered[0].replace(added=times[0] - datetime.timedelta(1))
+    index.replace(ordered[0], moved)
+    assert list(index.inators(added_to=times[0])) == [moved]
+
+
+def test_facets(inators):
+    """Counts for filters match counting the inators."""
+    index = indexes.FacetIndex()
+    index.rebuild(inators[:50])
+    for inator in inators[50:]:
+        index.add(inator)
+    for inator in inators[::4]:
+        index.discard(inator)
+    remaining = [i for i in inators if i not in inators[::4]]
+
+    def count(field, matches):
+        return dict(collections.Counter(
+            i[field] for i in remaining if matches(i)))
+
+    wanted = {Condition.KINDA_WORKS, Condition.USUALLY_WORKS}
+    location = remaining[0].location
+    for conditions in (None, wanted):
+        for where in (None, location):
+            def has_condition(i):
+                return conditions is None or i.condition in conditions
+
+            def is_here(i):
+                return where is None or i.location == where
+
+            total, by_condition, by_location = index.counts(conditions, where)
+            assert total == sum(map(has_condition, filter(is_here,
+                                                          remaining)))
+            assert by_condition == count("condition", is_here)
+            assert by_location == count("location", has_condition)
+
+    # Counts can be limited to a time range
+    times = sorted(i.added for i in remaining)
+    total, by_condition, by_location = index.counts(
+        added_from=times[5], added_to=times[20])
+    assert total == 15
+
+    def in_range(i):
+        return times[5] <= i.added < times[20]
+    assert by_condition == count("condition", in_range)
+    assert by_location == count("location", in_range)
+
+
+def test_completion():
+    """Values are completed case-insensitively, in alphabetical order."""
+    index = indexes.CompletionIndex("location", ["bank", "Bus stop"])
+    inators = [i.replace(location=location) for i, location in zip(
+        generate.random_inators(5).values(),
+        ["bank", "Bakery", "moon", "bakery", "bakery"])]
+    index.rebuild(inators[:2])
+    for inator in inators[2:]:
+        index.add(inator)
+    assert index.complete("b", 10) == ["Bakery", "bakery", "bank",
+                                       "Bus stop"]
+    assert index.complete("BA", 2) == ["Bakery", "bakery"]
+    assert index.complete("", 10) == ["Bakery", "bakery", "bank",
+                                      "Bus stop", "moon"]
+    assert index.complete("x", 10) == []
+    assert index.count("bakery") == 2
+
+    # Values go once no inator has them, unless they are vocabulary
+    for inator in inators[:3]:
+        index.discard(inator)
+    assert index.complete("", 10) == ["bakery", "bank", "Bus stop"]
+    assert len(index) == 3
+
+
+def test_versions(inators):
+    """Every change raises the version, and marks the inator changed."""
+    index = indexes.VersionIndex()
+    index.rebuild(inators)
+    generation = index.generation
+    assert (index.version, len(index)) == (0, len(inators))
+    assert index.inator(inators[0]["ident"]) == (0, index.modified)
+
+    changed = inators[0].replace(name="zzz-inator")
+    index.replace(inators[0], changed)
+    index.discard(inators[1])
+    index.add(inators[1])
+    assert index.version == 3
+    assert index.inator(inators[0]["ident"])[0] == 1
+    assert index.inator(inators[1]["ident"])[0] == 3
+    assert index.inator(inators[2]["ident"])[0] == 0
+    index.discard(inators[2])
+    with pytest.raises(KeyError):
+        index.inator(inators[2]["ident"])
+
+    # Starting over gives versions a new meaning
+    index.rebuild(inators)
+    assert index.version == 0
+    assert index.generation != generation
@@ -1,9 +1,12 @@
 """Tests for list_inators route."""
+import datetime
 import json
+import re
 
 from http import HTTPStatus
 from urllib.parse import urlparse
 
+import searchinator
 from utils import from_datetime
 
 
@@ -105,3 +108,217 @@ def test_inators_sorted(app, data_path, inator_data):
         assert i < j
         count += 1
     assert count == 4
+
+
+def test_pages(app, data_path, inator_data):
+    """Pages link to each other and together list every inator."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    inators = sorted(inator_data.values(), key=lambda x: x["name"])
+    inators = sorted(inators, key=lambda x: x["condition"], reverse=True)
+
+    # Walk forwards two at a time
+    rv = app.get("/?size=2")
+    seen, pages = [], []
+    while True:
+        assert rv.status_code == HTTPStatus.OK
+        page = [i["ident"] for i in inators
+                if i["ident"].encode("ascii") in rv.data]
+        seen += page
+        pages.append(rv)
+        match = re.search(rb'href="(/\?after=[^"]+)"', rv.data)
+        if match is None:
+            break
+        assert b"size=2" in match.group(1)
+        rv = app.get(match.group(1).decode("ascii").replace("&amp;", "&"))
+    assert seen == [i["ident"] for i in inators]
+    assert len(pages) == 3
+
+    # The first page has no previous page; the last one links back
+    assert b'/?before=' not in pages[0].data
+    match = re.search(rb'href="(/\?before=[^"]+)"', pages[-1].data)
+    rv = app.get(match.group(1).decode("ascii").replace("&amp;", "&"))
+    assert rv.data.count(b"/view/") == 2
+    assert inators[2]["ident"].encode("ascii") in rv.data
+
+
+def test_bad_cursor(app):
+    """Invalid cursors are a bad request."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/?after=bleep-bloop")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_streamed(app, data_path, inator_data):
+    """The list is streamed, and flashed messages are only shown once."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+        sess["_flashes"] = [("success", "Streamed hello.")]
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    rv = app.get("/")
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.is_streamed
+    assert rv.data.count(b"/view/") == 5
+    assert b"Streamed hello." in rv.data
+    assert rv.data.rstrip().endswith(b"</html>")
+
+    rv = app.get("/")
+    assert b"Streamed hello." not in rv.data
+
+
+def test_filters(app, data_path, inator_data):
+    """The list can be filtered by conditions and location, with counts."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    inators = list(inator_data.values())
+    location = inators[0]["location"]
+    rv = app.get("/?location={}".format(location))
+    assert rv.status_code == HTTPStatus.OK
+    expected = [i for i in inators if i["location"] == location]
+    assert rv.data.count(b"/view/") == len(expected)
+    assert "{} inators".format(len(expected)).encode("ascii") in rv.data
+
+    conditions = {int(inators[0]["condition"]), int(inators[1]["condition"])}
+    query = "&".join("condition={}".format(c) for c in conditions)
+    rv = app.get("/?" + query)
+    expected = [i for i in inators if i["condition"] in conditions]
+    assert rv.data.count(b"/view/") == len(expected)
+    for inator in expected:
+        assert inator["ident"].encode("ascii") in rv.data
+
+    # Counts follow changes made through the app
+    app.post("/add/", data={"name": "boop-inator", "location": "the moon",
+                            "description": "Boops.", "condition": "2"})
+    rv = app.get("/?location=the+moon")
+    assert rv.data.count(b"/view/") == 1
+    assert re.search(rb"the moon\s*<span[^>]*>1</span>", rv.data)
+    assert b"Clear filters" in rv.data
+
+    rv = app.get("/?condition=7")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+    rv = app.get("/?condition=bloop")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_filtered_pages(app):
+    """Page links keep the filters."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    for n in range(5):
+        app.post("/add/", data={"name": "boop-inator-{}".format(n),
+                                "location": "the moon" if n % 2 else "mars",
+                                "description": "Boops.", "condition": "2"})
+    rv = app.get("/?condition=2&location=mars&size=2")
+    assert rv.data.count(b"/view/") == 2
+    match = re.search(rb'href="(/\?[^"]*after=[^"]+)"', rv.data)
+    assert b"location=mars" in match.group(1)
+    assert b"condition=2" in match.group(1)
+    rv = app.get(match.group(1).decode("ascii").replace("&amp;", "&"))
+    assert rv.data.count(b"/view/") == 1
+    assert b">boop-inator-4<" in rv.data
+
+
+def test_added_range(app, data_path, inator_data):
+    """The list can be limited to the days inators were added."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    day = datetime.timedelta(days=1)
+    inators = [inator.replace(added=datetime.datetime(2017, 3, 1) + n * day)
+               for n, inator in enumerate(inator_data.values())]
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": {i["ident"]: i.to_dict() for i in inators}},
+                  data_file, default=from_datetime)
+
+    rv = app.get("/?added_from=2017-03-02&added_to=2017-03-04")
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.data.count(b"/view/") == 2
+    for inator in inators[1:3]:
+        assert inator["ident"].encode("ascii") in rv.data
+    assert b"2 inators" in rv.data
+    assert b'value="2017-03-02"' in rv.data
+    assert b"Clear filters" in rv.data
+
+    rv = app.get("/?added_from=2017-03-03&size=1")
+    assert rv.data.count(b"/view/") == 1
+    match = re.search(rb'href="(/\?[^"]*after=[^"]+)"', rv.data)
+    assert b"added_from=2017-03-03" in match.group(1)
+
+    rv = app.get("/?added_to=yesterday")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_not_modified(app, monkeypatch):
+    """Unchanged pages are not sent again."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    app.post("/add/", data={"name": "boop-inator", "location": "the moon",
+                            "description": "Boops.", "condition": "2"})
+    # The first page shows the flashed message, so is not tagged
+    rv = app.get("/")
+    assert "ETag" not in rv.headers
+    assert b"Successfully added boop-inator." in rv.data
+    rv = app.get("/")
+    assert b"boop-inator" in rv.data
+    etag, modified = rv.headers["ETag"], rv.headers["Last-Modified"]
+    assert rv.headers["Cache-Control"] == "no-cache"
+
+    # Neither the inators nor the template are needed to tell
+    monkeypatch.setattr(searchinator.storage, "list_page", None)
+    rv = app.get("/", headers={"If-None-Match": etag})
+    assert rv.status_code == HTTPStatus.NOT_MODIFIED
+    assert rv.data == b""
+    assert rv.headers["ETag"] == etag
+    rv = app.get("/", headers={"If-Modified-Since": modified})
+    assert rv.status_code == HTTPStatus.NOT_MODIFIED
+    monkeypatch.undo()
+    rv = app.get("/", headers={"If-None-Match": '"other"',
+                               "If-Modified-Since": modified})
+    assert rv.status_code == HTTPStatus.OK
+    assert b"boop-inator" in rv.data
+
+    # Changes make the page new again
+    app.post("/add/", data={"name": "zorp-inator", "location": "mars",
+                            "description": "Zorps.", "condition": "4"})
+    # Showing the flashed message
+    app.get("/").close()
+    rv = app.get("/", headers={"If-None-Match": etag})
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.headers["ETag"] != etag
+    assert b"zorp-inator" in rv.data
+
+
+def test_cached(app, inator_data, data_path):
+    """List pages come from the cache until an inator is added."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    cache = searchinator.page_cache
+    page = app.get("/?size=2").data
+    hits = cache.hits
+    assert app.get("/?size=2").data == page
+    assert cache.hits == hits + 1
+
+    app.post("/add/", data={"name": "boop-inator", "location": "the moon",
+                            "description": "Boops.", "condition": "5"})
+    rv = app.get("/")
+    assert b"boop-inator" in rv.data
+    assert cache.hits == hits + 1
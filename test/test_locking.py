@@ -0,0 +1,99 @@
+"""Tests for the multi-process storage mode."""
+import json
+import multiprocessing
+import os
+
+import locking
+import utils
+
+
+def add_to(datafile, key):
+    """Return a function adding *key* to the data in *datafile*."""
+    @utils.add_data_param(datafile)
+    def myfunc(data):
+        data.setdefault("inators", {})[key] = {"name": key}
+    return myfunc
+
+
+def test_atomic_save():
+    """Saving replaces the file and leaves no temporary files behind."""
+    datafile = locking.LockedDataFile("data.json", fsync=False)
+    add_to(datafile, "a")()
+
+    with open("data.json") as f:
+        assert json.load(f) == {"inators": {"a": {"name": "a"}}}
+    assert sorted(os.listdir(".")) == ["data.json", "data.json.lock"]
+
+
+def test_concurrent_changes_are_merged():
+    """A save replays its changes over data saved by someone else."""
+    datafile = locking.LockedDataFile("data.json", fsync=False)
+    add_to(datafile, "a")()
+
+    @utils.add_data_param(datafile)
+    def slow_add(data):
+        data["inators"]["b"] = {"name": "b"}
+        # Another process saves while this one is still working
+        with open("data.json", "w") as f:
+            json.dump({"inators": {"a": {"name": "a"},
+                                   "c": {"name": "c"}}}, f)
+
+    slow_add()
+
+    with open("data.json") as f:
+        assert sorted(json.load(f)["inators"]) == ["a", "b", "c"]
+
+
+def test_new_containers_are_merged():
+    """Creating a dict someone else created meanwhile keeps their items."""
+    datafile = locking.LockedDataFile("data.json", fsync=False)
+
+    @utils.add_data_param(datafile)
+    def slow_add(data):
+        data.setdefault("inators", {})["b"] = {"name": "b"}
+        with open("data.json", "w") as f:
+            json.dump({"inators": {"a": {"name": "a"}}}, f)
+
+    slow_add()
+
+    with open("data.json") as f:
+        assert sorted(json.load(f)["inators"]) == ["a", "b"]
+
+
+def hammer(path, worker, count):
+    """Add *count* inators through the ``/add/`` route."""
+    import searchinator
+
+    searchinator.storage.datafile = locking.LockedDataFile(path)
+    searchinator.app.testing = True
+    client = searchinator.app.test_client()
+    with client.session_transaction() as sess:
+        sess["username"] = "heinz"
+    for i in range(count):
+        rv = client.post("/add/", data={
+            "name": "worker-{}-inator-{}".format(worker, i),
+            "location": "stress test",
+            "condition": 3,
+            "description": "Added concurrently."
+        })
+        assert rv.status_code == 302
+
+
+def test_stress_add_from_many_processes():
+    """No inator is lost when several processes add at the same time."""
+    path = os.path.abspath("inator_data.json")
+    workers, count = 6, 20
+
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=hammer, args=(path, w, count))
+             for w in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    with open(path) as f:
+        names = {i["name"] for i in json.load(f)["inators"].values()}
+    assert names == {"worker-{}-inator-{}".format(w, i)
+                     for w in range(workers) for i in range(count)}
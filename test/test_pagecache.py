@@ -0,0 +1,92 @@
+"""Tests for the cache of rendered pages."""
+import pagecache
+
+PAGE = "<nav></nav>{}<main>{}</main>"
+
+
+def page(text):
+    """Return a page showing *text*, with the messages marked."""
+    return PAGE.format(pagecache.MESSAGES, text)
+
+
+def test_get_put():
+    """Pages are split where the messages go."""
+    cache = pagecache.PageCache()
+    key = ("view-inator.html", "v1", "a", "/view/a/?")
+    assert cache.get(key) is None
+    cache.put(key, page("A"))
+    head, tail = cache.get(key)
+    assert head == "<nav></nav>"
+    assert tail == pagecache.MESSAGES + "<main>A</main>"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_without_marker():
+    """Pages not marking the place of the messages are not cached."""
+    cache = pagecache.PageCache()
+    key = ("view-inator.html", "v1", "a", "/view/a/?")
+    cache.put(key, "<main>A</main>")
+    assert len(cache) == 0
+
+
+def test_evictions():
+    """The least recently used pages make room for new ones."""
+    cache = pagecache.PageCache(size=2)
+    keys = [("list-inators.html", "v1", None, "/?after={}".format(i))
+            for i in range(3)]
+    cache.put(keys[0], page(0))
+    cache.put(keys[1], page(1))
+    cache.get(keys[0])
+    cache.put(keys[2], page(2))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_invalidate():
+    """Changing an inator drops its pages and the lists, but no others."""
+    cache = pagecache.PageCache()
+    listing = ("list-inators.html", "v1", None, "/?")
+    a = ("view-inator.html", "v1", "a", "/view/a/?")
+    b = ("view-inator.html", "v1", "b", "/view/b/?")
+    for key in (listing, a, b):
+        cache.put(key, page(key))
+
+    cache.discard({"ident": "a"})
+    assert cache.get(listing) is None
+    assert cache.get(a) is None
+    assert cache.get(b) is not None
+
+    cache.put(listing, page(listing))
+    cache.add({"ident": "c"})
+    assert cache.get(listing) is None
+    assert cache.get(b) is not None
+
+    cache.replace({"ident": "b"}, {"ident": "b"})
+    assert len(cache) == 0
+
+
+def test_rebuild():
+    """Rebuilding drops every page but keeps the counters."""
+    cache = pagecache.PageCache()
+    key = ("view-inator.html", "v1", "a", "/view/a/?")
+    cache.put(key, page("A"))
+    cache.get(key)
+    cache.rebuild([])
+    assert len(cache) == 0
+    assert cache.hits == 1
+
+
+def test_stats():
+    """The counters come with the hit rate."""
+    cache = pagecache.PageCache(size=1)
+    assert cache.stats()["hit_rate"] == 0.0
+    for i in range(2):
+        key = ("view-inator.html", "v1", str(i), "/")
+        cache.get(key)
+        cache.put(key, page(i))
+        cache.get(key)
+    assert cache.stats() == {"hits": 2, "misses": 2, "evictions": 1,
+                             "pages": 1, "size": 1, "hit_rate": 0.5}
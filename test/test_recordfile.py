@@ -0,0 +1,119 @@
+"""Tests for indexed record files."""
+import os
+
+import recordfile
+
+
+def test_write_and_get():
+    """Records can be read back, replaced and deleted."""
+    records = recordfile.RecordFile("data", fsync=False)
+    records.write([("inator", "a", {"name": "x"}),
+                   ("inator", "b", {"name": "y"}),
+                   ("user", "heinz", {"username": "heinz"})])
+    records.write([("inator", "a", {"name": "z"}), ("inator", "b", None)])
+
+    assert records.get("inator", "a") == {"name": "z"}
+    assert records.get("user", "heinz") == {"username": "heinz"}
+    assert records.names("inator") == ["a"]
+    try:
+        records.get("inator", "b")
+    except KeyError:
+        pass
+    else:
+        assert False, "expected KeyError"
+
+
+def test_other_instances_see_writes():
+    """A second instance picks up appended records."""
+    writer = recordfile.RecordFile("data", fsync=False)
+    reader = recordfile.RecordFile("data")
+    writer.write([("inator", "a", {"name": "x"})])
+    assert reader.get("inator", "a") == {"name": "x"}
+
+    writer.write([("inator", "a", {"name": "y"}), ("inator", "b", {})])
+    assert reader.get("inator", "a") == {"name": "y"}
+    assert sorted(reader.names("inator")) == ["a", "b"]
+    assert reader.rebuilds == 0
+
+
+def test_missing_index_is_rebuilt():
+    """The index is recreated from the data file."""
+    records = recordfile.RecordFile("data", fsync=False)
+    records.write([("inator", "a", {"name": "x"}), ("inator", "b", {})])
+    records.write([("inator", "b", None)])
+    os.remove("data.idx")
+
+    fresh = recordfile.RecordFile("data")
+    assert fresh.items("inator") == [("a", {"name": "x"})]
+    assert fresh.rebuilds == 1
+    assert os.path.exists("data.idx")
+
+
+def test_wrong_index_is_rebuilt():
+    """An index that points at the wrong records is recreated."""
+    records = recordfile.RecordFile("data", fsync=False)
+    records.write([("inator", "a", {"name": "x"}), ("inator", "b", {})])
+
+    with open("data.idx") as f:
+        lines = f.readlines()
+    with open("data.idx", "w") as f:
+        f.write(lines[1].replace('"b"', '"a"'))
+
+    fresh = recordfile.RecordFile("data")
+    assert fresh.get("inator", "a") == {"name": "x"}
+    assert fresh.rebuilds == 1
+
+
+def test_torn_index_line():
+    """An incomplete index line is ignored and later overwritten."""
+    records = recordfile.RecordFile("data", fsync=False)
+    records.write([("inator", "a", {"name": "x"})])
+    with open("data.idx", "a") as f:
+        f.write('["inator", "b", 1')
+
+    fresh = recordfile.RecordFile("data", fsync=False)
+    assert fresh.names("inator") == ["a"]
+    fresh.write([("inator", "c", {})])
+    assert sorted(recordfile.RecordFile("data").names("inator")) == \
+        ["a", "c"]
+
+
+def test_torn_data_line():
+    """An incomplete data line is cut off before the next write."""
+    records = recordfile.RecordFile("data", fsync=False)
+    records.write([("inator", "a", {"name": "x"})])
+    with open("data", "a") as f:
+        f.write('["inator", "b", {"na')
+
+    fresh = recordfile.RecordFile("data", fsync=False)
+    fresh.write([("inator", "c", {"name": "z"})])
+    os.remove("data.idx")
+    rebuilt = recordfile.RecordFile("data")
+    assert sorted(rebuilt.names("inator")) == ["a", "c"]
+    assert rebuilt.get("inator", "c") == {"name": "z"}
+
+
+def test_garbled_data_line():
+    """Rebuilding the index stops at a line that does not decode."""
+    records = recordfile.RecordFile("data", fsync=False)
+    records.write([("inator", "a", {"name": "x"})])
+    with open("data", "a") as f:
+        f.write('["inator", "b", {"na["inator", "c", {}]\n')
+    os.remove("data.idx")
+
+    rebuilt = recordfile.RecordFile("data")
+    assert rebuilt.names("inator") == ["a"]
+    assert rebuilt.get("inator", "a") == {"name": "x"}
+
+
+def test_compaction():
+    """Replaced records are dropped once they make up most of the file."""
+    records = recordfile.RecordFile("data", min_compact=0, fsync=False)
+    for i in range(10):
+        records.write([("inator", "a", {"count": i})])
+
+    # The file never holds more than twice the live data
+    with open("data") as f:
+        assert len(f.readlines()) <= 2
+    assert records.get("inator", "a") == {"count": 9}
+    assert recordfile.RecordFile("data").get("inator", "a") == {"count": 9}
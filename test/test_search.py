@@ -0,0 +1,154 @@
+"""Tests for the search indexes."""
+import datetime
+import math
+
+import pytest
+
+import generate
+import search
+
+
+@pytest.fixture
+def inators():
+    """Generate two hundred random inators."""
+    return list(generate.random_inators(200).values())
+
+
+def scores(inators, query, match_all):
+    """Score every matching inator by brute force."""
+    words = set(search.tokenize(query))
+    counts = {word: sum(word in search.word_weights(i) for i in inators)
+              for word in words}
+    result = {}
+    for inator in inators:
+        weights = search.word_weights(inator)
+        found = [word for word in words if word in weights]
+        if not found or (match_all and len(found) < len(words)):
+            continue
+        result[inator["ident"]] = sum(
+            weights[word] * math.log(1 + len(inators) / counts[word])
+            for word in found)
+    return result
+
+
+def check(index, inators, query, match_all=True):
+    """Check search results against brute force scoring."""
+    expected = scores(inators, query, match_all)
+    got = list(index.search(query, match_all=match_all))
+    assert sorted(got) == sorted(expected)
+    ranked = [expected[ident] for ident in got]
+    assert all(a >= b - 1e-9 for a, b in zip(ranked, ranked[1:]))
+
+
+def test_tokenize():
+    """Words are split on punctuation and lowercased."""
+    assert search.tokenize("Bowling alley, DE-age-inator!") == \
+        ["bowling", "alley", "de", "age", "inator"]
+
+
+@pytest.mark.parametrize("query", [
+    "inator", "library", "lorem ipsum", "Donec tempor", "bus stop magna",
+    "cupcake-inator", "bleep bloop",
+])
+def test_search(inators, query):
+    """Results match scoring by brute force, best first."""
+    index = search.SearchIndex()
+    index.rebuild(inators)
+    check(index, inators, query, match_all=True)
+    check(index, inators, query, match_all=False)
+
+
+def test_empty_queries(inators):
+    """Queries without known words find nothing."""
+    index = search.SearchIndex()
+    index.rebuild(inators)
+    assert list(index.search("")) == []
+    assert list(index.search("?!")) == []
+    assert list(index.search("bleep bloop", match_all=False)) == []
+    assert list(index.search("lorem bleep")) == []
+    assert list(index.search("lorem bleep", match_all=False)) != []
+
+
+def test_incremental(inators):
+    """Adding and discarding gives the same results as rebuilding."""
+    index = search.SearchIndex()
+    for inator in inators:
+        index.add(inator)
+    for inator in inators[::3]:
+        index.discard(inator)
+    remaining = [i for i in inators if i not in inators[::3]]
+    assert len(index) == len(remaining)
+    for query in ["inator", "library ipsum", "amet metus quis"]:
+        check(index, remaining, query)
+        check(index, remaining, query, match_all=False)
+        assert index.count(query.split()[0]) == \
+            sum(query.split()[0] in search.word_weights(i)
+                for i in remaining)
+
+    for inator in remaining:
+        index.discard(inator)
+    assert len(index) == 0
+    assert index._postings == {}
+
+
+def test_ties_in_index_order():
+    """Inators with the same score come in the order they were indexed."""
+    inators = [i.replace(name="same-inator", location="moon",
+                         description="Boop.")
+               for i in generate.random_inators(20).values()]
+    index = search.SearchIndex()
+    index.rebuild(inators)
+    assert list(index.search("same moon")) == [i.ident for i in inators]
+
+
+def test_trigrams():
+    """Trigrams ignore case and punctuation, and are padded."""
+    assert search.trigrams("Cool-Inator") == search.trigrams("coolinator")
+    assert search.trigrams("ab") == {"  a", " ab", "ab "}
+    assert search.trigrams("--") == frozenset()
+    assert search.similarity(search.trigrams("abc"),
+                             search.trigrams("abc")) == 1.0
+    assert search.similarity(search.trigrams("abc"),
+                             search.trigrams("xyz")) == 0.0
+
+
+@pytest.mark.parametrize("query", [
+    "coolinator", "cool-inatr", "transprt", "dodo bird", "xyzzy", "a",
+    "mustashe-inator", "inator",
+])
+def test_similar_names(query):
+    """Similar names match comparing with every name, best first."""
+    index = search.NameIndex()
+    index.rebuild(generate.random_inators(500).values())
+    grams = search.trigrams(query)
+    expected = sorted(
+        ((search.similarity(grams, search.trigrams(name)), name)
+         for name in set(generate.INATORS) & set(index._names)),
+        key=lambda match: (-match[0], match[1]))
+    expected = [m for m in expected if m[0] >= search.SIMILARITY]
+    assert index.similar_names(query) == expected
+    assert index.similar_names(query, limit=3) == expected[:3]
+
+
+def test_similar_spellings():
+    """Names spelled differently are found, along with their inators."""
+    inators = [generate.inator_record(name, datetime.datetime.now())
+               for name in ["cool-inator", "coolinator", "coolinator",
+                            "boring-inator", "cool-inator"]]
+    index = search.NameIndex()
+    for inator in inators:
+        index.add(inator)
+    assert [name for _, name in index.similar_names("colinator")] == \
+        ["cool-inator", "coolinator"]
+    assert list(index.search("coolinatr")) == \
+        [inators[i].ident for i in (0, 4, 1, 2)]
+
+    for inator in inators[:2]:
+        index.discard(inator)
+    assert list(index.search("coolinatr")) == \
+        [inators[i].ident for i in (4, 2)]
+    for inator in inators[2:]:
+        index.discard(inator)
+    assert len(index) == 0
+    assert index._postings == {}
+    assert index.similar_names("coolinator") == []
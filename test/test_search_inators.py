@@ -0,0 +1,113 @@
+"""Tests for search_inators route."""
+import json
+import re
+
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+from utils import from_datetime
+
+
+def test_login_required(app):
+    """Redirect to login if we're not logged in."""
+    rv = app.get("/search/?q=inator")
+    assert rv.status_code == HTTPStatus.FOUND
+    assert urlparse(rv.location).path == "/login/"
+
+
+def test_empty_query(app):
+    """Without a query, only the search form is shown."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/search/")
+    assert rv.status_code == HTTPStatus.OK
+    assert b"Search Inators" in rv.data
+    assert b"/view/" not in rv.data
+    assert b"No inators match" not in rv.data
+
+
+def test_search(app, data_path, inator_data):
+    """Inators are found by name and location, also after changes."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    inator = next(iter(inator_data.values()))
+    rv = app.get("/search/?q={}".format(inator["name"]))
+    assert rv.status_code == HTTPStatus.OK
+    assert inator["ident"].encode("ascii") in rv.data
+
+    rv = app.get("/search/?q=the+moon")
+    assert b"No inators match the moon." in rv.data
+    app.post("/add/", data={"name": "boop-inator", "location": "the moon",
+                            "description": "Boops.", "condition": "2"})
+    rv = app.get("/search/?q=moon+boop")
+    assert rv.data.count(b"/view/") == 1
+    assert b"boop-inator" in rv.data
+
+    # Better matches come first
+    app.post("/add/", data={"name": "zorp", "location": "mars",
+                            "description": "Boop boop.", "condition": "2"})
+    rv = app.get("/search/?q=boop")
+    assert rv.data.count(b"/view/") == 2
+    assert rv.data.index(b">boop-inator<") < rv.data.index(b">zorp<")
+
+    rv = app.get("/search/?q=moon+zorp&match=any")
+    assert rv.data.count(b"/view/") == 2
+    rv = app.get("/search/?q=moon+zorp&match=all")
+    assert rv.data.count(b"/view/") == 0
+
+    app.post("/delete/{}/".format(inator["ident"]))
+    rv = app.get("/search/?q={}".format(inator["name"]))
+    assert "/view/{}/".format(inator["ident"]).encode("ascii") \
+        not in rv.data
+
+
+def test_similar(app):
+    """Inators are found by similar names."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    for name in ["transport-inator", "transportinator", "boring-inator"]:
+        app.post("/add/", data={"name": name, "location": "the moon",
+                                "description": "Boops.", "condition": "2"})
+    rv = app.get("/search/?q=transprtinator&match=similar")
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.data.count(b"/view/") == 2
+    assert b">transport-inator<" in rv.data
+    assert b">transportinator<" in rv.data
+
+
+def test_pages(app, data_path, inator_data):
+    """Results are split into pages linking to each other."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    # Search for every name
+    query = "+".join(i["name"] for i in inator_data.values())
+    seen = []
+    rv = app.get("/search/?q={}&match=any&size=2".format(query))
+    while True:
+        assert rv.status_code == HTTPStatus.OK
+        seen += re.findall(rb'href="/view/([^/]+)/"', rv.data)
+        match = re.search(rb'href="(/search/\?[^"]*page=\d+[^"]*)"[^>]*>'
+                          rb'Next', rv.data)
+        if match is None:
+            break
+        rv = app.get(match.group(1).decode("ascii").replace("&amp;", "&"))
+    assert sorted(seen) == sorted(i.encode("ascii") for i in inator_data)
+
+
+def test_bad_match(app):
+    """Unknown matching modes are a bad request."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    rv = app.get("/search/?q=inator&match=some")
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,115 @@
+"""Tests for the sharded storage mode."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import generate
+import sharding
+import utils
+
+
+def add_inators(datafile, inators):
+    """Add *inators* through the given data file."""
+    @utils.add_data_param(datafile)
+    def myfunc(data):
+        data.setdefault("inators", {}).update(inators)
+        data.setdefault("users", generate.credentials(["heinz:doof"]))
+
+    myfunc()
+
+
+def test_round_trip(inator_data):
+    """Sharded data loads back the same as it was saved."""
+    add_inators(sharding.ShardedDataFile("data", shards=4, fsync=False),
+                inator_data)
+
+    expected = utils.decode_data(utils.encode_data(
+        {"inators": inator_data,
+         "users": generate.credentials(["heinz:doof"])}))
+    assert sharding.ShardedDataFile("data").load() == expected
+    assert sorted(os.listdir("data")) == [
+        "inators-000.json", "inators-001.json", "inators-002.json",
+        "inators-003.json", "meta.json"]
+
+
+def test_only_touched_shard_is_written(inator_data):
+    """Deleting an inator rewrites just its shard."""
+    datafile = sharding.ShardedDataFile("data", shards=4, fsync=False)
+    add_inators(datafile, inator_data)
+    before = {n: os.stat(os.path.join("data", n)).st_ino
+              for n in os.listdir("data")}
+
+    ident = next(iter(inator_data))
+
+    @utils.add_data_param(datafile)
+    def delete(data):
+        del data["inators"][ident]
+
+    delete()
+
+    after = {n: os.stat(os.path.join("data", n)).st_ino
+             for n in os.listdir("data")}
+    changed = {n for n in before if before[n] != after[n]}
+    assert changed == {sharding.SHARD_FILE.format(
+        sharding.shard_of(ident, 4))}
+    assert ident not in sharding.ShardedDataFile("data").load()["inators"]
+
+
+def test_reload_changed_shards(inator_data):
+    """A second instance picks up shards written by the first."""
+    writer = sharding.ShardedDataFile("data", shards=2, fsync=False)
+    reader = sharding.ShardedDataFile("data", processes=True)
+    add_inators(writer, {})
+    assert reader.load()["inators"] == {}
+
+    add_inators(writer, inator_data)
+    assert sorted(reader.load()["inators"]) == sorted(inator_data)
+
+
+def test_reshard_tool(inator_data):
+    """A generated data file can be sharded and resharded."""
+    with open("data.json", "w") as f:
+        json.dump({"inators": inator_data}, f, default=utils.from_datetime)
+
+    tool = os.path.join(os.path.dirname(sharding.__file__), "sharding.py")
+    subprocess.check_call([sys.executable, tool, "data.json", "data",
+                           "--shards=3"])
+    assert sorted(sharding.ShardedDataFile("data").load()["inators"]) == \
+        sorted(inator_data)
+
+    sharding.reshard("data", "data", 2)
+    assert len(os.listdir("data")) == 3
+    assert sorted(sharding.ShardedDataFile("data").load()["inators"]) == \
+        sorted(inator_data)
+
+
+def test_reshard_failure_keeps_data(inator_data, monkeypatch):
+    """Failing to reshard in place leaves the old layout whole."""
+    with open("data.json", "w") as f:
+        json.dump({"inators": inator_data}, f, default=utils.from_datetime)
+    sharding.reshard("data.json", "data", 3)
+    with open(os.path.join("data", "notes.txt"), "w") as f:
+        f.write("keep me")
+
+    write_atomic = sharding.write_atomic
+
+    def failing_write(path, *args):
+        if path.endswith("001.json"):
+            raise OSError("disk full")
+        write_atomic(path, *args)
+    monkeypatch.setattr(sharding, "write_atomic", failing_write)
+    with pytest.raises(OSError):
+        sharding.reshard("data", "data", 2)
+    assert sorted(os.listdir(".")) == ["data", "data.json"]
+    assert sorted(sharding.ShardedDataFile("data").load()["inators"]) == \
+        sorted(inator_data)
+
+    monkeypatch.undo()
+    sharding.reshard("data", "data", 2)
+    assert sorted(os.listdir("data")) == \
+        ["inators-000.json", "inators-001.json", "meta.json", "notes.txt"]
+    assert sorted(sharding.ShardedDataFile("data").load()["inators"]) == \
+        sorted(inator_data)
@@ -0,0 +1,151 @@
+"""Tests for the binary snapshot format."""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import generate
+import snapshot
+import utils
+
+
+def expected(data):
+    """Return *data* as it reads back from a JSON data file."""
+    return utils.decode_data(utils.encode_data(data))
+
+
+def inator(ident):
+    """Return a new inator identified by *ident*."""
+    fields = {"name": "beep-inator", "location": "Danville",
+              "description": "Beeps", "condition": 3}
+    return utils.new_inator(fields, ident=ident)
+
+
+@pytest.fixture
+def data(inator_data):
+    """Return a data set with inators and users."""
+    return {"inators": inator_data,
+            "users": generate.credentials(["heinz:doof"])}
+
+
+def test_round_trip(data):
+    """Snapshots hold the same data as JSON data files."""
+    encoded = snapshot.encode_snapshot(data)
+    assert snapshot.is_snapshot(encoded)
+    assert snapshot.decode_snapshot(encoded) == expected(data)
+
+
+def test_header(data):
+    """The header gives the format version and record count."""
+    encoded = snapshot.encode_snapshot(data)
+    magic, version, flags, count, shared, size = \
+        snapshot.HEADER.unpack_from(encoded)
+    assert magic == snapshot.MAGIC
+    assert version == snapshot.VERSION
+    assert count == 5
+    assert shared == 5 + len({i["location"] for i in data["inators"].values()})
+
+
+def test_unicode_and_empty():
+    """Non-ASCII text survives, and so do data sets without inators."""
+    inator = next(iter(generate.random_inators(1).values()))
+    inator = inator.replace(name="schmelz-ïnator", description="☃ " * 3)
+    data = {"inators": {inator.ident: inator}}
+    assert snapshot.decode_snapshot(snapshot.encode_snapshot(data)) == \
+        expected(data)
+    assert snapshot.decode_snapshot(snapshot.encode_snapshot({})) == \
+        {"inators": {}}
+
+
+def test_bad_snapshots(data):
+    """Anything but an intact snapshot is rejected."""
+    encoded = snapshot.encode_snapshot(data)
+    newer = bytearray(encoded)
+    newer[8] = snapshot.VERSION + 1
+    for bad in [b"", b'{"inators": {}}', encoded[:100], bytes(newer)]:
+        with pytest.raises(ValueError):
+            snapshot.decode_snapshot(bad)
+    with pytest.raises(ValueError):
+        snapshot.encode_snapshot({"inators": {"x": {"name": "x"}}})
+
+
+def test_data_file(data):
+    """Snapshots work as a storage mode."""
+    datafile = snapshot.SnapshotDataFile("data.snapshot", fsync=False)
+
+    @utils.add_data_param(datafile)
+    def add(data_, inators):
+        data_.setdefault("inators", {}).update(inators)
+
+    add(data["inators"])
+    assert snapshot.SnapshotDataFile("data.snapshot").load() == \
+        expected({"inators": data["inators"]})
+    # The in-memory copy is reused until the file changes
+    assert datafile.load() is datafile.load()
+
+
+def test_concurrent_writers():
+    """Threads adding inators at once lose none of them."""
+    datafile = snapshot.SnapshotDataFile("data.snapshot", fsync=False)
+
+    @utils.add_data_param(datafile)
+    def add(data_, ident):
+        data_.setdefault("inators", {})[ident] = inator(ident)
+
+    add("first")
+
+    def append(thread):
+        for i in range(200):
+            add("{}-{}".format(thread, i))
+
+    threads = [threading.Thread(target=append, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    loaded = snapshot.SnapshotDataFile("data.snapshot").load()
+    assert len(loaded["inators"]) == 801
+
+
+def test_stale_copy_is_rebased():
+    """Saving changes to an old copy keeps what was written since."""
+    datafile = snapshot.SnapshotDataFile("data.snapshot", fsync=False)
+    other = snapshot.SnapshotDataFile("data.snapshot", fsync=False)
+    with utils.open_data(datafile) as data:
+        data["inators"] = {"a": inator("a")}
+    stale = datafile.load()
+    with utils.open_data(other) as data:
+        data["inators"]["b"] = inator("b")
+    stale["inators"]["c"] = inator("c")
+    datafile.save(stale, list(stale.tracker.changes))
+
+    loaded = snapshot.SnapshotDataFile("data.snapshot").load()
+    assert sorted(loaded["inators"]) == ["a", "b", "c"]
+
+
+def test_convert_both_ways(data):
+    """The command line tool converts JSON to snapshots and back."""
+    with open("data.json", "w") as f:
+        json.dump(data, f, default=utils.from_datetime)
+    tool = os.path.join(os.path.dirname(snapshot.__file__), "snapshot.py")
+    subprocess.check_call([sys.executable, tool, "data.json", "data.bin"])
+    subprocess.check_call([sys.executable, tool, "data.bin", "copy.json"])
+
+    _, loaded = snapshot.read_snapshot("data.bin")
+    assert loaded == expected(data)
+    with open("copy.json") as f:
+        assert utils.decode_data(f.read()) == expected(data)
+
+
+def test_generate_snapshot():
+    """The generator can print snapshots directly."""
+    tool = os.path.join(os.path.dirname(generate.__file__), "generate.py")
+    output = subprocess.check_output([sys.executable, tool, "--inators=7",
+                                      "--format=snapshot"])
+    data = snapshot.decode_snapshot(output)
+    assert len(data["inators"]) == 7
+    assert data["users"] == generate.credentials(["heinz:doof"])
@@ -0,0 +1,461 @@
+"""Tests for storage backends."""
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from condition import Condition
+
+import generate
+import indexes
+import storage
+import utils
+
+
+@pytest.fixture(params=sorted(storage.STORAGE_KINDS))
+def store(request):
+    """Open each kind of storage backend in the temporary directory."""
+    return storage.open_storage(request.param, "inator_data")
+
+
+def test_put_and_get(store, inator_data):
+    """Inators can be read back after they are added."""
+    for inator in inator_data.values():
+        store.put_inator(inator)
+
+    for ident, inator in inator_data.items():
+        got = store.get_inator(ident)
+        assert got["name"] == inator["name"]
+        assert got["condition"] is inator["condition"]
+        assert got["added"].replace(microsecond=0) == \
+            inator["added"].replace(microsecond=0)
+
+
+def test_get_missing(store):
+    """Looking up a missing inator or user raises KeyError."""
+    with pytest.raises(KeyError):
+        store.get_inator("bleep-bloop")
+    with pytest.raises(KeyError):
+        store.get_user("heinz")
+
+
+def test_delete(store, inator_data):
+    """Deleted inators are gone."""
+    for inator in inator_data.values():
+        store.put_inator(inator)
+
+    ident = next(iter(inator_data))
+    assert store.delete_inator(ident)["ident"] == ident
+    with pytest.raises(KeyError):
+        store.get_inator(ident)
+    with pytest.raises(KeyError):
+        store.delete_inator(ident)
+    assert len(store.list_inators()) == 4
+
+
+def test_list_order(store, inator_data):
+    """Inators are listed by condition, then by name."""
+    for inator in inator_data.values():
+        store.put_inator(inator)
+
+    expected = storage.sort_inators(inator_data.values())
+    assert [i["ident"] for i in store.list_inators()] == \
+        [i["ident"] for i in expected]
+
+
+def test_list_filters(store, inator_data):
+    """Listings can be filtered by condition and location."""
+    inators = list(inator_data.values())
+    for inator in inators:
+        store.put_inator(inator)
+
+    conditions = {inators[0]["condition"], inators[1]["condition"]}
+    listed = store.list_inators(conditions=conditions)
+    assert {i["ident"] for i in listed} == \
+        {i["ident"] for i in inators if i["condition"] in conditions}
+
+    location = inators[2]["location"]
+    listed = store.list_inators(location=location)
+    assert {i["ident"] for i in listed} == \
+        {i["ident"] for i in inators if i["location"] == location}
+
+    assert store.list_inators(conditions=[], location=location) == []
+
+    # Filtered listings keep the listing order
+    for filters in [{"conditions": conditions}, {"location": location},
+                    {"conditions": conditions, "location": location}]:
+        matches = [i for i in inators
+                   if i["condition"] in filters.get("conditions",
+                                                    [i["condition"]]) and
+                   i["location"] == filters.get("location", i["location"])]
+        assert [i["ident"] for i in store.list_inators(**filters)] == \
+            [i["ident"] for i in storage.sort_inators(matches)]
+
+
+def test_transaction_rollback(store, inator_data):
+    """Changes made in a failed transaction are not kept."""
+    inator = next(iter(inator_data.values()))
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.put_inator(inator)
+            raise RuntimeError
+
+    with pytest.raises(KeyError):
+        store.get_inator(inator["ident"])
+
+
+def test_users(store):
+    """Users without a password have no password field."""
+    store.put_user({"username": "heinz", "password": "doof"})
+    store.put_user({"username": "norm"})
+
+    assert store.get_user("heinz") == {"username": "heinz",
+                                       "password": "doof"}
+    assert store.get_user("norm") == {"username": "norm"}
+
+
+def test_sqlite_uses_indexes():
+    """Lookups and the listing order are served by indexes."""
+    store = storage.SQLiteStorage("inator_data.sqlite3")
+    plan = store.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM inators "
+        "ORDER BY condition DESC, name, rowid").fetchall()
+    assert "inators_condition_name" in plan[0][-1]
+    assert not any("TEMP B-TREE" in row[-1] for row in plan)
+
+    # Pages continue from the cursor within the index
+    plan = store.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM inators "
+        "WHERE condition = 3 AND (name, rowid) > ('x', 5) "
+        "ORDER BY condition DESC, name, rowid LIMIT 5").fetchall()
+    assert "(condition=? AND name>?)" in plan[0][-1]
+    assert not any("TEMP B-TREE" in row[-1] for row in plan)
+
+
+def test_unknown_storage():
+    """Unknown backends are rejected."""
+    with pytest.raises(ValueError):
+        storage.open_storage("punch-cards", "inator_data")
+
+
+def test_default_paths():
+    """SQLite and record files do not default to JSON data files."""
+    assert isinstance(storage.open_storage("sqlite"), storage.SQLiteStorage)
+    assert storage.DEFAULT_PATHS["indexed"] != storage.DEFAULT_PATHS["json"]
+    for kind in ["sqlite", "indexed"]:
+        with pytest.raises(ValueError):
+            storage.open_storage(kind, "inator_data.json")
+        assert not os.path.exists("inator_data.json")
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "indexed"])
+def test_convert(kind, inator_data):
+    """JSON data sets are copied with their users."""
+    with open("inator_data.json", "w") as f:
+        json.dump({"inators": inator_data,
+                   "users": generate.credentials(["heinz:doof"])},
+                  f, default=utils.from_datetime)
+    store = storage.open_storage(kind)
+    datafile = utils.DataFile("inator_data.json")
+
+    assert storage.convert(datafile, store) == (1, 5)
+    assert store.get_user("heinz") == {"username": "heinz",
+                                       "password": "doof"}
+    assert sorted(i["ident"] for i in store.list_inators()) == \
+        sorted(inator_data)
+
+
+def test_convert_command(inator_data):
+    """The command line tool converts JSON data sets."""
+    with open("inator_data.json", "w") as f:
+        json.dump({"inators": inator_data,
+                   "users": generate.credentials(["heinz:doof"])},
+                  f, default=utils.from_datetime)
+    tool = os.path.join(os.path.dirname(storage.__file__), "storage.py")
+    output = subprocess.check_output([sys.executable, tool,
+                                      "--storage=indexed",
+                                      "inator_data.json"])
+    assert b"1 users and 5 inators" in output
+    store = storage.open_storage("indexed")
+    assert store.get_user("heinz")["password"] == "doof"
+    assert len(store.list_inators()) == 5
+
+    missing = subprocess.run([sys.executable, tool, "missing.json"],
+                             stderr=subprocess.PIPE)
+    assert missing.returncode != 0
+    assert b"Cannot convert" in missing.stderr
+
+
+def test_condition_values():
+    """Condition values survive a round trip through SQLite."""
+    store = storage.SQLiteStorage("inator_data.sqlite3")
+    added = datetime.datetime(2017, 9, 18, 2, 4, 57)
+    for c in Condition:
+        store.put_inator({"ident": c.name, "name": "x", "location": "y",
+                          "description": "z", "condition": c,
+                          "added": added})
+    assert [i["condition"] for i in store.list_inators()] == \
+        sorted(Condition, reverse=True)
+
+
+class RecordingIndex(indexes.Index):
+    """Index that keeps the inators it was given by identifier."""
+
+    def __init__(self):
+        self.inators = {}
+        self.rebuilds = 0
+
+    def clear(self):
+        self.inators = {}
+        self.rebuilds += 1
+
+    def add(self, inator):
+        assert inator["ident"] not in self.inators
+        self.inators[inator["ident"]] = inator
+
+    def discard(self, inator):
+        del self.inators[inator["ident"]]
+
+
+def indexed_idents(store):
+    """Return the identifiers in the store's recording index."""
+    with store.index("recording") as index:
+        return set(index.inators)
+
+
+def test_index_follows_changes(store, inator_data):
+    """Indexes see puts and deletes without being rebuilt."""
+    index = RecordingIndex()
+    store.add_index("recording", index)
+    assert indexed_idents(store) == set()
+    assert index.rebuilds == 1
+
+    inators = list(inator_data.values())
+    with store.transaction():
+        for inator in inators:
+            store.put_inator(inator)
+    store.delete_inator(inators[0]["ident"])
+    store.put_inator(inators[1].replace(name="boop-inator"))
+
+    assert indexed_idents(store) == {i["ident"] for i in inators[1:]}
+    assert index.inators[inators[1]["ident"]]["name"] == "boop-inator"
+    assert index.rebuilds == 1
+
+
+def test_index_rollback(store, inator_data):
+    """Changes from a failed transaction never reach an index."""
+    store.add_index("recording", RecordingIndex())
+    inators = list(inator_data.values())
+    store.put_inator(inators[0])
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.put_inator(inators[1])
+            # Uncommitted changes are visible inside the transaction
+            assert indexed_idents(store) == {inators[0]["ident"],
+                                             inators[1]["ident"]}
+            raise RuntimeError
+
+    assert indexed_idents(store) == {inators[0]["ident"]}
+
+
+def test_index_sees_other_writers(request, store, inator_data):
+    """Changes made through another instance rebuild the index."""
+    index = RecordingIndex()
+    store.add_index("recording", index)
+    other = storage.open_storage(request.node.callspec.params["store"],
+                                 "inator_data")
+    inators = list(inator_data.values())
+    store.put_inator(inators[0])
+    assert indexed_idents(store) == {inators[0]["ident"]}
+
+    other.put_inator(inators[1])
+    # Another process would reload the file rather than share the cache
+    utils.data_cache.invalidate()
+    assert indexed_idents(store) == {inators[0]["ident"],
+                                     inators[1]["ident"]}
+
+
+def test_index_rebuilt_alone(request, store, inator_data):
+    """Only the index being used is rebuilt after other writers."""
+    used, unused = RecordingIndex(), RecordingIndex()
+    store.add_index("used", used)
+    store.add_index("unused", unused)
+    other = storage.open_storage(request.node.callspec.params["store"],
+                                 "inator_data")
+    inators = list(inator_data.values())
+    store.put_inator(inators[0])
+    with store.index("used"), store.index("unused"):
+        pass
+    assert (used.rebuilds, unused.rebuilds) == (1, 1)
+
+    other.put_inator(inators[1])
+    utils.data_cache.invalidate()
+    with store.index("used") as index:
+        assert set(index.inators) == {inators[0]["ident"],
+                                      inators[1]["ident"]}
+    assert (used.rebuilds, unused.rebuilds) == (2, 1)
+
+    # Changes made meanwhile are not lost on the stale index
+    store.put_inator(inators[2])
+    with store.index("used") as index:
+        assert len(index.inators) == 3
+    assert used.rebuilds == 2
+    with store.index("unused") as index:
+        assert len(index.inators) == 3
+    assert unused.rebuilds == 2
+
+
+@pytest.fixture
+def many_inators():
+    """Generate inators with plenty of equal conditions and names."""
+    inators = list(generate.random_inators(40).values())
+    return [i.replace(name="{}-inator".format(n % 3))
+            for n, i in enumerate(inators)]
+
+
+def walk_pages(store, limit, **filters):
+    """Return the identifiers on every page, forwards and backwards."""
+    forwards, cursor, more = [], None, True
+    while more:
+        page, more = store.list_page(limit, after=cursor, **filters)
+        forwards.append([i["ident"] for i in page])
+        cursor = storage.page_cursor(page[-1]) if page else None
+    # Start going back from the first inator on the last page
+    cursor = storage.page_cursor(page[0]) if page else None
+    backwards, more = [], len(forwards) > 1
+    while more:
+        page, more = store.list_page(limit, before=cursor, **filters)
+        backwards.insert(0, [i["ident"] for i in page])
+        cursor = storage.page_cursor(page[0])
+    return forwards, backwards
+
+
+def test_pages(store, many_inators):
+    """Pages walk through the listing in order, in both directions."""
+    with store.transaction():
+        for inator in many_inators:
+            store.put_inator(inator)
+    listed = [i["ident"] for i in store.list_inators()]
+
+    forwards, backwards = walk_pages(store, 7)
+    assert sum(forwards, []) == listed
+    assert [len(p) for p in forwards] == [7] * 5 + [5]
+    # Going back ends with the first page
+    assert sum(backwards, []) == listed[:35]
+    assert backwards == forwards[:5]
+
+    conditions = {Condition.KINDA_WORKS, Condition.ACTUALLY_WORKS}
+    forwards, _ = walk_pages(store, 4, conditions=conditions)
+    assert sum(forwards, []) == \
+        [i["ident"] for i in store.list_inators(conditions=conditions)]
+
+    filters = {"conditions": conditions,
+               "location": many_inators[0]["location"]}
+    listed = [i["ident"] for i in store.list_inators(**filters)]
+    forwards, backwards = walk_pages(store, 2, **filters)
+    assert sum(forwards, []) == listed
+    assert sum(backwards, []) == listed[:len(sum(forwards[:-1], []))]
+
+
+def test_pages_added_range(store, many_inators):
+    """Listings and pages can be limited to a range of times added."""
+    with store.transaction():
+        for inator in many_inators:
+            store.put_inator(inator)
+    listed = store.list_inators()
+    # Whole seconds, as some storages drop the rest
+    times = sorted(i["added"].replace(microsecond=0) for i in listed)
+    for start, stop in [(times[5], times[30]), (times[20], None),
+                        (None, times[3])]:
+        expected = [i["ident"] for i in listed
+                    if (start is None or i["added"] >= start) and
+                    (stop is None or i["added"] < stop)]
+        filters = {"added_from": start, "added_to": stop}
+        assert [i["ident"] for i in store.list_inators(**filters)] == \
+            expected
+        forwards, backwards = walk_pages(store, 3, **filters)
+        assert sum(forwards, []) == expected
+        assert sum(backwards, []) == expected[:len(sum(forwards[:-1], []))]
+
+    conditions = {Condition.KINDA_WORKS, Condition.ACTUALLY_WORKS}
+    filtered = store.list_inators(conditions=conditions, added_from=times[10])
+    assert [i["ident"] for i in filtered] == \
+        [i["ident"] for i in listed
+         if i["condition"] in conditions and i["added"] >= times[10]]
+
+
+def test_iter_snapshot(store, many_inators):
+    """Iterating sees the inators as they were when it started."""
+    with store.transaction():
+        for inator in many_inators:
+            store.put_inator(inator)
+    listed = store.list_inators()
+    conditions = {Condition.KINDA_WORKS, Condition.ACTUALLY_WORKS}
+    assert list(store.iter_inators(conditions=conditions)) == \
+        store.list_inators(conditions=conditions)
+
+    inators = store.iter_inators()
+    first = next(inators)
+    store.delete_inator(listed[-1]["ident"])
+    store.put_inator(listed[1].replace(name="zzz-inator"))
+    store.put_inator(generate.inator_record("new-inator", listed[0]["added"]))
+    assert [first] + list(inators) == listed
+    assert len(store.list_inators()) == len(listed)
+    assert store.list_inators() != listed
+
+
+def test_page_after_deleted(store, many_inators):
+    """Cursors keep working when their inator is deleted."""
+    with store.transaction():
+        for inator in many_inators:
+            store.put_inator(inator)
+    listed = store.list_inators()
+    # Pick an inator that is not the first of its condition and name
+    n = next(n for n in range(1, 40)
+             if listed[n]["condition"] == listed[n - 1]["condition"] and
+             listed[n]["name"] == listed[n - 1]["name"])
+    cursor = storage.page_cursor(listed[n])
+    store.delete_inator(listed[n]["ident"])
+
+    # Inators tied with the deleted one come again, nothing is skipped
+    page, more = store.list_page(40, after=cursor)
+    idents = [i["ident"] for i in page]
+    assert idents[-(39 - n):] == [i["ident"] for i in listed[n + 1:]]
+    assert listed[n - 1]["ident"] in idents
+    page, more = store.list_page(40, before=cursor)
+    assert [i["ident"] for i in page][:n] == \
+        [i["ident"] for i in listed[:n]]
+
+
+def test_bad_cursors(store):
+    """Invalid cursors are rejected."""
+    for cursor in ["nope", "W10", storage.page_cursor(
+            {"condition": 9, "name": "x", "ident": "y"})]:
+        with pytest.raises(ValueError):
+            store.list_page(10, after=cursor)
+    with pytest.raises(ValueError):
+        store.list_page(10, after="W10", before="W10")
+
+
+def test_list_order_after_changes(store, many_inators):
+    """Replaced inators keep their place among ties; re-added ones don't."""
+    expected = {}
+    with store.transaction():
+        for inator in many_inators:
+            store.put_inator(inator)
+            expected[inator.ident] = inator
+    for inator in many_inators[::5]:
+        changed = inator.replace(description="Changed.")
+        store.put_inator(changed)
+        expected[inator.ident] = changed
+    for inator in many_inators[1::7]:
+        store.delete_inator(inator.ident)
+        del expected[inator.ident]
+        store.put_inator(inator)
+        expected[inator.ident] = inator
+
+    assert [i["ident"] for i in store.list_inators()] == \
+        [i["ident"] for i in storage.sort_inators(expected.values())]
@@ -0,0 +1,113 @@
+"""Tests for change tracking."""
+import json
+
+import tracking
+
+
+def test_track_nested():
+    """Nested dicts and lists are tracked by the same tracker."""
+    data = tracking.track({"inators": {"a": {"name": "x"}}, "tags": [{}]})
+
+    assert isinstance(data["inators"], tracking.TrackedDict)
+    assert isinstance(data["inators"]["a"], tracking.TrackedDict)
+    assert isinstance(data["tags"], tracking.TrackedList)
+    assert data["inators"].tracker is data.tracker
+    assert data["inators"]["a"].path == ("inators", "a")
+
+    # Modifying a list item counts as modifying the list
+    data["tags"][0]["x"] = 1
+    assert data.tracker.changes == [("set", ("tags",), [{"x": 1}])]
+
+
+def test_reads_are_not_changes():
+    """Reading tracked data leaves the version alone."""
+    data = tracking.track({"inators": {"a": {"name": "x"}}, "tags": [1, 2]})
+
+    data["inators"]["a"]["name"]
+    data.get("users")
+    list(data["inators"].items())
+    sorted(data["tags"], reverse=True)
+    json.dumps(data)
+
+    assert data.tracker.version == 0
+
+
+def test_dict_changes():
+    """Every kind of dict modification is recorded."""
+    data = tracking.track({"inators": {}})
+    inators = data["inators"]
+
+    changes = [
+        lambda: inators.__setitem__("a", {"name": "x"}),
+        lambda: inators["a"].__setitem__("name", "y"),
+        lambda: inators.update(b=1),
+        lambda: inators.setdefault("c", 2),
+        lambda: inators.pop("c"),
+        lambda: inators.__delitem__("b"),
+        lambda: inators.popitem(),
+        lambda: data.clear(),
+    ]
+    for i, change in enumerate(changes, 1):
+        change()
+        assert data.tracker.version >= i
+
+
+def test_noop_dict_calls():
+    """Calls that leave a dict unchanged are not recorded."""
+    data = tracking.track({"a": 1})
+
+    data.pop("missing", None)
+    data.setdefault("a", 5)
+    tracking.track({}).clear()
+
+    assert data.tracker.version == 0
+
+
+def test_list_changes():
+    """List modifications are recorded and new items are tracked."""
+    data = tracking.track({"things": []})
+
+    things = data["things"]
+    things.append({"frog": 1})
+    assert isinstance(things[0], tracking.TrackedDict)
+    things[0]["frog"] = 2
+    things += [3]
+    things.sort(key=str)
+
+    assert data.tracker.version == 4
+    assert json.dumps(data) == '{"things": [3, {"frog": 2}]}'
+
+
+def test_change_records():
+    """Modifications are recorded with the path to the changed value."""
+    data = tracking.track({"inators": {"a": {"name": "x"}}})
+
+    data["inators"]["b"] = {"name": "y"}
+    data["inators"]["a"]["name"] = "z"
+    data["inators"].pop("b")
+
+    assert data.tracker.changes == [
+        ("set", ("inators", "b"), {"name": "y"}),
+        ("set", ("inators", "a", "name"), "z"),
+        ("delete", ("inators", "b"), None),
+    ]
+
+
+def test_apply_change():
+    """Replaying change records reproduces the modifications."""
+    source = tracking.track({"inators": {"a": {"name": "x"}}})
+    copy = tracking.track({"inators": {"a": {"name": "x"}}})
+
+    source["inators"]["b"] = {"name": "y"}
+    source["inators"]["b"]["name"] = "w"
+    del source["inators"]["a"]
+    source["users"] = {"heinz": {}}
+
+    # Replaying twice gives the same result as replaying once
+    for _ in range(2):
+        for change in source.tracker.changes:
+            tracking.apply_change(copy, *change)
+
+    assert copy == source
+    assert copy.tracker.version == 0
+    assert copy["inators"]["b"].path == ("inators", "b")
@@ -1,6 +1,9 @@
 """Tests for utility functions."""
 import datetime
 import json
+import threading
+import time
+
 import pytest
 
 from condition import Condition
@@ -150,3 +153,212 @@ def test_add_data_param_file_exists():
 
     # We should still see froggy, as well as the newly-added pigeon
     assert content == {"froggy": 12, "pigeon": 10}
+
+
+def test_data_cache_hit():
+    """Loading an unchanged file twice only parses it once."""
+    with open("data.json", "w") as f:
+        json.dump({"froggy": 12}, f)
+
+    cache = utils.DataCache()
+    first = cache.load("data.json")
+    second = cache.load("data.json")
+
+    assert first is second
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_data_cache_reloads_changed_file():
+    """A file that changes on disk is parsed again."""
+    with open("data.json", "w") as f:
+        json.dump({"froggy": 12}, f)
+
+    cache = utils.DataCache()
+    assert cache.load("data.json") == {"froggy": 12}
+
+    with open("data.json", "w") as f:
+        json.dump({"froggy": 12, "pigeon": 10}, f)
+
+    assert cache.load("data.json") == {"froggy": 12, "pigeon": 10}
+    assert cache.misses == 2
+
+
+def test_data_cache_separate_paths():
+    """Each path gets its own cache entry."""
+    for name, value in (("a.json", 1), ("b.json", 2)):
+        with open(name, "w") as f:
+            json.dump({"value": value}, f)
+
+    cache = utils.DataCache()
+    assert cache.load("a.json") == {"value": 1}
+    assert cache.load("b.json") == {"value": 2}
+    assert cache.load("a.json") == {"value": 1}
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 2}
+
+
+def test_add_data_param_uses_cache():
+    """Repeated calls reuse the data written by the previous call."""
+    @utils.add_data_param("data.json")
+    def myfunc(data):
+        data["count"] = data.get("count", 0) + 1
+
+    myfunc()
+    misses = utils.data_cache.misses
+    myfunc()
+    myfunc()
+
+    # The decorator wrote the file itself, so it never needs re-parsing
+    assert utils.data_cache.misses == misses
+    with open("data.json") as f:
+        assert json.load(f) == {"count": 3}
+
+
+def test_add_data_param_skips_unchanged_write():
+    """The data file isn't rewritten if the function only reads."""
+    with open("data.json", "w") as f:
+        f.write('{"froggy":   12}')
+
+    @utils.add_data_param("data.json")
+    def myfunc(data):
+        return data["froggy"]
+
+    assert myfunc() == 12
+
+    # The original formatting shows the file wasn't touched
+    with open("data.json") as f:
+        assert f.read() == '{"froggy":   12}'
+
+
+def test_add_data_param_nested_change():
+    """Changes to nested dicts are written to the file."""
+    with open("data.json", "w") as f:
+        json.dump({"inators": {}}, f)
+
+    @utils.add_data_param("data.json")
+    def myfunc(data):
+        data["inators"]["beep"] = {"name": "beep-inator"}
+
+    myfunc()
+
+    with open("data.json") as f:
+        assert json.load(f) == {"inators": {"beep": {"name": "beep-inator"}}}
+
+
+def test_add_data_param_concurrent_changes():
+    """Threads changing the data at once each save only their changes."""
+    saved = []
+
+    class RecordingDataFile(utils.DataFile):
+        def save(self, data, changes):
+            saved.append(changes)
+            super().save(data, changes)
+
+    @utils.add_data_param(RecordingDataFile("data.json"))
+    def add(data, key):
+        data[key] = 1
+        time.sleep(0)
+        data[key] += 1
+
+    def append(thread):
+        for i in range(100):
+            add("{}-{}".format(thread, i))
+
+    threads = [threading.Thread(target=append, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(saved) == 400
+    assert all(len(changes) == 2 for changes in saved)
+    with open("data.json") as f:
+        data = json.load(f)
+    assert len(data) == 400 and set(data.values()) == {2}
+
+
+def test_parse_time_matches_load_time():
+    """The fast timestamp parser agrees with load_time."""
+    strings = ["2017-09-18T02:04:57", "2017-9-18T2:4:57",
+               "2016-02-29T23:59:59", "2017-02-29T00:00:00",
+               "2017-09-18T24:00:00", "2017-09-18T02:04:60",
+               "0000-01-01T00:00:00", "2017-09-18 02:04:57",
+               "2017-09-18T02:04:57Z", "2017-09-18", ""]
+    for s in strings:
+        try:
+            expected = utils.load_time(s)
+        except ValueError:
+            with pytest.raises(ValueError):
+                utils.parse_time(s)
+        else:
+            assert utils.parse_time(s) == expected
+
+
+def test_load_day_or_time():
+    """Days load as midnight, and full times as usual."""
+    assert utils.load_day_or_time("2017-09-18") == \
+        datetime.datetime(2017, 9, 18)
+    assert utils.load_day_or_time("2017-09-18T02:04:57") == \
+        datetime.datetime(2017, 9, 18, 2, 4, 57)
+    for s in ["2017-09-31", "18/09/2017", ""]:
+        with pytest.raises(ValueError):
+            utils.load_day_or_time(s)
+
+
+def test_parse_condition():
+    """The condition lookup table agrees with Condition."""
+    for x in [1, 5, "3", 4.0, True]:
+        assert utils.parse_condition(x) is Condition(int(x))
+    for x in [0, 6, "blep"]:
+        with pytest.raises(ValueError):
+            utils.parse_condition(x)
+
+
+def test_new_inator_lone_surrogates():
+    """Inators must be storable as UTF-8 by every backend."""
+    fields = {"name": "boop-inator", "location": "the moon",
+              "description": "Boops.", "condition": "2"}
+    assert utils.new_inator(fields)["name"] == "boop-inator"
+    for key in ("name", "location", "description"):
+        with pytest.raises(ValueError):
+            utils.new_inator(dict(fields, **{key: "\udcff"}))
+    with pytest.raises(ValueError):
+        utils.new_inator(fields, ident="\ud800")
+
+
+def test_new_inator_whole_conditions():
+    """Submitted conditions must be ints or strings of digits."""
+    fields = {"name": "boop-inator", "location": "the moon",
+              "description": "Boops."}
+    for x in [2, "2"]:
+        inator = utils.new_inator(dict(fields, condition=x))
+        assert inator["condition"] is Condition.NEEDS_REPAIR
+    for x in ["3.7", " 3", "-1", 3.7, 4.0, True, None, [3], 9]:
+        with pytest.raises(ValueError):
+            utils.new_inator(dict(fields, condition=x))
+
+
+def test_decode_data_matches_object_hook(inator_data):
+    """Decoding a data file gives the same result as the object hook."""
+    inators = json.loads(json.dumps(inator_data, default=utils.from_datetime))
+    # Add some records that should stay as they are
+    inators["bad-condition"] = dict(next(iter(inators.values())),
+                                    condition=6)
+    inators["bad-date"] = dict(next(iter(inators.values())), added="never")
+    inators["extra-field"] = dict(next(iter(inators.values())), extra=1)
+    s = json.dumps({"inators": inators,
+                    "users": {"heinz": {"username": "heinz",
+                                        "password": "doof"}}})
+
+    expected = json.loads(s, object_hook=utils.as_inator)
+    assert utils.decode_data(s) == expected
+    assert utils.decode_data("[1, 2]") == [1, 2]
+
+
+def test_epoch_round_trip():
+    """Times are stored as whole seconds since the epoch."""
+    time = datetime.datetime(2017, 9, 18, 2, 4, 57, 123)
+    seconds = utils.to_epoch(time)
+    assert isinstance(seconds, int)
+    assert utils.from_epoch(seconds) == time.replace(microsecond=0)
+    assert utils.from_epoch(utils.to_epoch(utils.EPOCH)) == utils.EPOCH
+    assert utils.to_epoch(datetime.datetime(1969, 12, 31, 23, 59, 59)) == -1
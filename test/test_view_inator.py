@@ -5,6 +5,7 @@ import random
 from http import HTTPStatus
 from urllib.parse import urlparse
 
+import searchinator
 from utils import from_datetime
 
 
@@ -102,3 +103,64 @@ def test_load_invalid_no_data(app, inator_data, data_path):
     # Assert that we're flashed the correct message
     rv = app.get("/view/bleep-bloop/", follow_redirects=True)
     assert b"No such inator with identifier bleep-bloop." in rv.data
+
+
+def test_not_modified(app, inator_data, data_path):
+    """An inator's page is only sent again once it changed."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    first, second = list(inator_data)[:2]
+    rv = app.get("/view/{}/".format(first))
+    etag = rv.headers["ETag"]
+    rv = app.get("/view/{}/".format(first), headers={"If-None-Match": etag})
+    assert rv.status_code == HTTPStatus.NOT_MODIFIED
+
+    # Other inators changing makes no difference
+    app.post("/delete/{}/".format(second))
+    # Showing the flashed message
+    app.get("/").close()
+    rv = app.get("/view/{}/".format(first), headers={"If-None-Match": etag})
+    assert rv.status_code == HTTPStatus.NOT_MODIFIED
+
+    app.post("/delete/{}/".format(first))
+    rv = app.get("/view/{}/".format(first), headers={"If-None-Match": etag})
+    assert rv.status_code == HTTPStatus.FOUND
+
+
+def test_cached(app, inator_data, data_path):
+    """Pages come from the cache until the inator changes."""
+    with app.session_transaction() as sess:
+        sess["username"] = "heinz"
+
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+
+    cache = searchinator.page_cache
+    first, second = list(inator_data)[:2]
+    page = app.get("/view/{}/".format(first)).data
+    hits = cache.hits
+    assert app.get("/view/{}/".format(first)).data == page
+    assert cache.hits == hits + 1
+
+    # Messages are shown on cached pages too
+    with app.session_transaction() as sess:
+        sess["_flashes"] = [("info", "Hello there.")]
+    rv = app.get("/view/{}/".format(first))
+    assert cache.hits == hits + 2
+    assert b"Hello there." in rv.data
+    assert app.get("/view/{}/".format(first)).data == page
+
+    # Other inators changing makes no difference
+    app.post("/delete/{}/".format(second))
+    app.get("/").close()
+    app.get("/view/{}/".format(first))
+    assert cache.hits == hits + 4
+
+    inator_data[first] = inator_data[first].replace(name="Renamed-inator")
+    with open(data_path, "w") as data_file:
+        json.dump({"inators": inator_data}, data_file, default=from_datetime)
+    assert b"Renamed-inator" in app.get("/view/{}/".format(first)).data
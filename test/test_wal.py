@@ -0,0 +1,177 @@
+"""Tests for the write-ahead log storage mode."""
+import json
+import os
+import threading
+
+import utils
+import wal
+
+
+def add_inator(datafile, ident, name):
+    """Add a fake inator through the given data file."""
+    @utils.add_data_param(datafile)
+    def myfunc(data):
+        data.setdefault("inators", {})[ident] = {"name": name}
+
+    myfunc()
+
+
+def test_changes_are_appended():
+    """Modifications go to the log instead of the snapshot."""
+    with open("data.json", "w") as f:
+        json.dump({"inators": {}}, f)
+
+    datafile = wal.LoggedDataFile("data.json", fsync=False)
+    add_inator(datafile, "a", "beep-inator")
+    add_inator(datafile, "b", "boop-inator")
+
+    # The snapshot is untouched and the log has one record per call
+    with open("data.json") as f:
+        assert json.load(f) == {"inators": {}}
+    with open("data.json.log", "rb") as f:
+        assert len(f.readlines()) == 2
+
+    # A fresh reader sees the replayed data
+    fresh = wal.LoggedDataFile("data.json")
+    assert fresh.load() == {"inators": {"a": {"name": "beep-inator"},
+                                        "b": {"name": "boop-inator"}}}
+
+
+def test_read_only_calls_do_not_log():
+    """Reading the data leaves the log alone."""
+    datafile = wal.LoggedDataFile("data.json", fsync=False)
+    add_inator(datafile, "a", "beep-inator")
+
+    @utils.add_data_param(datafile)
+    def myfunc(data):
+        return data["inators"]["a"]["name"]
+
+    assert myfunc() == "beep-inator"
+    with open("data.json.log", "rb") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_compaction():
+    """The log is folded into the snapshot once it is too long."""
+    datafile = wal.LoggedDataFile("data.json", max_records=3, fsync=False)
+    for i in range(4):
+        add_inator(datafile, str(i), "inator-{}".format(i))
+
+    assert datafile.compactions == 1
+    with open("data.json") as f:
+        assert len(json.load(f)["inators"]) == 3
+    with open("data.json.log", "rb") as f:
+        assert len(f.readlines()) == 1
+
+    fresh = wal.LoggedDataFile("data.json")
+    assert sorted(fresh.load()["inators"]) == ["0", "1", "2", "3"]
+
+
+def test_torn_tail_is_ignored():
+    """Replay stops at an incomplete or corrupt record."""
+    datafile = wal.LoggedDataFile("data.json", fsync=False)
+    add_inator(datafile, "a", "beep-inator")
+
+    # Simulate a crash in the middle of writing a record
+    record = wal.encode_record([("set", ("inators", "b"), {"name": "x"})])
+    with open("data.json.log", "ab") as f:
+        f.write(record[:-5])
+
+    fresh = wal.LoggedDataFile("data.json", fsync=False)
+    assert list(fresh.load()["inators"]) == ["a"]
+
+    # The next append replaces the torn record
+    add_inator(fresh, "c", "boop-inator")
+    assert list(wal.LoggedDataFile("data.json").load()["inators"]) == \
+        ["a", "c"]
+
+
+def test_intact_tail_is_kept():
+    """Records past the known end of the log are not cut off."""
+    datafile = wal.LoggedDataFile("data.json", fsync=False)
+    add_inator(datafile, "a", "beep-inator")
+    offset = os.path.getsize("data.json.log")
+    add_inator(datafile, "b", "boop-inator")
+
+    # As if another thread appended the second record meanwhile
+    data = datafile.load()
+    datafile._offset = offset
+    datafile.save(data, [("set", ("inators", "c"), {"name": "bop-inator"})])
+    assert sorted(wal.LoggedDataFile("data.json").load()["inators"]) == \
+        ["a", "b", "c"]
+
+
+def test_concurrent_appends():
+    """Threads appending at once lose no records."""
+    datafile = wal.LoggedDataFile("data.json", max_records=10 ** 6,
+                                  fsync=False)
+    add_inator(datafile, "first", "beep-inator")
+
+    data = datafile.load()
+
+    def append(thread):
+        for i in range(200):
+            path = ("inators", "{}-{}".format(thread, i))
+            datafile.save(data, [("set", path, {"name": "boop-inator"})])
+
+    threads = [threading.Thread(target=append, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open("data.json.log", "rb") as f:
+        assert len(f.readlines()) == 801
+    assert len(wal.LoggedDataFile("data.json").load()["inators"]) == 801
+
+
+def test_bad_checksum_stops_replay():
+    """A record with a wrong checksum and everything after it is skipped."""
+    datafile = wal.LoggedDataFile("data.json", fsync=False)
+    add_inator(datafile, "a", "beep-inator")
+    add_inator(datafile, "b", "boop-inator")
+
+    with open("data.json.log", "rb") as f:
+        lines = f.readlines()
+    with open("data.json.log", "wb") as f:
+        f.write(lines[0] + b"00000000" + lines[1][8:])
+
+    fresh = wal.LoggedDataFile("data.json")
+    assert list(fresh.load()["inators"]) == ["a"]
+
+
+def test_missing_files():
+    """Without a snapshot or log there is no data."""
+    datafile = wal.LoggedDataFile("data.json")
+    try:
+        datafile.load()
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "expected FileNotFoundError"
+
+    # Saving without changes writes an empty snapshot
+    @utils.add_data_param(datafile)
+    def myfunc(data):
+        return "froggy"
+
+    assert myfunc() == "froggy"
+    with open("data.json") as f:
+        assert json.load(f) == {}
+    assert not os.path.exists("data.json.log")
+
+
+def test_inator_records_round_trip(inator_data):
+    """Inator records keep their types through the log."""
+    datafile = wal.LoggedDataFile("data.json", fsync=False)
+    for ident, inator in inator_data.items():
+        @utils.add_data_param(datafile)
+        def myfunc(data):
+            data.setdefault("inators", {})[ident] = inator
+
+        myfunc()
+
+    # Timestamps are stored without microseconds
+    expected = utils.decode_data(utils.encode_data({"inators": inator_data}))
+    fresh = wal.LoggedDataFile("data.json")
+    assert fresh.load() == expected
@@ -0,0 +1,231 @@
+"""Track modifications made to loaded data.
+
+This module contains :class:`dict` and :class:`list` subclasses that
+report every modification to a shared :class:`ChangeTracker`. The
+:func:`utils.add_data_param` decorator uses them to find out whether a
+route changed its data, so that read-only requests never rewrite the
+data file.
+
+Use :func:`track` to convert a freshly loaded value::
+
+  data = track(json.loads(text))
+  before = data.tracker.version
+  data['inators'][ident] = record
+  assert data.tracker.version != before
+
+Each modification is also kept as a change record in
+:attr:`ChangeTracker.changes`, so that storage modes such as
+:mod:`wal` can persist just what changed.
+
+"""
+
+
+class ChangeTracker:
+    """Count modifications made to a tree of tracked containers.
+
+    :attr:`version` is incremented on every modification, so comparing
+    it before and after some code has run tells whether that code
+    changed anything.
+
+    :attr:`changes` lists the modifications as ``(op, path, value)``
+    tuples, where *op* is ``'set'`` or ``'delete'`` and *path* is the
+    tuple of keys leading from the root to the changed value. Whoever
+    persists the changes is responsible for clearing the list.
+
+    :attr:`applied` counts the change records applied with
+    :func:`apply_change`, which are not modifications in the above
+    sense, but still change the data.
+
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.changes = []
+        self.applied = 0
+
+    def record(self, op, path, value=None):
+        """Note that the value at *path* was set or deleted."""
+        self.version += 1
+        self.changes.append((op, path, value))
+
+
+class _ItemTracker:
+    """Report modifications of list items as modifications of the list."""
+
+    __slots__ = ('owner',)
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def record(self, op, path, value=None):
+        self.owner._changed()
+
+
+def track(value, tracker=None, path=()):
+    """Return *value* with all nested dicts and lists tracked.
+
+    Dicts and lists are replaced by :class:`TrackedDict` and
+    :class:`TrackedList` copies reporting to *tracker*. A new
+    :class:`ChangeTracker` is created when *tracker* is omitted. *path*
+    is the location of *value* within the tracked tree. Other values
+    are returned unchanged.
+
+    """
+    if tracker is None:
+        tracker = ChangeTracker()
+    if isinstance(value, dict):
+        return TrackedDict(tracker, value, path)
+    if isinstance(value, list):
+        return TrackedList(tracker, value, path)
+    return value
+
+
+def apply_change(root, op, path, value=None, merge=False):
+    """Apply a change record to the tracked tree *root*.
+
+    The change is not recorded again. Changes below a parent that no
+    longer exists are ignored, which makes replaying a sequence of
+    changes more than once harmless.
+
+    With *merge*, setting a dict where there already is one sets its
+    items one by one instead of replacing it. This is useful when
+    replaying changes over data that someone else modified meanwhile.
+
+    """
+    parent = root
+    root.tracker.applied += 1
+    try:
+        for key in path[:-1]:
+            parent = parent[key]
+    except (KeyError, IndexError, TypeError):
+        return
+    key = path[-1]
+    if isinstance(parent, list):
+        return
+    if op == 'set':
+        if merge and isinstance(value, dict) and \
+                isinstance(parent.get(key), dict):
+            for k, v in value.items():
+                apply_change(root, op, path + (k,), v, merge)
+            return
+        dict.__setitem__(parent, key, track(value, root.tracker, path))
+    elif op == 'delete':
+        dict.pop(parent, key, None)
+    else:
+        raise ValueError('unknown change {!r}'.format(op))
+
+
+class TrackedDict(dict):
+    """A :class:`dict` that reports modifications to a tracker."""
+
+    __slots__ = ('tracker', 'path')
+
+    def __init__(self, tracker, items=(), path=()):
+        self.tracker = tracker
+        self.path = path
+        super().__init__((k, track(v, tracker, path + (k,)))
+                         for k, v in dict(items).items())
+
+    def __setitem__(self, key, value):
+        value = track(value, self.tracker, self.path + (key,))
+        super().__setitem__(key, value)
+        self.tracker.record('set', self.path + (key,), value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.tracker.record('delete', self.path + (key,))
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self.tracker.record('delete', self.path + (key,))
+        return super().pop(key, *default)
+
+    def popitem(self):
+        item = super().popitem()
+        self.tracker.record('delete', self.path + (item[0],))
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
+class TrackedList(list):
+    """A :class:`list` that reports modifications to a tracker.
+
+    Items are not addressed individually in change records; any
+    modification is recorded as setting the whole list.
+
+    """
+
+    __slots__ = ('tracker', 'path', '_item_tracker')
+
+    def __init__(self, tracker, items=(), path=()):
+        self.tracker = tracker
+        self.path = path
+        self._item_tracker = _ItemTracker(self)
+        super().__init__(self._track(v) for v in items)
+
+    def _track(self, value):
+        # Modifying an item counts as modifying the list
+        return track(value, self._item_tracker)
+
+    def _changed(self, result=None):
+        self.tracker.record('set', self.path, self)
+        return result
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [self._track(v) for v in value]
+        else:
+            value = self._track(value)
+        return self._changed(super().__setitem__(index, value))
+
+    def __delitem__(self, index):
+        return self._changed(super().__delitem__(index))
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        self._changed()
+        return super().__imul__(n)
+
+    def append(self, value):
+        return self._changed(super().append(self._track(value)))
+
+    def extend(self, values):
+        values = [self._track(v) for v in values]
+        return self._changed(super().extend(values))
+
+    def insert(self, index, value):
+        return self._changed(super().insert(index, self._track(value)))
+
+    def pop(self, *args):
+        return self._changed(super().pop(*args))
+
+    def remove(self, value):
+        return self._changed(super().remove(value))
+
+    def clear(self):
+        return self._changed(super().clear())
+
+    def reverse(self):
+        return self._changed(super().reverse())
+
+    def sort(self, *args, **kwargs):
+        return self._changed(super().sort(*args, **kwargs))
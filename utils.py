@@ -1,16 +1,34 @@
 """Utility functions for searchinator."""
+import contextlib
 import datetime
 import functools
 import json
+import os
+import re
+import tempfile
+import threading
+import uuid
 
 
-from flask import flash, redirect, render_template, session
+from flask import (Response, current_app, flash, get_flashed_messages,
+                   make_response, redirect, render_template, request,
+                   session, stream_with_context)
 
 from condition import Condition
+from inator import Inator
+from tracking import track
 
 TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
 """Expected string format for :class:`datetime.datetime`."""
 
+INATOR_FIELDS = frozenset(Inator.FIELDS)
+"""Keys of an inator record."""
+
+# Strings that datetime.fromisoformat parses exactly like load_time
+_TIME_RE = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d', re.ASCII)
+
+_CONDITIONS = {c.value: c for c in Condition}
+
 
 def load_time(x):
     """Load a :class:`datetime.datetime` from :class:`str`."""
@@ -22,54 +40,423 @@ def dump_time(x):
     return x.strftime(TIME_FORMAT)
 
 
+EPOCH = datetime.datetime(1970, 1, 1)
+"""Time stored as zero by :func:`to_epoch`."""
+
+_SECOND = datetime.timedelta(seconds=1)
+
+
+def to_epoch(x):
+    """Dump a :class:`datetime.datetime` to whole seconds since :data:`EPOCH`.
+
+    Fractions of a second are dropped, as they are by :func:`dump_time`.
+    """
+    return (x - EPOCH) // _SECOND
+
+
+def from_epoch(x):
+    """Load a :class:`datetime.datetime` from seconds since :data:`EPOCH`."""
+    return EPOCH + datetime.timedelta(0, x)
+
+
+def parse_time(x):
+    """Load a :class:`datetime.datetime` like :func:`load_time`, faster.
+
+    Strings laid out exactly like :data:`TIME_FORMAT` are parsed with
+    :meth:`datetime.datetime.fromisoformat`. Anything else goes through
+    :func:`load_time`, so the results and errors are the same.
+    """
+    if type(x) is str and _TIME_RE.fullmatch(x):
+        try:
+            return datetime.datetime.fromisoformat(x)
+        except ValueError:
+            pass
+    return load_time(x)
+
+
+DATE_FORMAT = "%Y-%m-%d"
+"""String format for days, as accepted by :func:`load_day_or_time`."""
+
+
+def load_day_or_time(x):
+    """Load a :class:`datetime.datetime` from a day or a full time.
+
+    Days are laid out like :data:`DATE_FORMAT` and give midnight at
+    their start; anything else is loaded with :func:`load_time`.
+
+    :raises ValueError: If *x* is neither
+    """
+    try:
+        return datetime.datetime.strptime(x, DATE_FORMAT)
+    except ValueError:
+        return load_time(x)
+
+
+def parse_condition(x):
+    """Return ``Condition(int(x))``, using a lookup table for ints."""
+    if type(x) is int:
+        try:
+            return _CONDITIONS[x]
+        except KeyError:
+            pass
+    return Condition(int(x))
+
+
+def _whole_number(x):
+    # Return whether x is an int (but not a bool) or a string of digits
+    if isinstance(x, str):
+        return x.isascii() and x.isdigit()
+    return type(x) is int
+
+
+def new_inator(fields, ident=None, added=None):
+    """Return a new inator with the submitted *fields*.
+
+    *fields* is a form or dict with the name, location, description and
+    condition. Unless given *ident* and *added*, the inator gets a new
+    identifier and the current time.
+
+    :raises ValueError: If a field is missing or invalid, the condition
+        is not a whole number, or the text cannot be encoded as UTF-8
+    """
+    try:
+        values = [fields[f] for f in ('name', 'location', 'description')]
+        condition = fields['condition']
+        # Submitted values such as 3.7 or true are not rounded
+        if not _whole_number(condition):
+            raise ValueError('invalid condition {!r}'.format(condition))
+        condition = parse_condition(condition)
+    except (KeyError, TypeError) as e:
+        raise ValueError('missing or invalid field {}'.format(e))
+    if not all(isinstance(value, str) for value in values):
+        raise ValueError('name, location and description must be strings')
+    for value in values + [ident or '']:
+        try:
+            value.encode('utf-8')
+        except UnicodeEncodeError:
+            # Lone surrogates cannot be stored by every backend
+            raise ValueError('invalid text {!r}'.format(value))
+    name, location, description = values
+    if ident is None:
+        ident = str(uuid.uuid4())
+    if added is None:
+        added = datetime.datetime.now()
+    return Inator(ident, name, location, description, condition, added)
+
+
 def as_inator(dct):
-    """Attempt to construct values of an inator with appropriate types."""
-    keyset = {'ident', 'name', 'location', 'description', 'condition', 'added'}
-    if set(dct.keys()) == keyset:
+    """Attempt to construct an :class:`inator.Inator` from a dict.
+
+    The dict is returned unchanged if it is not a valid inator.
+    """
+    if len(dct) == len(INATOR_FIELDS) and dct.keys() == INATOR_FIELDS:
         try:
-            new_dct = dct.copy()
-            new_dct['added'] = load_time(new_dct['added'])
-            new_dct['condition'] = Condition(int(new_dct['condition']))
-            return new_dct
+            added = parse_time(dct['added'])
+            condition = parse_condition(dct['condition'])
+            return Inator(dct['ident'], dct['name'], dct['location'],
+                          dct['description'], condition, added)
         except ValueError:
             return dct
     else:
         return dct
 
 
+def convert_inators(inators):
+    """Apply :func:`as_inator` to the values of the dict *inators*.
+
+    The values are replaced in place, and *inators* is returned.
+    """
+    for ident, dct in inators.items():
+        if isinstance(dct, dict):
+            inators[ident] = as_inator(dct)
+    return inators
+
+
 def from_datetime(obj):
-    """Convert :class:`datetime.datetime` objects to string."""
+    """Convert :class:`datetime.datetime` objects to string.
+
+    :class:`inator.Inator` objects are converted to dicts.
+    """
     if isinstance(obj, datetime.datetime):
         return dump_time(obj)
+    if isinstance(obj, Inator):
+        return obj.to_dict()
     raise TypeError("{} is not JSON serializable".format(repr(obj)))
 
 
+def decode_data(text):
+    """Decode the JSON text of a data file.
+
+    Rather than running :func:`as_inator` on every decoded object, only
+    the records in the ``inators`` dict are converted. For data files
+    laid out as usual, the result is the same.
+    """
+    data = json.loads(text)
+    if isinstance(data, dict) and isinstance(data.get('inators'), dict):
+        convert_inators(data['inators'])
+    return data
+
+
+def encode_data(data):
+    """Encode data as JSON text for a data file."""
+    return json.dumps(data, default=from_datetime)
+
+
+def write_atomic(path, text, fsync=True):
+    """Replace the file at *path* with *text* in one step.
+
+    The text (or :class:`bytes`) is written to a temporary file in the
+    same directory, optionally flushed to disk, and then renamed over
+    *path*, so that readers see either the old or the new contents but
+    never a mix.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=name + '.',
+                               suffix='.tmp')
+    try:
+        with open(fd, 'wb' if isinstance(text, bytes) else 'w') as f:
+            f.write(text)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def file_signature(st):
+    """Return the parts of :func:`os.stat` output that identify a version."""
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class DataCache:
+    """Keep decoded data files in memory between requests.
+
+    Entries are keyed by absolute path, so any number of data files
+    can be cached side by side. An entry is reused for as long as the
+    file's device, inode, size and modification time stay the same;
+    otherwise the file is parsed again.
+
+    The :attr:`hits` and :attr:`misses` counters record how often a
+    load was served from memory and how often the file was parsed.
+
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        """Return the decoded contents of *path*.
+
+        The result is tracked (see :mod:`tracking`) so that callers
+        can tell whether they modified it.
+
+        :raises FileNotFoundError: If *path* does not exist
+        """
+        key = os.path.abspath(path)
+        signature = file_signature(os.stat(key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+        with open(key, 'r') as f:
+            # Use the signature of what we actually read, in case the
+            # file was replaced after the stat above
+            signature = file_signature(os.fstat(f.fileno()))
+            data = track(decode_data(f.read()))
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (signature, data)
+        return data
+
+    def store(self, path, data):
+        """Remember *data* as the current contents of *path*."""
+        key = os.path.abspath(path)
+        signature = file_signature(os.stat(key))
+        with self._lock:
+            self._entries[key] = (signature, data)
+
+    def lookup(self, path):
+        """Return the ``(signature, data)`` entry for *path*, or None."""
+        with self._lock:
+            return self._entries.get(os.path.abspath(path))
+
+    def invalidate(self, path=None):
+        """Forget the entry for *path*, or every entry if *path* is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        """Return a dict of the cache counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries)}
+
+
+data_cache = DataCache()
+"""Process-wide cache used by :func:`add_data_param`."""
+
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+
+def path_lock(path):
+    """Return the lock held by transactions on the data at *path*.
+
+    There is one reentrant lock per absolute path, shared by every
+    :class:`DataFile` for that path in this process.
+    """
+    key = os.path.abspath(path)
+    with _path_locks_lock:
+        return _path_locks.setdefault(key, threading.RLock())
+
+
+class DataFile:
+    """Load and save data kept in a single JSON file.
+
+    This is the default storage mode of :func:`add_data_param`: the
+    whole file is decoded on load (through :data:`data_cache`) and
+    rewritten on save. Subclasses implement other storage modes.
+
+    :param str path: Path to the data file. Relative paths are
+        resolved each time the file is used.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the tracked data.
+
+        :raises FileNotFoundError: If there is no data yet
+        """
+        return data_cache.load(self.path)
+
+    def save(self, data, changes):
+        """Persist *data* after it was modified by *changes*.
+
+        *changes* holds the change records (see :mod:`tracking`) made
+        since the data was loaded or last saved. It is empty when the
+        data is saved for the first time without modifications.
+        """
+        with open(self.path, 'w') as f:
+            f.write(encode_data(data))
+        data_cache.store(self.path, data)
+
+    def discard(self):
+        """Forget any in-memory copy of the data."""
+        data_cache.invalidate(self.path)
+
+
+@contextlib.contextmanager
+def open_data(datafile):
+    """Load the data in *datafile*, saving it again afterwards.
+
+    The data is only saved if it was modified, or if there was no data
+    yet. If the block raises an exception, nothing is saved and the
+    in-memory copy is discarded.
+
+    Storage modes share one in-memory copy of the data between
+    threads, so transactions on the same path take turns: each holds
+    :func:`path_lock` from load through save, and only ever saves
+    its own changes.
+    """
+    with path_lock(datafile.path):
+        # Attmepting to load the file path
+        try:
+            data = datafile.load()
+            exists = True
+        # If no file exists, set to an empty dictionary
+        except FileNotFoundError:
+            data = track({})
+            exists = False
+        version = data.tracker.version
+        try:
+            yield data
+        except BaseException:
+            # The in-memory copy may be half modified; reload next time
+            datafile.discard()
+            raise
+        # Nothing to write if the data was only read
+        if exists and data.tracker.version == version:
+            return
+        changes = list(data.tracker.changes)
+        del data.tracker.changes[:]
+        datafile.save(data, changes)
+
+
 def add_data_param(path):
-    """Wrap a function to facilitate data storage."""
+    """Wrap a function to facilitate data storage.
+
+    *path* is either the path to a JSON data file or a
+    :class:`DataFile` implementing some other storage mode. The data
+    is only saved if the wrapped function modified it, or if there was
+    no data yet.
+    """
+    datafile = DataFile(path) if isinstance(path, str) else path
+
+    def wrapper(func):
+        @functools.wraps(func)
+        def wrapper2(*args, **kwargs):
+            with open_data(datafile) as data:
+                # Running the function
+                return func(data, *args, **kwargs)
+        return wrapper2
+    return wrapper
+
+
+def add_storage_param(storage):
+    """Wrap a function to pass it a storage backend.
+
+    The function is called with *storage* (see :mod:`storage`) as its
+    first argument, inside one of its transactions.
+    """
     def wrapper(func):
         @functools.wraps(func)
         def wrapper2(*args, **kwargs):
-            # Attmepting to load the file path
-            try:
-                with open(path, 'r') as f:
-                    # Reading and storing the data
-                    data = json.loads(f.read(), object_hook=as_inator)
-            # If no file exists, set to an empty dictionary
-            except FileNotFoundError:
-                data = {}
-            # Running the function
-            retVal = func(data, *args, **kwargs)
-            # Write new data to file
-            with open(path, 'w') as f:
-                # Writing back into the file to store
-                f.write(json.dumps(data, default=from_datetime))
-            return retVal
+            with storage.transaction():
+                return func(storage, *args, **kwargs)
         return wrapper2
     return wrapper
 
 
-def uses_template(template):
-    """Wrap a function to add HTML template rendering functionality."""
+STREAM_BUFFER = 16
+"""Number of template output pieces sent together when streaming."""
+
+
+def stream_template(template, **context):
+    """Render *template* with *context* as a streamed response.
+
+    The page is sent as it is rendered, a few pieces at a time, instead
+    of being built as one string first.
+    """
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    # The session is saved before the body is sent, so take the flashed
+    # messages out of it now; the template gets the same ones later
+    get_flashed_messages()
+    stream = app.jinja_env.get_template(template).stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+    return Response(stream_with_context(stream))
+
+
+def uses_template(template, stream=False):
+    """Wrap a function to add HTML template rendering functionality.
+
+    With *stream*, the template is rendered with
+    :func:`stream_template`.
+    """
+    render = stream_template if stream else render_template
+
     def wrapper(func):
         @functools.wraps(func)
         def wrapper2(*args, **kwargs):
@@ -77,13 +464,60 @@ def uses_template(template):
             retVal = func(*args, **kwargs)
             if isinstance(retVal, dict):
                 # Format the data to the template
-                return render_template(template, **retVal)
+                return render(template, **retVal)
             else:
                 return retVal
         return wrapper2
     return wrapper
 
 
+def conditional(version):
+    """Wrap a view to answer conditional GET requests.
+
+    *version* is called with the view's arguments before the view, and
+    returns a strong entity tag and the last modification time (naive
+    UTC) of the page, or None if they are unknown. A request whose
+    ``If-None-Match`` holds the tag, or failing that whose
+    ``If-Modified-Since`` is no earlier than the time, gets an empty
+    304 response without the view being called. Other responses get
+    ``ETag`` and ``Last-Modified`` headers.
+
+    Pages with flashed messages waiting to be shown differ from the
+    usual, so they are always sent in full, without the headers.
+    """
+    def wrapper(func):
+        @functools.wraps(func)
+        def wrapper2(*args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or
+                    session.get('_flashes')):
+                return func(*args, **kwargs)
+            found = version(*args, **kwargs)
+            if found is None:
+                return func(*args, **kwargs)
+            tag, modified = found
+            if request.if_none_match:
+                # Compressed pages carry the tag as a weak one
+                fresh = request.if_none_match.contains_weak(tag)
+            else:
+                since = request.if_modified_since
+                fresh = (since is not None and
+                         since.replace(tzinfo=None) >= modified)
+            if fresh:
+                response = Response(status=304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            response.last_modified = modified
+            # Check back every time rather than guessing how long the
+            # page stays fresh
+            response.cache_control.no_cache = True
+            return response
+        return wrapper2
+    return wrapper
+
+
 def login_required(func):
     """Wrap a function to enforce user authentication."""
     @functools.wraps(func)
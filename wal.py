@@ -0,0 +1,223 @@
+"""Store data as a snapshot plus an append-only write-ahead log.
+
+This module contains :class:`LoggedDataFile`, a storage mode for
+:func:`utils.add_data_param`. Instead of rewriting the whole data file
+after every modification, the changes made by a request are appended
+as a single record to a log kept next to the data file (the data file
+path plus ``.log``). Once the log grows past a number of records or
+bytes, it is compacted: the data is written as a fresh snapshot and
+the log is removed.
+
+Every log record is a line of the form::
+
+  <crc32 as 8 hex digits> <JSON list of changes>
+
+Loading replays the log over the snapshot and stops at the first
+record that is incomplete or fails its checksum, so a write torn by a
+crash is simply ignored (and cut off before the next append).
+
+The log assumes a single writing process, though any number of its
+threads may append at once. Several processes may read the same files;
+each one picks up new records as they are appended.
+
+"""
+import json
+import os
+import threading
+import zlib
+
+from tracking import apply_change, track
+from utils import (DataFile, as_inator, convert_inators, decode_data,
+                   encode_data, file_signature, write_atomic)
+
+LOG_SUFFIX = '.log'
+"""Suffix appended to the data file path to get the log path."""
+
+
+def encode_record(changes):
+    """Encode change records (see :mod:`tracking`) as one log line."""
+    payload = encode_data([[op, list(path), value]
+                           for op, path, value in changes])
+    payload = payload.encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def read_records(f):
+    """Read log records from the binary file *f*.
+
+    Yield a ``(changes, offset)`` tuple for each intact record, where
+    *offset* is the position just past the record. Stop at the end of
+    the file or at the first torn or corrupt record.
+
+    """
+    offset = f.tell()
+    for line in f:
+        if not line.endswith(b'\n') or line[8:9] != b' ':
+            return
+        payload = line[9:-1]
+        try:
+            if int(line[:8], 16) != zlib.crc32(payload):
+                return
+            changes = json.loads(payload.decode('utf-8'))
+        except ValueError:
+            return
+        offset += len(line)
+        yield [decode_change(*change) for change in changes], offset
+
+
+def decode_change(op, path, value):
+    """Return a decoded change record with inators converted."""
+    if path[:1] == ['inators'] and isinstance(value, dict):
+        if len(path) == 1:
+            value = convert_inators(value)
+        elif len(path) == 2:
+            value = as_inator(value)
+    return op, tuple(path), value
+
+
+class LoggedDataFile(DataFile):
+    """Load and save data as a JSON snapshot plus a write-ahead log.
+
+    :param str path: Path to the snapshot. The log is kept at the
+        same path plus :data:`LOG_SUFFIX`.
+    :param int max_records: Compact after this many log records
+    :param int max_bytes: Compact once the log is this large
+    :param bool fsync: Flush each record to disk before returning
+
+    """
+
+    def __init__(self, path, max_records=1000, max_bytes=1 << 20,
+                 fsync=True):
+        super().__init__(path)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.compactions = 0
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, key):
+        self._key = key
+        self._data = None
+        self._snapshot = None
+        self._offset = 0
+        self._records = 0
+
+    @property
+    def log_path(self):
+        """Absolute path of the log."""
+        return os.path.abspath(self.path) + LOG_SUFFIX
+
+    def load(self):
+        """Return the tracked data, replaying any new log records.
+
+        :raises FileNotFoundError: If there is no snapshot and no log
+        """
+        with self._lock:
+            key = os.path.abspath(self.path)
+            if key != self._key:
+                self._reset(key)
+            try:
+                snapshot = file_signature(os.stat(key))
+            except FileNotFoundError:
+                snapshot = None
+            if self._data is None or snapshot != self._snapshot:
+                self._load_snapshot(key)
+            if not self._replay() and self._snapshot is None:
+                self._reset(None)
+                raise FileNotFoundError(key)
+            return self._data
+
+    def _load_snapshot(self, key):
+        try:
+            with open(key, 'r') as f:
+                snapshot = file_signature(os.fstat(f.fileno()))
+                data = track(decode_data(f.read()))
+        except FileNotFoundError:
+            snapshot, data = None, track({})
+        self._data, self._snapshot = data, snapshot
+        self._offset = self._records = 0
+
+    def _replay(self):
+        # Apply records appended since the last replay. Return whether
+        # there is a log at all.
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return False
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self._offset:
+                # Someone else compacted the log: start over
+                self._load_snapshot(self._key)
+            if size == self._offset:
+                return True
+            f.seek(self._offset)
+            for changes, offset in read_records(f):
+                for change in changes:
+                    apply_change(self._data, *change)
+                self._offset = offset
+                self._records += 1
+        return True
+
+    def save(self, data, changes):
+        """Append *changes* to the log, compacting it if it is too big.
+
+        Without any changes (when saving for the first time) the data
+        is written as a snapshot instead.
+        """
+        with self._lock:
+            self._key = os.path.abspath(self.path)
+            self._data = data
+            if not changes:
+                self.compact()
+                return
+            with open(self.log_path, 'a+b') as f:
+                _drop_torn_tail(f, self._offset)
+                f.write(encode_record(changes))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                self._offset = f.tell()
+            self._records += 1
+            if (self._records >= self.max_records or
+                    self._offset >= self.max_bytes):
+                self.compact()
+
+    def compact(self):
+        """Fold the log into a fresh snapshot and remove the log.
+
+        The snapshot is replaced atomically before the log is removed.
+        If the process dies in between, the old log is replayed over
+        the new snapshot on the next load, which changes nothing.
+        """
+        with self._lock:
+            if self._data is None:
+                self.load()
+            write_atomic(self._key, encode_data(self._data), self.fsync)
+            try:
+                os.remove(self.log_path)
+            except FileNotFoundError:
+                pass
+            self._snapshot = file_signature(os.stat(self._key))
+            self._offset = self._records = 0
+            self.compactions += 1
+
+    def discard(self):
+        """Forget the in-memory copy of the data."""
+        with self._lock:
+            self._reset(None)
+
+
+def _drop_torn_tail(f, offset):
+    # Cut a torn or corrupt record left behind by a crash off the end
+    # of the log open in f, leaving it positioned at the end. Intact
+    # records past offset are kept.
+    f.seek(offset)
+    end = offset
+    for changes, end in read_records(f):
+        pass
+    f.seek(0, os.SEEK_END)
+    if f.tell() > end:
+        f.truncate(end)
+        f.seek(end)